@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Cache for Parsed Word Alignments
+
+The word alignments of parse_alignments.py are stored under a hash of
+the eflomal alignment, both corpora and the parser version. A parse is
+only reused if all of them are unchanged. The count tables of a corpus
+are stored under the same hash. When a new parse of the same files is
+stored, e.g. after lines were appended to the corpus, the entries of
+the older content are removed.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+from pathlib import Path
+
+from parse_alignments import PARSER_VERSION, parse_word_alignments
+
+
+CACHE_VERSION = 1
+
+
+class WordAlignmentCache:
+    """Word alignments stored by the content of their input files
+
+    Parameters
+    ----------
+    directory : str, optional
+        The directory of the cache, created if needed
+
+    Attributes
+    ----------
+    directory : Path
+        The directory of the cache
+    """
+
+    def __init__(self, directory=".alignment_cache"):
+        self.directory = Path(directory)
+        self._digests = None
+        # The resolved input files of the keys of this object
+        self._files = dict()
+
+    def _digest_file(self):
+        return self.directory / "digests.json"
+
+    def _entry_file(self):
+        return self.directory / "entries.json"
+
+    def _replace_older(self, key):
+        """Removes the entries of the same input files under another
+        key and remembers the key for the files"""
+
+        files = self._files.get(key)
+        if files is None:
+            return
+        try:
+            with open(self._entry_file(), "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            entries = dict()
+        older = entries.get(files)
+        if older == key:
+            return
+        entries[files] = key
+        # Copies of the files in other paths can still use the entry
+        if older is not None and older not in entries.values():
+            for suffix in (".pickle", "_counts.pickle"):
+                try:
+                    os.remove(self.directory / f"{older}{suffix}")
+                except FileNotFoundError:
+                    pass
+        with open(f"{self._entry_file()}.tmp", "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(f"{self._entry_file()}.tmp", self._entry_file())
+
+    def file_digest(self, file):
+        """Returns the SHA-256 hash of the content of a file
+
+        The hashes are remembered with the size and modification time
+        of the files, so unchanged files are only read once.
+
+        Parameters
+        ----------
+        file : str
+            Path to the file
+
+        Returns
+        -------
+        digest : str
+            The hash as hexadecimal string
+        """
+
+        if self._digests is None:
+            try:
+                with open(self._digest_file(), "r", encoding="utf-8") as f:
+                    self._digests = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._digests = dict()
+        path = str(Path(file).resolve())
+        stat = os.stat(path)
+        saved = self._digests.get(path)
+        if saved and saved[0] == stat.st_size\
+                and saved[1] == stat.st_mtime_ns:
+            return saved[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        digest = digest.hexdigest()
+        self._digests[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(f"{self._digest_file()}.tmp", "w", encoding="utf-8") as f:
+            json.dump(self._digests, f)
+        os.replace(f"{self._digest_file()}.tmp", self._digest_file())
+        return digest
+
+    def key(self, alignment, source_corpus, target_corpus):
+        """Returns the key of the word alignments of a corpus
+
+        Parameters
+        ----------
+        alignment : str
+            The file name for the eflomal alignment
+        source_corpus : str
+            The file name for the source corpus
+        target_corpus : str
+            The file name for the target corpus
+
+        Returns
+        -------
+        key : str
+            A hash of the content of the files and the parser version
+        """
+
+        files = (alignment, source_corpus, target_corpus)
+        digests = [self.file_digest(file) for file in files]
+        key = hashlib.sha256(" ".join(
+            [f"parser-{PARSER_VERSION}", *digests]).encode()).hexdigest()
+        self._files[key] = "\n".join(str(Path(file).resolve())
+                                     for file in files)
+        return key
+
+    def load(self, key):
+        """Returns the cached word alignments or None
+
+        Returns
+        -------
+        alignments : tuple or None
+            The source - target and the target - source alignments,
+            None if the key is not in the cache
+        """
+
+        try:
+            with open(self.directory / f"{key}.pickle", "rb") as f:
+                version, *alignments = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        if version != CACHE_VERSION:
+            return None
+        return tuple(alignments)
+
+    def save(self, key, source_target, target_source):
+        """Stores word alignments under a key
+
+        Returns
+        -------
+        None
+        """
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        file = self.directory / f"{key}.pickle"
+        # A parse is never left half-written
+        with open(f"{file}.tmp", "wb") as f:
+            pickle.dump((CACHE_VERSION, dict(source_target),
+                         dict(target_source)),
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{file}.tmp", file)
+        self._replace_older(key)
+
+    def load_counts(self, key):
+        """Returns the stored count tables of a corpus or None
+
+        Returns
+        -------
+        counts : dict or None
+            The count tables, None if the key is not in the cache
+        """
+
+        try:
+            with open(self.directory / f"{key}_counts.pickle", "rb") as f:
+                version, counts = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        if version != CACHE_VERSION:
+            return None
+        return counts
+
+    def save_counts(self, key, counts):
+        """Stores the count tables of a corpus under a key
+
+        Returns
+        -------
+        None
+        """
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        file = self.directory / f"{key}_counts.pickle"
+        with open(f"{file}.tmp", "wb") as f:
+            pickle.dump((CACHE_VERSION, counts), f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f"{file}.tmp", file)
+        self._replace_older(key)
+
+    def word_alignments(self, alignment, source_corpus, target_corpus,
+                        workers=1, stats=None):
+        """Returns the word alignments of a corpus, parses and stores
+        them if they are not in the cache
+
+        Parameters
+        ----------
+        alignment : str
+            The file name for the eflomal alignment
+        source_corpus : str
+            The file name for the source corpus
+        target_corpus : str
+            The file name for the target corpus
+        workers : int, optional
+            The number of processes for a parse
+        stats : Counter, optional
+            Counts the cache hits and misses
+
+        Returns
+        -------
+        source_target : dict
+            A dictionary with source keys and the target alignments as
+            values
+        target_source : dict
+            A dictionary with target keys and the source alignments as
+            values
+        """
+
+        key = self.key(alignment, source_corpus, target_corpus)
+        alignments = self.load(key)
+        if alignments is not None:
+            if stats is not None:
+                stats["cache_hits"] += 1
+            return alignments
+
+        if stats is not None:
+            stats["cache_misses"] += 1
+        source_target, target_source = parse_word_alignments(
+            alignment, source_corpus, target_corpus, workers=workers)
+        self.save(key, source_target, target_source)
+        # Plain dictionaries like the JSON files, missing keys raise
+        # a KeyError
+        return dict(source_target), dict(target_source)
@@ -0,0 +1,362 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Read-only Index for Looking up Connective Alignments"""
+
+import argparse
+import pickle
+from array import array
+from collections import defaultdict
+
+from help_functions.discourse_relations import split_relations
+from processing_filtering import json_to_dict
+
+
+INDEX_VERSION = 2
+
+
+class ConnectiveAlignmentIndex:
+    """A read-only index for the alignments of one language pair
+
+    Every connective, translation and relation is stored once as a
+    string and referenced by its id. The source connectives and the
+    target words have their own ids and relations, so a string of both
+    languages keeps the relations of each language apart. The
+    translations of a connective and the sources of a translation are
+    kept as arrays sorted by probability, so lookups are dictionary
+    accesses and top-k queries are slices.
+
+    Parameters
+    ----------
+    source_words : tuple
+        All source connectives, the position is the id
+    target_words : tuple
+        All translations, the position is the id
+    relation_names : tuple
+        All discourse relations, the position is the id
+    forward : dict
+        Source id -> (array of target ids, array of probabilities)
+    reverse : dict
+        Target id -> (array of source ids, array of probabilities)
+    source_relations : dict
+        Source id -> tuple of relation ids
+    target_relations : dict
+        Target id -> tuple of relation ids
+
+    Attributes
+    ----------
+    source_words : tuple
+        All source connectives, the position is the id
+    target_words : tuple
+        All translations, the position is the id
+    relation_names : tuple
+        All discourse relations, the position is the id
+    """
+
+    def __init__(self, source_words, target_words, relation_names, forward,
+                 reverse, source_relations, target_relations):
+        self.source_words = source_words
+        self.target_words = target_words
+        self.relation_names = relation_names
+        self._source_ids = {word: pos for pos, word in enumerate(source_words)}
+        self._target_ids = {word: pos for pos, word in enumerate(target_words)}
+        self._forward = forward
+        self._reverse = reverse
+        self._source_relations = source_relations
+        self._target_relations = target_relations
+        self._relation_sources = defaultdict(list)
+        for word_id, rel_ids in source_relations.items():
+            if word_id in forward:
+                for rel_id in rel_ids:
+                    self._relation_sources[rel_id].append(word_id)
+
+    @classmethod
+    def from_alignment(cls, alignment, source_relations=None,
+                       target_relations=None):
+        """Builds the index from an alignment with probabilities
+
+        Keys of the form 'word (relation)' as saved with the argument
+        '-sr' are split into the word and its relations.
+
+        Parameters
+        ----------
+        alignment : dict
+            A dictionary with source keys and a dictionary as value
+            which contains the target words with their probabilities
+        source_relations : dict, optional
+            A dictionary with the source words as keys and the
+            relations in a list as values
+        target_relations : dict, optional
+            A dictionary with the target words as keys and the
+            relations in a list as values
+
+        Returns
+        -------
+        index : ConnectiveAlignmentIndex
+            The index for the alignment
+        """
+
+        # The ids and relations of the source and of the target words
+        source_ids = dict()
+        target_ids = dict()
+        source_word_relations = defaultdict(list)
+        target_word_relations = defaultdict(list)
+        relation_ids = dict()
+
+        def word_id(key, ids, word_relations, mapping):
+            word, relations = split_relations(key)
+            if word not in ids:
+                ids[word] = len(ids)
+            pos = ids[word]
+            if mapping and word in mapping:
+                relations = relations + list(mapping[word])
+            for relation in relations:
+                if relation not in relation_ids:
+                    relation_ids[relation] = len(relation_ids)
+                if relation_ids[relation] not in word_relations[pos]:
+                    word_relations[pos].append(relation_ids[relation])
+            return pos
+
+        forward = dict()
+        reverse = defaultdict(list)
+        for source, targets in alignment.items():
+            source_id = word_id(source, source_ids, source_word_relations,
+                                source_relations)
+            pairs = sorted(((word_id(target, target_ids,
+                                     target_word_relations,
+                                     target_relations), prob)
+                            for target, prob in targets.items()),
+                           key=lambda pair: -pair[1])
+            forward[source_id] = (array("I", [t for t, _ in pairs]),
+                                  array("d", [p for _, p in pairs]))
+            for target_id, prob in pairs:
+                reverse[target_id].append((source_id, prob))
+
+        for target_id, pairs in reverse.items():
+            pairs.sort(key=lambda pair: -pair[1])
+            reverse[target_id] = (array("I", [s for s, _ in pairs]),
+                                  array("d", [p for _, p in pairs]))
+
+        return cls(tuple(source_ids), tuple(target_ids), tuple(relation_ids),
+                   forward, dict(reverse),
+                   *({pos: tuple(rels) for pos, rels in word_relations.items()
+                      if rels} for word_relations in (source_word_relations,
+                                                      target_word_relations)))
+
+    @classmethod
+    def from_tagged(cls, relation_names, tagged):
+        """Builds the index from an alignment created by tag_relations
+
+        Parameters
+        ----------
+        relation_names : list
+            The relations, the position is the id
+        tagged : dict
+            The alignment with relations as separate fields
+
+        Returns
+        -------
+        index : ConnectiveAlignmentIndex
+            The index for the alignment
+        """
+
+        source_relations = dict()
+        target_relations = dict()
+        alignment = dict()
+        for source, entry in tagged.items():
+            if entry["relations"]:
+                source_relations[source] = [relation_names[i]
+                                            for i in entry["relations"]]
+            alignment[source] = dict()
+            for target, value in entry["translations"].items():
+                alignment[source][target] = value["probability"]
+                if value["relations"]:
+                    target_relations[target] = [relation_names[i]
+                                                for i in value["relations"]]
+        return cls.from_alignment(alignment, source_relations,
+                                  target_relations)
+
+    @classmethod
+    def from_find_alignments(cls, align, lang="source",
+                             source_relations=None, target_relations=None):
+        """Builds the index from the results of FindAlignments
+
+        Parameters
+        ----------
+        align : FindAlignments
+            The object after find_conns was called
+        lang : str
+            "source" for the source - target alignments, "target" for
+            the target - source alignments
+        source_relations : dict, optional
+            The relations of the source connectives of the direction
+        target_relations : dict, optional
+            The relations of the target connectives of the direction
+
+        Returns
+        -------
+        index : ConnectiveAlignmentIndex
+            The index for the alignment
+        """
+
+        if lang == "target":
+            alignment = align.target_conn_alignments
+        else:
+            alignment = align.source_conn_alignments
+        return cls.from_alignment(alignment, source_relations,
+                                  target_relations)
+
+    @classmethod
+    def from_json(cls, file, source_relations=None, target_relations=None):
+        """Builds the index from a *_connectives_alignment.json file"""
+
+        return cls.from_alignment(json_to_dict(file), source_relations,
+                                  target_relations)
+
+    def save(self, file):
+        """Saves the index so that it can be loaded with load"""
+
+        with open(file, "wb") as f:
+            pickle.dump((INDEX_VERSION, self.source_words, self.target_words,
+                         self.relation_names, self._forward, self._reverse,
+                         self._source_relations, self._target_relations),
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, file):
+        """Loads an index saved with save"""
+
+        with open(file, "rb") as f:
+            version, *content = pickle.load(f)
+        if version != INDEX_VERSION:
+            raise ValueError(f"{file} was saved with index version {version}"
+                             f", expected {INDEX_VERSION}")
+        return cls(*content)
+
+    def __contains__(self, connective):
+        return self._source_ids.get(connective) in self._forward
+
+    def __len__(self):
+        return len(self._forward)
+
+    def _matching_relations(self, relation):
+        """Returns the ids of the relations that start with relation"""
+
+        return {pos for pos, name in enumerate(self.relation_names)
+                if name == relation or name.startswith(relation + ":")}
+
+    def _lookup(self, lang, word, relation, k):
+        # Looks up a source connective ("source") or a target word
+        if lang == "source":
+            table, word_ids = self._forward, self._source_ids
+            words, word_relations = self.target_words, self._target_relations
+        else:
+            table, word_ids = self._reverse, self._target_ids
+            words, word_relations = self.source_words, self._source_relations
+        try:
+            ids, probs = table[word_ids[word]]
+        except KeyError:
+            return []
+        if relation is None:
+            return [(words[i], p) for i, p in zip(ids[:k], probs[:k])]
+
+        wanted = self._matching_relations(relation)
+        result = []
+        for i, p in zip(ids, probs):
+            if wanted.intersection(word_relations.get(i, ())):
+                result.append((words[i], p))
+                if k is not None and len(result) == k:
+                    break
+        return result
+
+    def translations(self, connective, relation=None):
+        """Returns the translations of a connective
+
+        Parameters
+        ----------
+        connective : str
+            The source connective
+        relation : str, optional
+            Only translations with this relation (or a more specific
+            one, e.g. "COMPARISON:Concession") are returned
+
+        Returns
+        -------
+        translations : list
+            Tuples (target, probability), the most probable first
+        """
+
+        return self._lookup("source", connective, relation, None)
+
+    def top_k(self, connective, k=1, relation=None):
+        """Returns the k most probable translations of a connective"""
+
+        return self._lookup("source", connective, relation, k)
+
+    def sources(self, target, relation=None):
+        """Returns the source connectives aligned to a target word
+
+        Parameters
+        ----------
+        target : str
+            The target word or phrase
+        relation : str, optional
+            Only sources with this relation (or a more specific one)
+            are returned
+
+        Returns
+        -------
+        sources : list
+            Tuples (source, probability), the most probable first
+        """
+
+        return self._lookup("target", target, relation, None)
+
+    def relations(self, word, lang="source"):
+        """Returns the discourse relations of a source connective or,
+        with lang "target", of a target word"""
+
+        if lang == "target":
+            word_ids, word_relations = self._target_ids, self._target_relations
+        else:
+            word_ids, word_relations = self._source_ids, self._source_relations
+        try:
+            rel_ids = word_relations[word_ids[word]]
+        except KeyError:
+            return []
+        return [self.relation_names[pos] for pos in rel_ids]
+
+    def connectives(self, relation):
+        """Returns the source connectives with a discourse relation"""
+
+        word_ids = set()
+        for rel_id in self._matching_relations(relation):
+            word_ids.update(self._relation_sources.get(rel_id, ()))
+        return sorted(self.source_words[pos] for pos in word_ids)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("alignment",
+                        help="JSON file with the connectives alignment")
+    parser.add_argument("index", help="File name for the index")
+    parser.add_argument("-sr", "--source_relations", action="store",
+                        default="", type=str,
+                        help="JSON file with the relations of the source"
+                        " connectives")
+    parser.add_argument("-tr", "--target_relations", action="store",
+                        default="", type=str,
+                        help="JSON file with the relations of the target"
+                        " connectives")
+    args = parser.parse_args()
+
+    s_rel = json_to_dict(args.source_relations) \
+        if args.source_relations else None
+    t_rel = json_to_dict(args.target_relations) \
+        if args.target_relations else None
+    ConnectiveAlignmentIndex.from_json(args.alignment, s_rel,
+                                       t_rel).save(args.index)
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Local Server for Connective Alignment Lookups
+
+The lexicons, relations and alignment indexes are loaded once. Clients
+send one JSON object per line, either a single request or a list of
+requests, and receive one JSON line with the results in the same
+order.
+
+Example request:
+    [{"op": "translations", "pair": "de-es", "connective": "obwohl",
+      "k": 3},
+     {"op": "relations", "lang": "de", "connective": "obwohl"}]
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+from pathlib import Path
+
+from alignment_index import ConnectiveAlignmentIndex
+from help_functions.create_corpus_examples import find_example_ids
+from processing_filtering import json_to_dict, read_es_conns, read_xml_lex
+
+
+# The longest request line in bytes, a batch of 1000 lookups has about
+# 75 KB
+LINE_LIMIT = 2 ** 24
+
+
+class AlignmentServer:
+    """Answers lookup requests for connective alignments
+
+    Parameters
+    ----------
+    indexes : dict
+        Language pairs ("de-es") as keys and ConnectiveAlignmentIndex
+        objects as values
+    relations : dict, optional
+        Language codes as keys and dictionaries with the connectives
+        as keys and the relations in a list as values
+    lexicons : dict, optional
+        Language codes as keys and the connectives as values
+    corpora : dict, optional
+        Language pairs as keys and tuples (source corpus, target
+        corpus) as values, used to find example sentences
+    limit : int, optional
+        The longest request line in bytes, longer requests are
+        answered with an error
+
+    Attributes
+    ----------
+    indexes : dict
+        The alignment indexes of the language pairs
+    relations : dict
+        The relations of the connectives of each language
+    lexicons : dict
+        The connectives of each language as sets
+    corpora : dict
+        The parallel corpora of the language pairs
+    limit : int
+        The longest request line in bytes
+    """
+
+    def __init__(self, indexes, relations=None, lexicons=None, corpora=None,
+                 limit=LINE_LIMIT):
+        self.indexes = indexes
+        self.relations = relations or dict()
+        self.lexicons = {lang: set(lex)
+                         for lang, lex in (lexicons or dict()).items()}
+        self.corpora = corpora or dict()
+        self.limit = limit
+        self._examples = dict()
+
+    def handle(self, request):
+        """Answers a single request
+
+        Parameters
+        ----------
+        request : dict
+            A request with the key "op" and the arguments of the
+            operation
+
+        Returns
+        -------
+        result : dict
+            A dictionary with the key "result" or "error"
+        """
+
+        if not isinstance(request, dict):
+            return {"error": "A request has to be a JSON object"}
+        try:
+            op = request["op"]
+            if op == "translations":
+                index = self.indexes[request["pair"]]
+                k = request.get("k")
+                if k is not None and (not isinstance(k, int)
+                                      or isinstance(k, bool) or k < 0):
+                    return {"error": "'k' has to be a non-negative integer"}
+                if k:
+                    result = index.top_k(request["connective"], k,
+                                         request.get("relation"))
+                else:
+                    result = index.translations(request["connective"],
+                                                request.get("relation"))
+            elif op == "sources":
+                result = self.indexes[request["pair"]].sources(
+                    request["target"], request.get("relation"))
+            elif op == "relations":
+                lang = request["lang"]
+                result = self.relations.get(lang, dict()).get(
+                    request["connective"], [])
+                if not result:
+                    for pair, index in self.indexes.items():
+                        source_lang, _, target_lang = pair.partition("-")
+                        if lang in (source_lang, target_lang):
+                            result = index.relations(
+                                request["connective"], "source"
+                                if lang == source_lang else "target")
+                            if result:
+                                break
+            elif op == "in_lexicon":
+                result = request["connective"] in self.lexicons[
+                    request["lang"]]
+            elif op == "examples":
+                result = self.examples(request["pair"], request["source"],
+                                       request["target"],
+                                       request.get("limit"))
+            else:
+                return {"error": f"Unknown operation '{op}'"}
+        except KeyError as error:
+            return {"error": f"Missing or unknown {error}"}
+        except (TypeError, ValueError) as error:
+            # E.g. a list instead of a string, the client stays connected
+            return {"error": f"Invalid argument: {error}"}
+
+        return {"result": result}
+
+    def examples(self, pair, source_conn, target_conn, limit=None):
+        """Returns the ids of sentences that contain a connective pair
+
+        The corpus is only read for the first request of a pair,
+        afterwards the ids are cached.
+        """
+
+        key = (pair, source_conn, target_conn)
+        if key not in self._examples:
+            source_corpus, target_corpus = self.corpora[pair]
+            self._examples[key] = find_example_ids(
+                source_corpus, target_corpus, source_conn, target_conn)
+        return self._examples[key][:limit]
+
+    def handle_batch(self, batch):
+        """Answers a single request or a list of requests"""
+
+        if isinstance(batch, list):
+            return [self.handle(request) for request in batch]
+        return self.handle(batch)
+
+    @staticmethod
+    async def _read_line(reader):
+        # Returns the next line or None if it is longer than the limit,
+        # the rest of a long line is skipped
+        try:
+            return await reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as error:
+            return error.partial
+        except asyncio.LimitOverrunError as error:
+            consumed = error.consumed
+        try:
+            while True:
+                await reader.readexactly(consumed)
+                try:
+                    await reader.readuntil(b"\n")
+                    return None
+                except asyncio.LimitOverrunError as error:
+                    consumed = error.consumed
+        except asyncio.IncompleteReadError:
+            return None
+
+    async def _respond(self, loop, line):
+        # Answers a request line
+        try:
+            batch = json.loads(line)
+        except json.JSONDecodeError as error:
+            return {"error": f"Invalid JSON: {error}"}
+        # Reading the corpus for examples must not block the other
+        # clients
+        requests = batch if isinstance(batch, list) else [batch]
+        if any(isinstance(request, dict) and request.get("op") == "examples"
+               for request in requests):
+            return await loop.run_in_executor(None, self.handle_batch, batch)
+        return self.handle_batch(batch)
+
+    async def _client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                line = await self._read_line(reader)
+                if line == b"":
+                    break
+                if line is None:
+                    response = {"error": f"The request is longer than "
+                                         f"{self.limit} bytes"}
+                else:
+                    response = await self._respond(loop, line)
+                writer.write(json.dumps(response, ensure_ascii=False)
+                             .encode("utf-8") + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path=None, host="127.0.0.1", port=8765):
+        """Serves requests until the process is stopped
+
+        Parameters
+        ----------
+        socket_path : str, optional
+            Path to a Unix socket, if not specified a TCP socket on
+            host and port is used
+        host : str, optional
+            The host for the TCP socket
+        port : int, optional
+            The port for the TCP socket
+
+        Returns
+        -------
+        None
+        """
+
+        if socket_path:
+            server = await asyncio.start_unix_server(self._client,
+                                                     path=socket_path,
+                                                     limit=self.limit)
+        else:
+            server = await asyncio.start_server(self._client, host, port,
+                                                limit=self.limit)
+        async with server:
+            await server.serve_forever()
+
+
+def query(requests, socket_path=None, host="127.0.0.1", port=8765):
+    """Sends requests to a running AlignmentServer
+
+    Parameters
+    ----------
+    requests : list or dict
+        A single request or a list of requests
+    socket_path : str, optional
+        Path to the Unix socket of the server
+    host : str, optional
+        The host of the TCP socket of the server
+    port : int, optional
+        The port of the TCP socket of the server
+
+    Returns
+    -------
+    response : list or dict
+        The results in the same order as the requests
+
+    Raises
+    ------
+    ConnectionError
+        If the server closed the connection without a response
+    """
+
+    if socket_path:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(socket_path)
+    else:
+        connection = socket.create_connection((host, port))
+    with connection, connection.makefile("rwb") as stream:
+        stream.write(json.dumps(requests, ensure_ascii=False)
+                     .encode("utf-8") + b"\n")
+        stream.flush()
+        line = stream.readline()
+    if not line:
+        raise ConnectionError("The server closed the connection without a "
+                              "response")
+    return json.loads(line)
+
+
+def read_lex(file):
+    """Reads a connective lexicon as XML or TXT file"""
+
+    if str(file).endswith("xml"):
+        return read_xml_lex(Path(file))
+    return read_es_conns(Path(file))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--index", action="append", nargs=2,
+                        default=[], metavar=("PAIR", "FILE"),
+                        help="Language pair (e.g. de-es) and index file or"
+                        " JSON file with the connectives alignment")
+    parser.add_argument("-r", "--relations", action="append", nargs=2,
+                        default=[], metavar=("LANG", "FILE"),
+                        help="Language code and JSON file with the relations"
+                        " of the connectives")
+    parser.add_argument("-l", "--lexicon", action="append", nargs=2,
+                        default=[], metavar=("LANG", "FILE"),
+                        help="Language code and connective lexicon as XML"
+                        " or TXT file")
+    parser.add_argument("-c", "--corpus", action="append", nargs=3,
+                        default=[], metavar=("PAIR", "SOURCE", "TARGET"),
+                        help="Language pair and the source and target corpus"
+                        " for example sentences")
+    parser.add_argument("--socket", action="store", default="", type=str,
+                        help="Path to a Unix socket")
+    parser.add_argument("--host", action="store", default="127.0.0.1",
+                        type=str, help="Host if no Unix socket is used")
+    parser.add_argument("--port", action="store", default=8765, type=int,
+                        help="Port if no Unix socket is used")
+    parser.add_argument("--limit", action="store", default=LINE_LIMIT,
+                        type=int,
+                        help="Longest request line in bytes (default: 16 MiB)")
+    args = parser.parse_args()
+
+    relations = {lang: json_to_dict(file) for lang, file in args.relations}
+    indexes = dict()
+    for pair, file in args.index:
+        if file.endswith(".json"):
+            source_lang, target_lang = pair.split("-")
+            indexes[pair] = ConnectiveAlignmentIndex.from_json(
+                file, relations.get(source_lang),
+                relations.get(target_lang))
+        else:
+            indexes[pair] = ConnectiveAlignmentIndex.load(file)
+    lexicons = {lang: read_lex(file) for lang, file in args.lexicon}
+    corpora = {pair: (source, target) for pair, source, target in args.corpus}
+
+    server = AlignmentServer(indexes, relations, lexicons, corpora,
+                             args.limit)
+    asyncio.run(server.serve(args.socket or None, args.host, args.port))
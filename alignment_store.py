@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Storing and Querying Connective Alignments in SQLite"""
+
+import sqlite3
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS counts (
+    source_lang TEXT NOT NULL,
+    target_lang TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (source_lang, target_lang, source, target)
+);
+CREATE TABLE IF NOT EXISTS probabilities (
+    source_lang TEXT NOT NULL,
+    target_lang TEXT NOT NULL,
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    probability REAL NOT NULL,
+    PRIMARY KEY (source_lang, target_lang, source, target)
+);
+CREATE TABLE IF NOT EXISTS relations (
+    lang TEXT NOT NULL,
+    connective TEXT NOT NULL,
+    relation TEXT NOT NULL,
+    PRIMARY KEY (lang, connective, relation)
+);
+CREATE TABLE IF NOT EXISTS lexicon (
+    lang TEXT NOT NULL,
+    connective TEXT NOT NULL,
+    type TEXT NOT NULL,
+    PRIMARY KEY (lang, connective)
+);
+CREATE INDEX IF NOT EXISTS probabilities_target
+    ON probabilities (source_lang, target_lang, target);
+CREATE INDEX IF NOT EXISTS probabilities_value
+    ON probabilities (source_lang, target_lang, probability);
+CREATE INDEX IF NOT EXISTS relations_relation
+    ON relations (relation);
+"""
+
+
+def conn_type(connective):
+    """Returns the type of a connective: single, phrase or discontinuous"""
+
+    if "..." in connective:
+        return "discontinuous"
+    if len(connective.split()) > 1:
+        return "phrase"
+    return "single"
+
+
+def save_to_sqlite(db_file, source_lang, target_lang, probabilities, counts,
+                   source_lex=(), target_lex=(), source_relations=None,
+                   target_relations=None, target_probabilities=None,
+                   target_counts=None):
+    """Saves the alignments of a language pair in a SQLite database
+
+    All rows are inserted in a single transaction, including the
+    alignments of the reverse direction if they are given. Existing
+    rows of the language pair and of both lexicons are replaced.
+
+    Parameters
+    ----------
+    db_file : str
+        Path to the SQLite database, created if it does not exist
+    source_lang : str
+        Source language code
+    target_lang : str
+        Target language code
+    probabilities : dict
+        The filtered alignments with probabilities (source -> target)
+    counts : dict
+        The unfiltered alignments with counts (source -> target)
+    source_lex : list, optional
+        The source connectives
+    target_lex : list, optional
+        The target connectives
+    source_relations : dict, optional
+        A dictionary with the source connectives as keys and the
+        relations in a list as values
+    target_relations : dict, optional
+        A dictionary with the target connectives as keys and the
+        relations in a list as values
+    target_probabilities : dict, optional
+        The filtered alignments with probabilities (target -> source)
+    target_counts : dict, optional
+        The unfiltered alignments with counts (target -> source)
+
+    Returns
+    -------
+    None
+    """
+
+    directions = [((source_lang, target_lang), probabilities, counts)]
+    if target_probabilities is not None or target_counts is not None:
+        directions.append(((target_lang, source_lang),
+                           target_probabilities or dict(),
+                           target_counts or dict()))
+    connection = sqlite3.connect(db_file)
+    try:
+        with connection:
+            connection.executescript(SCHEMA)
+            for pair, pair_probabilities, pair_counts in directions:
+                for table in ("counts", "probabilities"):
+                    connection.execute(
+                        f"DELETE FROM {table} "
+                        "WHERE source_lang = ? AND target_lang = ?", pair)
+                connection.executemany(
+                    "INSERT INTO counts VALUES (?, ?, ?, ?, ?)",
+                    ((*pair, source, target, count)
+                     for source, targets in pair_counts.items()
+                     for target, count in targets.items()))
+                connection.executemany(
+                    "INSERT INTO probabilities VALUES (?, ?, ?, ?, ?)",
+                    ((*pair, source, target, probability)
+                     for source, targets in pair_probabilities.items()
+                     for target, probability in targets.items()))
+
+            for lang, lex, mapping in ((source_lang, source_lex,
+                                        source_relations),
+                                       (target_lang, target_lex,
+                                        target_relations)):
+                if lex:
+                    connection.execute(
+                        "DELETE FROM lexicon WHERE lang = ?", (lang,))
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO lexicon VALUES (?, ?, ?)",
+                        ((lang, conn, conn_type(conn)) for conn in lex))
+                if mapping:
+                    connection.execute(
+                        "DELETE FROM relations WHERE lang = ?", (lang,))
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO relations VALUES (?, ?, ?)",
+                        ((lang, conn, relation)
+                         for conn, relations in mapping.items()
+                         for relation in relations))
+    finally:
+        connection.close()
+
+
+class AlignmentStore:
+    """Read access to connective alignments saved with save_to_sqlite
+
+    Parameters
+    ----------
+    db_file : str
+        Path to the SQLite database
+
+    Attributes
+    ----------
+    connection : sqlite3.Connection
+        The connection to the database
+    """
+
+    def __init__(self, db_file):
+        self.connection = sqlite3.connect(db_file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """Closes the connection to the database"""
+
+        self.connection.close()
+
+    def translations(self, connective, source_lang, target_lang,
+                     min_probability=0.0):
+        """Returns the translations of a connective
+
+        Parameters
+        ----------
+        connective : str
+            The source connective
+        source_lang : str
+            Source language code
+        target_lang : str
+            Target language code
+        min_probability : float, optional
+            The minimum probability of a translation
+
+        Returns
+        -------
+        translations : list
+            Tuples (target, probability, count), the most probable
+            translation first
+        """
+
+        rows = self.connection.execute(
+            "SELECT p.target, p.probability, c.count FROM probabilities p "
+            "LEFT JOIN counts c USING (source_lang, target_lang, source, "
+            "target) WHERE p.source_lang = ? AND p.target_lang = ? "
+            "AND p.source = ? AND p.probability >= ? "
+            "ORDER BY p.probability DESC",
+            (source_lang, target_lang, connective, min_probability))
+        return rows.fetchall()
+
+    def sources(self, target, source_lang, target_lang, min_probability=0.0):
+        """Returns the source connectives aligned to a target word
+
+        Parameters
+        ----------
+        target : str
+            The target word or phrase
+        source_lang : str
+            Source language code
+        target_lang : str
+            Target language code
+        min_probability : float, optional
+            The minimum probability of the alignment
+
+        Returns
+        -------
+        sources : list
+            Tuples (source, probability), the most probable first
+        """
+
+        rows = self.connection.execute(
+            "SELECT source, probability FROM probabilities "
+            "WHERE source_lang = ? AND target_lang = ? AND target = ? "
+            "AND probability >= ? ORDER BY probability DESC",
+            (source_lang, target_lang, target, min_probability))
+        return rows.fetchall()
+
+    def translations_by_relation(self, relation, source_lang, target_lang,
+                                 min_probability=0.0):
+        """Returns the translations of all connectives with a relation
+
+        Parameters
+        ----------
+        relation : str
+            A PDTB-3 sense or the beginning of one, e.g.
+            "COMPARISON:Concession" matches both argument variants
+        source_lang : str
+            Source language code
+        target_lang : str
+            Target language code
+        min_probability : float, optional
+            The minimum probability of a translation
+
+        Returns
+        -------
+        translations : list
+            Tuples (source, target, probability), sorted by source and
+            probability
+        """
+
+        rows = self.connection.execute(
+            "SELECT DISTINCT p.source, p.target, p.probability "
+            "FROM probabilities p JOIN relations r "
+            "ON r.lang = p.source_lang AND r.connective = p.source "
+            "WHERE p.source_lang = ? AND p.target_lang = ? "
+            "AND (r.relation = ? OR r.relation LIKE ?) "
+            "AND p.probability >= ? "
+            "ORDER BY p.source, p.probability DESC",
+            (source_lang, target_lang, relation, relation + ":%",
+             min_probability))
+        return rows.fetchall()
+
+    def relations(self, connective, lang):
+        """Returns the discourse relations of a connective"""
+
+        rows = self.connection.execute(
+            "SELECT relation FROM relations WHERE lang = ? "
+            "AND connective = ? ORDER BY relation", (lang, connective))
+        return [relation for relation, in rows]
+
+    def in_lexicon(self, connective, lang):
+        """Checks whether a connective is part of the lexicon"""
+
+        row = self.connection.execute(
+            "SELECT 1 FROM lexicon WHERE lang = ? AND connective = ?",
+            (lang, connective)).fetchone()
+        return row is not None
+
+    def counts(self, connective, source_lang, target_lang):
+        """Returns the unfiltered alignment counts of a connective"""
+
+        rows = self.connection.execute(
+            "SELECT target, count FROM counts WHERE source_lang = ? "
+            "AND target_lang = ? AND source = ? ORDER BY count DESC",
+            (source_lang, target_lang, connective))
+        return dict(rows.fetchall())
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Association Measures for Connective Alignments
+
+Instead of the relative frequency, an alignment can be selected by the
+association of a connective with an aligned word. For every pair the
+contingency table is built from the count of the alignment (a), the
+occurrences of the connective (R), the occurrences of the aligned word
+in the word alignment (C) and the size of the word alignment (N):
+
+                 word        other words
+    connective   a           R - a
+    other        C - a       N - R - C + a
+
+Only alignments to single words are scored, the word alignment has no
+occurrences of phrases, so they keep the probability threshold. The
+tables of all pairs of a round are kept in arrays and the measures
+are computed at once with numpy:
+
+    llr   log-likelihood ratio (G2), negative if the pair occurs less
+          often than expected
+    dice  2a / (R + C)
+    pmi   pointwise mutual information, log2(a N / (R C))
+"""
+
+from processing_filtering import merge_punctuation
+
+
+MEASURES = ("llr", "dice", "pmi")
+
+# 10.83 is the critical value of G2 for p = 0.001
+DEFAULT_THRESHOLDS = {"llr": 10.83, "dice": 0.01, "pmi": 1.0}
+
+
+def _import_numpy():
+    """Imports numpy, which is only needed for the association
+    measures"""
+
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("The association measures require the package "
+                          "'numpy'") from None
+    return numpy
+
+
+def contingency_arrays(np, counts, marginals, total):
+    """Builds the contingency tables of all alignments of a table
+
+    Alignments to an empty string (no alignment), punctuation and
+    phrases are left out, they are not compared with other words.
+
+    Parameters
+    ----------
+    np : module
+        numpy
+    counts : dict
+        The counted alignments of every connective
+    marginals : dict
+        The aligned words as keys, the lengths of the values are the
+        occurrences of the words in the word alignment
+    total : int
+        The number of aligned units of the word alignment
+
+    Returns
+    -------
+    pairs : list
+        The connective and the aligned word of every table
+    tables : tuple
+        The arrays a, R, C and N
+    """
+
+    pairs = []
+    joint = []
+    rows = []
+    for conn, words in counts.items():
+        words = merge_punctuation(words)
+        row = sum(words.values())
+        for word, count in words.items():
+            if word and len(word.split()) == 1:
+                pairs.append((conn, word))
+                joint.append(count)
+                rows.append(row)
+
+    columns = dict()
+    for (_, word), count in zip(pairs, joint):
+        columns[word] = columns.get(word, 0) + count
+    # At least the alignments of the table are occurrences of the word
+    column = {word: max(count, len(marginals.get(word, ())))
+              for word, count in columns.items()}
+
+    a = np.array(joint, dtype=np.float64)
+    r = np.array(rows, dtype=np.float64)
+    c = np.array([column[word] for _, word in pairs], dtype=np.float64)
+    n = np.full(len(pairs), float(total))
+    n = np.maximum(n, r + c - a)
+    return pairs, (a, r, c, n)
+
+
+def association_scores(np, measure, a, r, c, n):
+    """Computes an association measure for arrays of contingency tables
+
+    Parameters
+    ----------
+    np : module
+        numpy
+    measure : str
+        "llr", "dice" or "pmi"
+    a, r, c, n : array
+        The count of the alignment, the occurrences of the connective,
+        the occurrences of the aligned word and the size of the word
+        alignment
+
+    Returns
+    -------
+    scores : array
+        The association of every pair
+    """
+
+    if measure == "dice":
+        return 2 * a / (r + c)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if measure == "pmi":
+            return np.log2(a * n / (r * c))
+        if measure != "llr":
+            raise ValueError(f"Unknown association measure '{measure}', "
+                             f"use one of {', '.join(MEASURES)}")
+        observed = np.stack([a, r - a, c - a, n - r - c + a])
+        expected = np.stack([r * c, r * (n - c), (n - r) * c,
+                             (n - r) * (n - c)]) / n
+        terms = np.where(observed > 0,
+                         observed * np.log(observed / expected), 0.0)
+    llr = 2 * terms.sum(axis=0)
+    # Negative for pairs that occur less often than expected
+    return np.where(a * n < r * c, -llr, llr)
+
+
+def association_filter(probabilities, counts, measure, threshold,
+                       marginals, total, phrase_threshold):
+    """Removes the alignments with a lower association than the
+    threshold
+
+    Replaces filter_most_common_conns, alignments to an empty string
+    are kept like there. Alignments to phrases have no association,
+    they are kept if their probability reaches the phrase threshold.
+
+    Parameters
+    ----------
+    probabilities : dict
+        The alignment with probabilities (see count_probabilities)
+    counts : dict
+        The counted alignments of the same connectives
+    measure : str
+        "llr", "dice" or "pmi"
+    threshold : float
+        The minimum association of an alignment
+    marginals : dict
+        The word alignment of the aligned language, the lengths of the
+        values are the occurrences of the words
+    total : int
+        The number of aligned units of the word alignment
+    phrase_threshold : float
+        The minimum probability of an alignment to a phrase
+
+    Returns
+    -------
+    filtered : dict
+        The probabilities of the alignments that are kept
+    scores : dict
+        The association of the alignments that are kept
+    """
+
+    np = _import_numpy()
+    pairs, tables = contingency_arrays(np, {conn: counts[conn] for conn
+                                            in probabilities},
+                                       marginals, total)
+    scores = dict()
+    if pairs:
+        values = association_scores(np, measure, *tables)
+        for (conn, word), score in zip(pairs, values.tolist()):
+            if score >= threshold:
+                scores.setdefault(conn, dict())[word] = score
+
+    # The words keep the order of the probabilities
+    filtered = {conn: {word: probability
+                       for word, probability in words.items()
+                       if not word or word in scores.get(conn, ())
+                       or (len(word.split()) > 1
+                           and probability >= phrase_threshold)}
+                for conn, words in probabilities.items()}
+    return filtered, scores
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Benchmarks for the Alignment Pipeline on Synthetic Corpora
+
+Every stage runs in a new process, so the peak memory belongs to the
+stage alone. The results are compared with a stored baseline.
+
+Usage (from the main directory):
+    python -m benchmarks.run_benchmarks -n 10000 100000
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak memory is not reported
+    resource = None
+
+from benchmarks.synthetic_corpus import generate_corpus, read_lexicon
+from conn_search import FindAlignments
+from parse_alignments import (parse_discontinuous, parse_phrase_alignments,
+                              parse_word_alignments)
+
+
+STAGES = ("parse_word_alignments", "parse_phrase_alignments",
+          "parse_discontinuous", "find_conns")
+
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+
+def peak_rss():
+    """Returns the peak memory of the process in MB"""
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    if sys.platform == "darwin":
+        return peak / 1024 ** 2
+    return peak / 1024
+
+
+def run_stage(stage, files, source_lang, target_lang, iterations):
+    """Runs a single stage and measures it
+
+    Parameters
+    ----------
+    stage : str
+        One of STAGES
+    files : tuple
+        The paths of the alignment, source and target corpus
+    source_lang : str
+        The language of the source connectives
+    target_lang : str
+        The language of the target connectives
+    iterations : int
+        The number of rounds for find_conns
+
+    Returns
+    -------
+    result : dict
+        Wall time, CPU time and peak memory of the stage
+    """
+
+    alignment, source, target = files
+    source_lex = read_lexicon(source_lang)
+    target_lex = read_lexicon(target_lang)
+    phrases = [phrase for phrase in source_lex if len(phrase.split()) > 1
+               and "..." not in phrase]
+    discontinuous = [phrase for phrase in source_lex if "..." in phrase]
+
+    if stage == "find_conns":
+        # Preparation, not part of the measurement
+        source_alignment, target_alignment = parse_word_alignments(
+            alignment, source, target)
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    if stage == "parse_word_alignments":
+        parse_word_alignments(alignment, source, target)
+    elif stage == "parse_phrase_alignments":
+        parse_phrase_alignments(alignment, source, target, phrases)
+    elif stage == "parse_discontinuous":
+        parse_discontinuous(alignment, source, target, discontinuous)
+    elif stage == "find_conns":
+        align = FindAlignments(source_alignment, target_alignment, alignment,
+                               source, target, source_lex, target_lex)
+        align.find_conns(word_threshold=0.021, phrase_threshold=0.014,
+                         word_min_count=20, phrase_min_count=10,
+                         limit=iterations)
+    else:
+        raise ValueError(f"Unknown stage '{stage}'")
+
+    return {"seconds": time.perf_counter() - start,
+            "cpu_seconds": time.process_time() - cpu_start,
+            "peak_rss_mb": peak_rss()}
+
+
+def run_benchmarks(sizes, stages=STAGES, source_lang="de", target_lang="es",
+                   iterations=2, directory="benchmark_data", seed=42):
+    """Runs the stages on synthetic corpora of different sizes
+
+    Parameters
+    ----------
+    sizes : list
+        The numbers of sentence pairs
+    stages : list
+        The stages to measure
+    source_lang : str
+        The language of the source connectives
+    target_lang : str
+        The language of the target connectives
+    iterations : int
+        The number of rounds for find_conns
+    directory : str
+        The directory for the synthetic corpora
+    seed : int
+        The seed for the synthetic corpora
+
+    Returns
+    -------
+    results : dict
+        The sizes as keys and the measurements of each stage as values
+    """
+
+    results = dict()
+    context = get_context("spawn")
+    for size in sizes:
+        files = generate_corpus(directory, size, source_lang, target_lang,
+                                seed)
+        results[str(size)] = dict()
+        for stage in stages:
+            with ProcessPoolExecutor(1, mp_context=context) as executor:
+                result = executor.submit(run_stage, stage, files,
+                                         source_lang, target_lang,
+                                         iterations).result()
+            result["sentences_per_second"] = size / result["seconds"]
+            results[str(size)][stage] = result
+            print(f"{size:>9} {stage:<24} {result['seconds']:9.2f} s "
+                  f"{result['sentences_per_second']:11.0f} sentences/s "
+                  f"{result['peak_rss_mb'] or 0:9.1f} MB", file=sys.stderr)
+
+    return results
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Finds regressions compared to the baseline
+
+    Parameters
+    ----------
+    results : dict
+        The results of run_benchmarks
+    baseline : dict
+        The results of an earlier run
+    tolerance : float
+        The allowed relative difference
+
+    Returns
+    -------
+    regressions : list
+        A description of each regression
+    """
+
+    regressions = []
+    for size, stages in results.items():
+        for stage, result in stages.items():
+            try:
+                base = baseline[size][stage]
+            except KeyError:
+                continue
+            speed = result["sentences_per_second"]
+            base_speed = base["sentences_per_second"]
+            if speed < base_speed * (1 - tolerance):
+                regressions.append(
+                    f"{stage} ({size} sentences): {speed:.0f} sentences/s, "
+                    f"baseline {base_speed:.0f}")
+            memory = result["peak_rss_mb"]
+            base_memory = base["peak_rss_mb"]
+            if memory and base_memory and\
+                    memory > base_memory * (1 + tolerance):
+                regressions.append(
+                    f"{stage} ({size} sentences): {memory:.1f} MB, "
+                    f"baseline {base_memory:.1f} MB")
+
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--sizes", nargs="+", default=[10000],
+                        type=int, help="Numbers of sentence pairs")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES),
+                        choices=STAGES, help="Stages to measure")
+    parser.add_argument("-s", "--source_lang", action="store", default="de",
+                        type=str, help="Source language code")
+    parser.add_argument("-t", "--target_lang", action="store", default="es",
+                        type=str, help="Target language code")
+    parser.add_argument("-i", "--iterations", action="store", default=2,
+                        type=int, help="Number of iterations for find_conns")
+    parser.add_argument("-d", "--directory", action="store",
+                        default="benchmark_data", type=str,
+                        help="Directory for the synthetic corpora")
+    parser.add_argument("-o", "--output", action="store", default="",
+                        type=str, help="JSON file for the report")
+    parser.add_argument("-b", "--baseline", action="store",
+                        default=str(BASELINE), type=str,
+                        help="JSON file with the baseline")
+    parser.add_argument("--save_baseline", action="store_true",
+                        help="If specified, the results become the new"
+                        " baseline")
+    parser.add_argument("--tolerance", action="store", default=0.2,
+                        type=float,
+                        help="Allowed relative difference to the baseline")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.stages, args.source_lang,
+                             args.target_lang, args.iterations,
+                             args.directory)
+    report = {"python": platform.python_version(),
+              "platform": platform.platform(),
+              "source_lang": args.source_lang,
+              "target_lang": args.target_lang,
+              "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=4)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=4)
+    else:
+        # Without a baseline no regression could be found
+        if not Path(args.baseline).exists():
+            sys.exit(f"There is no baseline {args.baseline}, create it with"
+                     f" '--save_baseline'")
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
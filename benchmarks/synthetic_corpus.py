@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Generating Synthetic Parallel Corpora with Pharaoh Alignments
+
+The connectives are taken from the real connective lexicons, the other
+words are artificial. Each source connective has a main and a second
+translation, so the alignment of connectives finds something. The
+output only depends on the seed and the number of sentences.
+"""
+
+import argparse
+import random
+from itertools import accumulate
+from pathlib import Path
+
+from processing_filtering import LEXICONS, read_es_conns, read_xml_lex
+
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def read_lexicon(lang):
+    """Reads the connective lexicon of German, Italian or Spanish"""
+
+    path = ROOT / LEXICONS[lang]
+    if path.suffix == ".xml":
+        return read_xml_lex(path)
+    return read_es_conns(path)
+
+
+def corpus_files(directory, source_lang, target_lang, n_sentences, seed):
+    """Returns the paths of the alignment, source and target corpus"""
+
+    stem = f"{source_lang}_{target_lang}_{n_sentences}_{seed}"
+    directory = Path(directory)
+    return (directory / f"{stem}_alignment.txt",
+            directory / f"{stem}_{source_lang}.txt",
+            directory / f"{stem}_{target_lang}.txt")
+
+
+def generate_corpus(directory, n_sentences, source_lang="de",
+                    target_lang="es", seed=42, conn_rate=0.3,
+                    vocabulary=5000):
+    """Writes a synthetic parallel corpus and its pharaoh alignment
+
+    Existing files with the same parameters are reused.
+
+    Parameters
+    ----------
+    directory : str
+        The directory for the files
+    n_sentences : int
+        The number of sentence pairs
+    source_lang : str
+        The language of the source connectives (de, it or es)
+    target_lang : str
+        The language of the target connectives (de, it or es)
+    seed : int
+        The seed for the random generator
+    conn_rate : float
+        The share of sentences with a connective
+    vocabulary : int
+        The number of artificial words per language
+
+    Returns
+    -------
+    files : tuple
+        The paths of the alignment, source and target corpus
+    """
+
+    files = corpus_files(directory, source_lang, target_lang, n_sentences,
+                         seed)
+    if all(file.exists() for file in files):
+        return files
+    Path(directory).mkdir(parents=True, exist_ok=True)
+
+    rng = random.Random(seed)
+    source_conns = sorted(read_lexicon(source_lang))
+    target_conns = sorted(read_lexicon(target_lang))
+    translations = {conn: (rng.choice(target_conns), rng.choice(target_conns))
+                    for conn in source_conns}
+    # Zipf distribution for the artificial words
+    source_words = [f"s{pos}" for pos in range(vocabulary)]
+    target_words = [f"t{pos}" for pos in range(vocabulary)]
+    weights = list(accumulate(1 / (pos + 1) for pos in range(vocabulary)))
+
+    def filler(length):
+        ids = rng.choices(range(vocabulary), cum_weights=weights, k=length)
+        return [source_words[i] for i in ids], [target_words[i] for i in ids]
+
+    # Incomplete files are never reused
+    partial = [file.with_name(file.name + ".part") for file in files]
+    with open(partial[0], "w", encoding="utf-8") as alignment,\
+            open(partial[1], "w", encoding="utf-8") as source,\
+            open(partial[2], "w", encoding="utf-8") as target:
+        for _ in range(n_sentences):
+            source_parts = []
+            target_parts = []
+            if rng.random() < conn_rate:
+                conn = rng.choice(source_conns)
+                choice = rng.random()
+                if choice < 0.7:
+                    translation = translations[conn][0]
+                elif choice < 0.9:
+                    translation = translations[conn][1]
+                else:
+                    translation = rng.choice(target_conns)
+                source_parts = [part.split() for part in conn.split(" ... ")]
+                target_parts = [part.split()
+                                for part in translation.split(" ... ")]
+
+            # Segments: filler, connective part, filler, ..., "."
+            n_parts = max(len(source_parts), len(target_parts))
+            s_tokens, t_tokens, links = [], [], []
+            for pos in range(n_parts + 1):
+                s_fill, t_fill = filler(rng.randint(1, 8))
+                for s_word, t_word in zip(s_fill, t_fill):
+                    if rng.random() > 0.05:
+                        links.append((len(s_tokens), len(t_tokens)))
+                    s_tokens.append(s_word)
+                    t_tokens.append(t_word)
+                if pos == n_parts:
+                    break
+                s_part = source_parts[pos] if pos < len(source_parts) else []
+                t_part = target_parts[pos] if pos < len(target_parts) else []
+                s_start = len(s_tokens)
+                t_start = len(t_tokens)
+                s_tokens += s_part
+                t_tokens += t_part
+                if s_part and t_part:
+                    for i in range(max(len(s_part), len(t_part))):
+                        links.append((s_start + min(i, len(s_part) - 1),
+                                      t_start + min(i, len(t_part) - 1)))
+            links.append((len(s_tokens), len(t_tokens)))
+            s_tokens.append(".")
+            t_tokens.append(".")
+
+            source.write(" ".join(s_tokens) + "\n")
+            target.write(" ".join(t_tokens) + "\n")
+            alignment.write(" ".join(f"{i}-{j}" for i, j in links) + "\n")
+
+    for part, file in zip(partial, files):
+        part.replace(file)
+
+    return files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("n_sentences", type=int,
+                        help="Number of sentence pairs")
+    parser.add_argument("-d", "--directory", action="store",
+                        default="benchmark_data", type=str,
+                        help="Directory for the corpus files")
+    parser.add_argument("-s", "--source_lang", action="store", default="de",
+                        type=str, help="Source language code")
+    parser.add_argument("-t", "--target_lang", action="store", default="es",
+                        type=str, help="Target language code")
+    parser.add_argument("--seed", action="store", default=42, type=int,
+                        help="Seed for the random generator")
+    args = parser.parse_args()
+
+    for file in generate_corpus(args.directory, args.n_sentences,
+                                args.source_lang, args.target_lang,
+                                args.seed):
+        print(file)
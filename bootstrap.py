@@ -0,0 +1,583 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Bootstrap Stability of Connective Alignments
+
+The corpus is split into shards of lines and the alignments of the
+connectives of conn_align.py are counted once per shard. Every
+bootstrap replicate draws the shards with replacement, sums their
+counts and applies the probabilities and thresholds of conn_align.py.
+The share of the replicates in which an alignment is selected shows
+how stable it is.
+
+The replicates are computed with numpy as matrix products, in several
+processes if requested.
+"""
+
+import argparse
+import hashlib
+import os
+import pickle
+import string
+import sys
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from alignment_cache import WordAlignmentCache
+from corpus_io import map_batches
+from lexicon import Lexicon
+from parse_alignments import (discontinuous_batch, phrase_alignment_batch,
+                              word_alignment_batch)
+from processing_filtering import conn_count, json_to_dict, save_alignments
+
+
+SHARD_VERSION = 2
+
+# The matrices of the replicates, set once in every process
+_MATRICES = None
+
+
+def _import_numpy():
+    """Imports numpy, which is only needed for the bootstrap"""
+
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("The bootstrap requires the package "
+                          "'numpy'") from None
+    return numpy
+
+
+def shard_count_batch(first, lines, source_conns, target_conns):
+    """Counts the alignments of the connectives in a shard
+
+    Parameters
+    ----------
+    first : int
+        The line number (starting at 0) of the first line in the shard
+    lines : list
+        Tuples with the eflomal alignment, the source and the target
+        sentence of every line
+    source_conns : list
+        The source connectives
+    target_conns : list
+        The target connectives
+
+    Returns
+    -------
+    counts : tuple
+        The counted alignments of the source and of the target
+        connectives
+    """
+
+    word_alignments = word_alignment_batch(first, lines)
+    counts = []
+    for lang, conns in ((1, source_conns), (2, target_conns)):
+        lex = Lexicon(conns)
+        phrases, _ = phrase_alignment_batch(first, lines, lex.phrases, lang)
+        discontinuous, _ = discontinuous_batch(first, lines,
+                                               lex.discontinuous, lang)
+        counts.append({**conn_count(dict(word_alignments[lang - 1]),
+                                    lex.singles),
+                       **conn_count(phrases, lex.phrases),
+                       **conn_count(discontinuous, lex.discontinuous)})
+    return tuple(counts)
+
+
+class ShardCounts:
+    """The counts of the alignments of connectives per shard of lines
+
+    Parameters
+    ----------
+    pairs : list
+        Tuples with a connective and an aligned word, grouped by
+        connective
+    counts : array
+        The count of every pair in every shard, one row per shard
+    shard_size : int
+        The number of lines per shard
+
+    Attributes
+    ----------
+    pairs : list
+        Tuples with a connective and an aligned word
+    counts : array
+        The counts, row by row
+    shard_size : int
+        The number of lines per shard
+    shards : int
+        The number of shards
+    """
+
+    def __init__(self, pairs, counts, shard_size):
+        self.pairs = pairs
+        self.counts = counts
+        self.shard_size = shard_size
+        self.shards = len(counts) // len(pairs) if pairs else 0
+
+    @classmethod
+    def from_shards(cls, shard_counts, shard_size):
+        """Creates the table from the counts of every shard
+
+        Parameters
+        ----------
+        shard_counts : list
+            The counted alignments of the connectives of every shard
+        shard_size : int
+            The number of lines per shard
+
+        Returns
+        -------
+        table : ShardCounts
+            The counts of all shards
+        """
+
+        conns = dict()
+        for counts in shard_counts:
+            for conn, words in counts.items():
+                conns.setdefault(conn, dict()).update(dict.fromkeys(words))
+        pairs = [(conn, word) for conn, words in conns.items()
+                 for word in words]
+        column = {pair: pos for pos, pair in enumerate(pairs)}
+        table = array("I", bytes(4 * len(pairs) * len(shard_counts)))
+        for shard, counts in enumerate(shard_counts):
+            offset = shard * len(pairs)
+            for conn, words in counts.items():
+                for word, count in words.items():
+                    table[offset + column[conn, word]] = count
+        return cls(pairs, table, shard_size)
+
+    def totals(self):
+        """Returns the counts of all shards like a count file"""
+
+        totals = dict()
+        for pos, (conn, word) in enumerate(self.pairs):
+            count = sum(self.counts[pos::len(self.pairs)])
+            totals.setdefault(conn, Counter())[word] = count
+        return totals
+
+    def matrices(self):
+        """Returns the arrays for the bootstrap
+
+        The aligned words are merged like in count_probabilities:
+        punctuation counts as an empty string.
+
+        Returns
+        -------
+        matrices : dict
+            "counts" (shards x merged pairs) for the probabilities,
+            "threshold_counts" with the counts that remove_low_counts
+            compares, "starts" with the first column of every
+            connective, "conn_index" with the connective of every
+            column, the masks "single" and "phrase" for the aligned
+            words with one and with more tokens and the list "pairs"
+        """
+
+        np = _import_numpy()
+        merged = dict()
+        for conn, word in self.pairs:
+            if word and word in string.punctuation:
+                word = ""
+            merged.setdefault((conn, word), len(merged))
+        raw = np.frombuffer(self.counts, dtype=np.uint32).reshape(
+            self.shards, len(self.pairs)).astype(np.float64)
+        counts = np.zeros((self.shards, len(merged)))
+        threshold_counts = np.zeros((self.shards, len(merged)))
+        for pos, (conn, word) in enumerate(self.pairs):
+            if word and word in string.punctuation:
+                counts[:, merged[conn, ""]] += raw[:, pos]
+            else:
+                counts[:, merged[conn, word]] += raw[:, pos]
+                # remove_low_counts compares the unmerged count
+                threshold_counts[:, merged[conn, word]] += raw[:, pos]
+        pairs = list(merged)
+        conns = list(dict.fromkeys(conn for conn, word in pairs))
+        conn_pos = {conn: pos for pos, conn in enumerate(conns)}
+        conn_index = np.array([conn_pos[conn] for conn, word in pairs],
+                              dtype=np.int64)
+        starts = np.searchsorted(conn_index, np.arange(len(conns)))
+        tokens = np.array([len(word.split()) for conn, word in pairs])
+        return {"counts": counts, "threshold_counts": threshold_counts,
+                "starts": starts, "conn_index": conn_index,
+                "single": tokens == 1, "phrase": tokens > 1,
+                "pairs": pairs}
+
+
+def shard_key(corpus_key, shard_size, source_conns, target_conns):
+    """Returns the key of the shard counts of a corpus
+
+    Parameters
+    ----------
+    corpus_key : str
+        The key of the alignment and both corpora, see
+        WordAlignmentCache.key
+    shard_size : int
+        The number of lines per shard
+    source_conns : list
+        The source connectives
+    target_conns : list
+        The target connectives
+
+    Returns
+    -------
+    key : str
+        A hash of the files, the shard size and the connectives
+    """
+
+    content = "\n".join([corpus_key, str(shard_size), *source_conns, "",
+                         *target_conns])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def save_shard_counts(file, tables, key=""):
+    """Saves the shard counts of both languages
+
+    Parameters
+    ----------
+    file : str
+        Path to the file
+    tables : tuple
+        The ShardCounts of the source and the target connectives
+    key : str, optional
+        The key of the counts (see shard_key)
+
+    Returns
+    -------
+    None
+    """
+
+    with open(f"{file}.tmp", "wb") as f:
+        pickle.dump((SHARD_VERSION, key, *((table.pairs, table.counts,
+                                            table.shard_size)
+                                           for table in tables)),
+                    f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f"{file}.tmp", file)
+
+
+def load_shard_counts(file, key=None):
+    """Loads the shard counts saved with save_shard_counts
+
+    Parameters
+    ----------
+    file : str
+        Path to the file
+    key : str, optional
+        If specified, the counts are only loaded if they were saved
+        with this key
+
+    Returns
+    -------
+    tables : tuple or None
+        The ShardCounts of the source and the target connectives, None
+        if the key is different
+    """
+
+    with open(file, "rb") as f:
+        version, saved_key, *tables = pickle.load(f)
+    if version != SHARD_VERSION:
+        raise ValueError(f"{file} was saved with shard version {version}"
+                         f", expected {SHARD_VERSION}")
+    if key is not None and key != saved_key:
+        return None
+    return tuple(ShardCounts(*table) for table in tables)
+
+
+def count_shards(alignment, source_corpus, target_corpus, source_conns,
+                 target_conns, shard_size=10000, workers=1):
+    """Counts the alignments of the connectives in every shard
+
+    Parameters
+    ----------
+    alignment : str
+        The file name for the eflomal alignment
+    source_corpus : str
+        The file name for the source corpus
+    target_corpus : str
+        The file name for the target corpus
+    source_conns : list
+        The source connectives
+    target_conns : list
+        The target connectives
+    shard_size : int, optional
+        The number of lines per shard
+    workers : int, optional
+        The number of processes
+
+    Returns
+    -------
+    source_table : ShardCounts
+        The counts of the source connectives
+    target_table : ShardCounts
+        The counts of the target connectives
+    """
+
+    source_shards = []
+    target_shards = []
+    for first, size, (source_counts, target_counts) in map_batches(
+            shard_count_batch, (alignment, source_corpus, target_corpus),
+            args=(source_conns, target_conns), workers=workers,
+            batch_size=shard_size):
+        source_shards.append(source_counts)
+        target_shards.append(target_counts)
+    return (ShardCounts.from_shards(source_shards, shard_size),
+            ShardCounts.from_shards(target_shards, shard_size))
+
+
+def selection(np, counts, threshold_counts, matrices, thresholds):
+    """Applies the probabilities and thresholds to summed counts
+
+    Parameters
+    ----------
+    np : module
+        numpy
+    counts : ndarray
+        The merged counts (replicates x pairs)
+    threshold_counts : ndarray
+        The counts compared with the minimum counts
+    matrices : dict
+        The arrays of ShardCounts.matrices
+    thresholds : tuple
+        The word threshold, phrase threshold, minimum word count and
+        minimum phrase count
+
+    Returns
+    -------
+    probabilities : ndarray
+        The probability of every pair
+    selected : ndarray
+        True for the pairs that pass the filters
+    """
+
+    word_threshold, phrase_threshold, word_count, phrase_count = thresholds
+    totals = np.add.reduceat(counts, matrices["starts"], axis=1)
+    totals = totals[:, matrices["conn_index"]]
+    probabilities = np.divide(counts, totals, out=np.zeros_like(counts),
+                              where=totals > 0)
+    single = matrices["single"]
+    phrase = matrices["phrase"]
+    # Like filter_most_common_conns, empty strings have no threshold
+    probability_ok = ~((single & (probabilities < word_threshold))
+                       | (phrase & (probabilities < phrase_threshold)))
+    # Like remove_low_counts, empty strings need the phrase count
+    count_ok = np.where(single, threshold_counts >= word_count,
+                        threshold_counts >= phrase_count)
+    return probabilities, probability_ok & count_ok & (totals > 0)
+
+
+def _init_worker(matrices):
+    global _MATRICES
+    _MATRICES = matrices
+
+
+def replicate_batch(seed, replicates, thresholds, columns=None):
+    """Computes a batch of bootstrap replicates
+
+    Parameters
+    ----------
+    seed : SeedSequence
+        The seed of the batch
+    replicates : int
+        The number of replicates
+    thresholds : tuple
+        The word threshold, phrase threshold, minimum word count and
+        minimum phrase count
+    columns : ndarray, optional
+        If specified, the probabilities of these pairs are returned
+
+    Returns
+    -------
+    selected : ndarray
+        The number of replicates in which every pair is selected
+    probabilities : ndarray or None
+        The probabilities of the columns in every replicate
+    """
+
+    np = _import_numpy()
+    matrices = _MATRICES
+    shards = matrices["counts"].shape[0]
+    rng = np.random.default_rng(seed)
+    # How often every shard is drawn in every replicate
+    drawn = rng.integers(0, shards, size=(replicates, shards))
+    drawn += (np.arange(replicates) * shards)[:, None]
+    weights = np.bincount(drawn.ravel(), minlength=replicates * shards)
+    weights = weights.reshape(replicates, shards).astype(np.float64)
+
+    probabilities, selected = selection(
+        np, weights @ matrices["counts"],
+        weights @ matrices["threshold_counts"], matrices, thresholds)
+    if columns is not None:
+        return None, probabilities[:, columns].astype(np.float32)
+    return selected.sum(axis=0), None
+
+
+def bootstrap(table, replicates=1000, word_threshold=0.021,
+              phrase_threshold=0.014, word_min_count=20, phrase_min_count=10,
+              seed=0, workers=1, batch_size=50, confidence=0.95):
+    """Computes the stability of the alignments of a count table
+
+    Parameters
+    ----------
+    table : ShardCounts
+        The counts per shard
+    replicates : int, optional
+        The number of bootstrap replicates
+    word_threshold : float, optional
+        The minimum probability for an alignment for a single word
+    phrase_threshold : float, optional
+        The minimum probability for an alignment for a phrase
+    word_min_count : int, optional
+        The minimum number for an alignment for a single word
+    phrase_min_count : int, optional
+        The minimum number for an alignment for a phrase
+    seed : int, optional
+        The seed of the random numbers, the results do not depend on
+        the number of workers
+    workers : int, optional
+        The number of processes
+    batch_size : int, optional
+        The number of replicates computed at once
+    confidence : float, optional
+        The level of the probability intervals
+
+    Returns
+    -------
+    stability : dict
+        Connectives as keys, the values are dictionaries with the
+        aligned words that are selected in the corpus or at least one
+        replicate as keys and their probability in the corpus, the
+        share of the replicates in which they are selected and the
+        bounds of the percentile interval of the probability
+    """
+
+    np = _import_numpy()
+    if not table.pairs:
+        return dict()
+    matrices = table.matrices()
+    thresholds = (word_threshold, phrase_threshold, word_min_count,
+                  phrase_min_count)
+    full_probabilities, full_selected = selection(
+        np, matrices["counts"].sum(axis=0, keepdims=True),
+        matrices["threshold_counts"].sum(axis=0, keepdims=True), matrices,
+        thresholds)
+    sizes = [min(batch_size, replicates - start)
+             for start in range(0, replicates, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    def run(columns=None):
+        if workers <= 1:
+            _init_worker(matrices)
+            return [replicate_batch(batch_seed, size, thresholds, columns)
+                    for batch_seed, size in zip(seeds, sizes)]
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=(matrices,)) as executor:
+            return list(executor.map(replicate_batch, seeds, sizes,
+                                     [thresholds] * len(sizes),
+                                     [columns] * len(sizes)))
+
+    # First the selections, then the probabilities of the selected
+    # pairs with the same random numbers
+    selected = sum(batch for batch, _ in run())
+    columns = np.flatnonzero((selected > 0) | full_selected[0])
+    probabilities = np.concatenate([batch for _, batch in run(columns)])
+    low, high = np.quantile(probabilities, [(1 - confidence) / 2,
+                                            (1 + confidence) / 2], axis=0)
+
+    stability = dict()
+    for pos, column in enumerate(columns):
+        conn, word = matrices["pairs"][column]
+        stability.setdefault(conn, dict())[word] = {
+            "probability": float(full_probabilities[0, column]),
+            "selected": float(selected[column] / replicates),
+            "low": float(low[pos]),
+            "high": float(high[pos])}
+    return stability
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("word_alignment",
+                        help="Alignment text file in Pharaoh format")
+    parser.add_argument("source_corpus", help="Corpus with source sentences")
+    parser.add_argument("target_corpus", help="Corpus with target sentences")
+    parser.add_argument("-s", "--source_lang", action="store",
+                        type=str, required=True,
+                        help="Source language code")
+    parser.add_argument("-t", "--target_lang", action="store",
+                        type=str, required=True,
+                        help="Target language code")
+    parser.add_argument("-b", "--replicates", action="store", default=1000,
+                        type=int, help="Number of bootstrap replicates")
+    parser.add_argument("-ss", "--shard_size", action="store", default=10000,
+                        type=int, help="Number of corpus lines per shard")
+    parser.add_argument("-wt", "--word_threshold", action="store",
+                        default=0.021, type=float,
+                        help="Relative word threshold in percent")
+    parser.add_argument("-pt", "--phrase_threshold", action="store",
+                        default=0.014, type=float,
+                        help="Relative phrase threshold in percent")
+    parser.add_argument("-wc", "--word_count", action="store",
+                        default=20, type=int,
+                        help="Absolute word threshold as count")
+    parser.add_argument("-pc", "--phrase_count", action="store",
+                        default=10, type=int,
+                        help="Absolute phrase threshold as count")
+    parser.add_argument("-sd", "--seed", action="store", default=0, type=int,
+                        help="Seed of the random numbers")
+    parser.add_argument("-w", "--workers", action="store", default=1,
+                        type=int,
+                        help="Number of processes for the shard counts and"
+                        " the replicates")
+    parser.add_argument("-cd", "--cache_dir", action="store",
+                        default=".alignment_cache", type=str,
+                        help="Directory for the hashes of the alignment and"
+                        " the corpora, the shard counts are reused if the"
+                        " files and the connectives are unchanged")
+    parser.add_argument("--recount", action="store_true",
+                        help="If specified, the shard counts are computed"
+                        " again even if they exist")
+    args = parser.parse_args()
+
+    pair = f"{args.source_lang}_{args.target_lang}"
+    # The connectives of the count files of conn_align.py
+    conns = []
+    for lang1, lang2 in ((args.source_lang, args.target_lang),
+                         (args.target_lang, args.source_lang)):
+        count_file = Path(f"{lang1}_{lang2}_connectives_alignment"
+                          f"_count.json")
+        if not count_file.exists():
+            sys.exit(f"{count_file} is missing, it is created by "
+                     f"conn_align.py with -s {args.source_lang} -t "
+                     f"{args.target_lang}")
+        conns.append(list(json_to_dict(count_file)))
+
+    # The shards are counted again if the alignment, the corpora, the
+    # connectives or the shard size have changed
+    key = shard_key(WordAlignmentCache(args.cache_dir).key(
+                        args.word_alignment, args.source_corpus,
+                        args.target_corpus),
+                    args.shard_size, *conns)
+    shard_file = Path(f"{pair}_shard_counts.pickle")
+    tables = None
+    if shard_file.exists() and not args.recount:
+        tables = load_shard_counts(shard_file, key)
+    if tables is None:
+        tables = count_shards(args.word_alignment, args.source_corpus,
+                              args.target_corpus, *conns, args.shard_size,
+                              args.workers)
+        save_shard_counts(shard_file, tables, key)
+
+    for table, (lang1, lang2) in zip(tables, ((args.source_lang,
+                                               args.target_lang),
+                                              (args.target_lang,
+                                               args.source_lang))):
+        save_alignments(
+            f"{lang1}_{lang2}_connectives_alignment_stability.json",
+            bootstrap(table, args.replicates, args.word_threshold,
+                      args.phrase_threshold, args.word_count,
+                      args.phrase_count, args.seed, args.workers))
@@ -11,12 +11,19 @@ import argparse
 import sys
 from pathlib import Path
 
-from conn_search import FindAlignments
-from help_functions.discourse_relations import (add_discourse_relation,
-                                                assign_relations)
+from alignment_cache import WordAlignmentCache
+from alignment_store import save_to_sqlite
+from association import MEASURES
+from conn_search import FindAlignments, MultiTargetAlignments
+from help_functions.discourse_relations import (assign_relation_types,
+                                                legacy_relation_keys,
+                                                tag_relations)
 
-from processing_filtering import (json_to_dict, read_xml_lex, read_es_conns,
+from merging import WeightedAlignments
+from profiling import StageProfiler
+from processing_filtering import (json_to_dict, read_lexicon, read_relations,
                                   save_alignments)
+from sampling import SampledAlignments
 
 
 if __name__ == "__main__":
@@ -54,129 +61,407 @@ if __name__ == "__main__":
     parser.add_argument("-tl", "--target_lex", action="store",
                         default="", type=str,
                         help="Target connective lexicon")
+    parser.add_argument("-db", "--database", action="store",
+                        default="", type=str,
+                        help="If specified, the alignments are saved in this"
+                        " SQLite database as well")
+    parser.add_argument("-rp", "--relation_partition", action="store_true",
+                        help="If specified, the alignments are saved for"
+                        " each relation type of relations.json as well")
+    parser.add_argument("--profile", action="store", default="", type=str,
+                        help="JSON file for the time, memory and counters of"
+                        " each stage")
+    parser.add_argument("--profile_memory", action="store_true",
+                        help="If specified, the Python memory of each stage"
+                        " is traced as well (slower)")
+    parser.add_argument("--profile_dump", action="store", default="",
+                        type=str,
+                        help="Directory for cProfile (and tracemalloc) dumps"
+                        " of the phrase scans")
+    parser.add_argument("-cp", "--checkpoint", action="store", default="",
+                        type=str,
+                        help="File in which the state is saved regularly")
+    parser.add_argument("-ce", "--checkpoint_every", action="store",
+                        default=1000000, type=int,
+                        help="Number of corpus lines between two checkpoints")
+    parser.add_argument("-r", "--resume", action="store_true",
+                        help="If specified, the search continues from the"
+                        " checkpoint if it exists")
+    parser.add_argument("-w", "--workers", action="store", default=1,
+                        type=int,
+                        help="Number of processes for the corpus scans")
+    parser.add_argument("-e", "--encode", action="store_true",
+                        help="If specified, the corpus is kept in memory as"
+                        " integer ids for the phrase scans")
+    parser.add_argument("-u", "--update", action="store_true",
+                        help="If specified, the connectives of the previous"
+                        " run are only searched in the new corpus lines and"
+                        " the counts are added to the saved counts")
+    parser.add_argument("-ec", "--encoded_corpus", action="store",
+                        default="", type=str,
+                        help="File in which the encoded corpus and its line"
+                        " index are kept between runs (implies '-e')")
+    parser.add_argument("-at", "--add_target", action="append", nargs=3,
+                        default=[], metavar=("LANG", "ALIGNMENT", "CORPUS"),
+                        help="Further target language code, alignment with"
+                        " the source corpus and target corpus, the source"
+                        " corpus is scanned once for all target languages")
+    parser.add_argument("-cd", "--cache_dir", action="store",
+                        default=".alignment_cache", type=str,
+                        help="Directory for the parsed word alignments,"
+                        " a parse is reused if the alignment, the corpora"
+                        " and the parser are unchanged")
+    parser.add_argument("-nc", "--no_cache", action="store_true",
+                        help="If specified, the word alignment files of"
+                        " parse_alignments.py in the working directory are"
+                        " used instead of the cache")
+    parser.add_argument("-sa", "--sample", action="store", default=0.0,
+                        type=float,
+                        help="If specified, only this fraction of the corpus"
+                        " lines is scanned and the counts are estimated")
+    parser.add_argument("-sd", "--seed", action="store", default=0, type=int,
+                        help="Seed of the random sample")
+    parser.add_argument("-sc", "--sample_chunks", action="store", default=10,
+                        type=int,
+                        help="Number of chunks of the sample")
+    parser.add_argument("-sp", "--patience", action="store", default=2,
+                        type=int,
+                        help="Number of chunks after which a connective with"
+                        " an unchanged ranking is not searched anymore")
+    parser.add_argument("-ac", "--add_corpus", action="append", nargs=4,
+                        default=[],
+                        metavar=("ALIGNMENT", "SOURCE", "TARGET", "WEIGHT"),
+                        help="Further corpus of the language pair with its"
+                        " alignment and weight, the weighted counts of all"
+                        " corpora are added before the thresholds")
+    parser.add_argument("-cw", "--corpus_weight", action="store",
+                        default=1.0, type=float,
+                        help="Weight of the counts of the corpus of the"
+                        " positional arguments with '--add_corpus'")
+    parser.add_argument("-pr", "--prune", action="store", default=0.0,
+                        type=float,
+                        help="If specified, only the most frequent"
+                        " alignments of every connective are counted during"
+                        " the scans, with this largest error of a"
+                        " probability as a fraction of the smaller"
+                        " threshold")
+    parser.add_argument("-am", "--association_measure", action="store",
+                        default="", type=str, choices=MEASURES,
+                        help="If specified, the alignments are selected by"
+                        " this association measure of the connective and"
+                        " the aligned word instead of the probability"
+                        " thresholds, the minimum counts still apply")
+    parser.add_argument("-as", "--association_threshold", action="store",
+                        default=None, type=float,
+                        help="Minimum association of an alignment (default:"
+                        " llr 10.83, dice 0.01, pmi 1.0)")
 
     args = parser.parse_args()
+    if args.resume and not args.checkpoint:
+        parser.error("the argument '--resume' requires '--checkpoint'")
+    if args.update and args.checkpoint:
+        parser.error("the argument '--update' cannot be combined with"
+                     " '--checkpoint'")
+    if args.add_target and (args.checkpoint or args.update or args.encode
+                            or args.encoded_corpus):
+        parser.error("the argument '--add_target' cannot be combined with"
+                     " '--checkpoint', '--update', '--encode' or"
+                     " '--encoded_corpus'")
+    if args.sample and (args.add_target or args.checkpoint or args.update
+                        or args.encode or args.encoded_corpus):
+        parser.error("the argument '--sample' cannot be combined with"
+                     " '--add_target', '--checkpoint', '--update',"
+                     " '--encode' or '--encoded_corpus'")
+    if args.add_corpus and (args.add_target or args.sample or args.checkpoint
+                            or args.update or args.encode
+                            or args.encoded_corpus or args.no_cache):
+        parser.error("the argument '--add_corpus' cannot be combined with"
+                     " '--add_target', '--sample', '--checkpoint',"
+                     " '--update', '--encode', '--encoded_corpus' or"
+                     " '--no_cache'")
+    # The errors of the pruned counts of a previous run are not stored,
+    # so '--update' could not apply the thresholds to lower bounds
+    if args.prune and (args.add_target or args.sample or args.add_corpus
+                       or args.checkpoint or args.update):
+        parser.error("the argument '--prune' cannot be combined with"
+                     " '--add_target', '--sample', '--add_corpus',"
+                     " '--checkpoint' or '--update'")
+    if not 0 <= args.prune <= 1:
+        parser.error("the argument '--prune' has to be between 0 (off) and"
+                     " 1")
+    if args.association_measure and (args.sample or args.add_corpus):
+        parser.error("the argument '--association_measure' cannot be"
+                     " combined with '--sample' or '--add_corpus'")
+    if args.association_threshold is not None\
+            and not args.association_measure:
+        parser.error("the argument '--association_threshold' requires"
+                     " '--association_measure'")
+    corpora = [(args.word_alignment, args.source_corpus, args.target_corpus)]
+    weights = [args.corpus_weight]
+    for alignment, source_corpus, target_corpus, weight in args.add_corpus:
+        try:
+            weights.append(float(weight))
+        except ValueError:
+            parser.error(f"argument -ac/--add_corpus: invalid weight"
+                         f" '{weight}'")
+        corpora.append((alignment, source_corpus, target_corpus))
+    if any(weight < 0 for weight in weights):
+        parser.error("the weights of the corpora cannot be negative")
 
-    source_word_alignment = json_to_dict(
-        f"{args.source_lang}_{args.target_lang}_word_alignment.json")
-    target_word_alignment = json_to_dict(
-        f"{args.target_lang}_{args.source_lang}_word_alignment.json")
-
-    if args.source_lang == "it":
-        source_lex = read_xml_lex(
-            Path("connectives_and_relations/lico_d.xml"))
-    elif args.source_lang == "es":
-        source_lex = read_es_conns(
-            Path("connectives_and_relations/spanish_conns.txt"))
-    elif args.source_lang == "de":
-        source_lex = read_xml_lex(
-            Path("connectives_and_relations/dimlex.xml"))
-    else:
-        if args.source_lex:
-            if args.source_lex.endswith("xml"):
-                source_lex = read_xml_lex(
-                    Path(args.source_lex))
-            elif args.source_lex.endswith("txt"):
-                source_lex = read_es_conns(
-                    Path(args.source_lex))
+    if args.update and not args.no_cache:
+        print("'--update' without '--no_cache': the word alignments of the"
+              " whole corpus are parsed again if it has changed, use '-nc'"
+              " with the files extended by 'parse_alignments.py -u'",
+              file=sys.stderr)
+
+    # The measurements are only saved if '--profile' is specified
+    profiler = StageProfiler(args.profile_memory, args.profile_dump)
+
+    # The pair of the positional arguments and the pairs of '-at'
+    targets = [(args.target_lang, args.word_alignment, args.target_corpus,
+                args.target_lex)]
+    targets += [(lang, alignment, corpus, "")
+                for lang, alignment, corpus in args.add_target]
+
+    with profiler.stage("load_word_alignments") as stats:
+        word_alignments = []
+        cache = WordAlignmentCache(args.cache_dir)
+        for target_lang, alignment, target_corpus, _ in targets:
+            if args.sample or args.add_corpus:
+                # Parsed by SampledAlignments or, if they are needed, by
+                # WeightedAlignments
+                word_alignments.append((None, None))
+            elif args.no_cache:
+                word_alignments.append((
+                    json_to_dict(f"{args.source_lang}_{target_lang}_word"
+                                 f"_alignment.json"),
+                    json_to_dict(f"{target_lang}_{args.source_lang}_word"
+                                 f"_alignment.json")))
             else:
-                sys.exit(
-                    "The source connective lexicon has to be a XML or TXT file"
-                    )
-        elif not args.target_lex:
+                # Parsed again if a file or the parser has changed
+                word_alignments.append(cache.word_alignments(
+                    alignment, args.source_corpus, target_corpus,
+                    args.workers, stats))
+
+    with profiler.stage("read_lexicons"):
+        try:
+            source_lex = read_lexicon(args.source_lang, args.source_lex)
+            target_lexicons = [read_lexicon(target_lang, target_lex)
+                               for target_lang, _, _, target_lex in targets]
+        except ValueError as error:
+            sys.exit(str(error))
+        target_lex = target_lexicons[0]
+        if source_lex is None and not args.target_lex\
+                or target_lex is None and not args.source_lex:
             sys.exit(
                 "If the source connectives are not in Italian, Spanish or "
                 "German, you have to provide the Path to a connective lexicon"
                 " with the argument '-sl'")
-        else:
-            source_lex = []
-
-    if args.target_lang == "it":
-        target_lex = read_xml_lex(
-            Path("connectives_and_relations/lico_d.xml"))
-    elif args.target_lang == "es":
-        target_lex = read_es_conns(
-            Path("connectives_and_relations/spanish_conns.txt"))
-    elif args.target_lang == "de":
-        target_lex = read_xml_lex(
-            Path("connectives_and_relations/dimlex.xml"))
+        for (target_lang, _, _, _), lex in zip(targets[1:],
+                                               target_lexicons[1:]):
+            if lex is None:
+                sys.exit(f"There is no connective lexicon for '{target_lang}'"
+                         f", only Italian, Spanish and German can be added"
+                         f" with '-at'")
+        source_lex = source_lex or []
+        target_lexicons = [lex or [] for lex in target_lexicons]
+
+    s_rel = None
+    t_rels = [None] * len(targets)
+    with profiler.stage("read_relations"):
+        if args.show_relation or args.database or args.relation_partition:
+            s_rel = read_relations(args.source_lang, args.source_lex)
+            t_rels = [read_relations(target_lang, target_lex)
+                      for target_lang, _, _, target_lex in targets]
+
+    source_types = None
+    target_types = [None] * len(targets)
+    if args.relation_partition:
+        relation_types = json_to_dict(
+            Path("connectives_and_relations/relations.json"))
+        source_types = assign_relation_types(s_rel, relation_types)
+        target_types = [assign_relation_types(t_rel, relation_types)
+                        for t_rel in t_rels]
+
+    previous = None
+    if args.update:
+        with profiler.stage("load_counts"):
+            try:
+                previous = json_to_dict(
+                    f"{args.source_lang}_{args.target_lang}_connectives"
+                    f"_alignment_state.json")
+            except FileNotFoundError:
+                sys.exit("'--update' requires the results of a previous run"
+                         " in this directory")
+            for lang, lang1, lang2 in (("source", args.source_lang,
+                                        args.target_lang),
+                                       ("target", args.target_lang,
+                                        args.source_lang)):
+                count_file = Path(f"{lang1}_{lang2}_connectives_alignment"
+                                  f"_count.json")
+                previous[f"{lang}_count"] = json_to_dict(count_file)\
+                    if count_file.exists() else dict()
+                previous[f"{lang}_scanned"] = set(previous[f"{lang}_scanned"])
+
+            # Added connectives are searched, removed ones are dropped
+            for lang, lex in (("source", source_lex), ("target", target_lex)):
+                seed = set(previous.get(f"{lang}_seed", ()))
+                added = sum(1 for conn in lex if conn not in seed)
+                removed = sum(1 for conn in seed if conn not in lex)
+                if added or removed:
+                    print(f"The {lang} lexicon has changed: {added} added, "
+                          f"{removed} removed connectives", file=sys.stderr)
+
+    aligners = []
+    for (_, alignment, target_corpus, _), (source_word_alignment,
+                                           target_word_alignment),\
+            lex, types in zip(targets, word_alignments, target_lexicons,
+                              target_types):
+        if args.sample:
+            aligners.append(SampledAlignments(
+                Path(alignment), Path(args.source_corpus),
+                Path(target_corpus), list(source_lex), lex, args.sample,
+                args.seed, args.sample_chunks, args.patience,
+                source_relation_types=source_types,
+                target_relation_types=types, profiler=profiler,
+                workers=args.workers))
+            continue
+        if args.add_corpus:
+            aligners.append(WeightedAlignments(
+                corpora, source_lex, lex, weights, cache,
+                source_relation_types=source_types,
+                target_relation_types=types, profiler=profiler,
+                workers=args.workers))
+            continue
+        # Every pair extends its own copy of the source lexicon
+        aligners.append(FindAlignments(
+            source_word_alignment, target_word_alignment, Path(alignment),
+            Path(args.source_corpus), Path(target_corpus), list(source_lex),
+            lex, source_types, types, profiler, args.checkpoint or None,
+            args.checkpoint_every, args.workers, args.encode, previous,
+            args.encoded_corpus or None, args.prune or None,
+            args.association_measure or None, args.association_threshold))
+    align = aligners[0]
+
+    if len(aligners) > 1:
+        MultiTargetAlignments(aligners, profiler, args.workers).find_conns(
+            word_threshold=args.word_threshold,
+            phrase_threshold=args.phrase_threshold,
+            word_min_count=args.word_count,
+            phrase_min_count=args.phrase_count,
+            limit=args.iterations)
+    elif args.resume and Path(args.checkpoint).exists():
+        # Lexicons, counts and thresholds are taken from the checkpoint
+        align.load_checkpoint()
+        align.resume()
     else:
-        if args.target_lex:
-            if args.target_lex.endswith("xml"):
-                target_lex = read_xml_lex(
-                    Path(args.target_lex))
-            elif args.target_lex.endswith("txt"):
-                target_lex = read_es_conns(
-                    Path(args.target_lex))
+        align.find_conns(lang="source", word_threshold=args.word_threshold,
+                         phrase_threshold=args.phrase_threshold,
+                         word_min_count=args.word_count,
+                         phrase_min_count=args.phrase_count,
+                         limit=args.iterations)
+
+    with profiler.stage("output"):
+        for align, (target_lang, _, _, _), t_rel in zip(aligners, targets,
+                                                        t_rels):
+            if args.show_relation:
+                # The relations are only added to the keys for the output
+                source_alignment = legacy_relation_keys(*tag_relations(
+                    align.source_conn_alignments, source_mapping=s_rel,
+                    target_mapping=t_rel))
+                target_alignment = legacy_relation_keys(*tag_relations(
+                    align.target_conn_alignments, target_mapping=s_rel,
+                    source_mapping=t_rel))
+
             else:
-                sys.exit(
-                    "The source connective lexicon has to be a XML or TXT file"
-                    )
-        elif not args.source_lex:
-            sys.exit(
-                "If the source connectives are not in Italian, Spanish or "
-                "German, you have to provide the Path to a connective lexicon"
-                " with the argument '-sl'")
-        else:
-            target_lex = []
-
-    align = FindAlignments(source_word_alignment, target_word_alignment,
-                           Path(args.word_alignment),
-                           Path(args.source_corpus), Path(args.target_corpus),
-                           source_lex, target_lex)
-
-    align.find_conns(lang="source", word_threshold=args.word_threshold,
-                     phrase_threshold=args.phrase_threshold,
-                     word_min_count=args.word_count,
-                     phrase_min_count=args.phrase_count, limit=args.iterations)
-
-    if args.show_relation:
-        if args.source_lang == "it":
-            s_rel = json_to_dict(
-                Path("connectives_and_relations/it_relations.json"))
-        elif args.source_lang == "de":
-            s_rel = json_to_dict(
-                Path("connectives_and_relations/de_relations.json"))
-        elif args.source_lex and args.source_lex.endswith("xml"):
-            s_rel = assign_relations(args.source_lex)
-        else:
-            s_rel = dict()
-
-        if args.target_lang == "it":
-            t_rel = json_to_dict(
-                Path("connectives_and_relations/it_relations.json"))
-        elif args.target_lang == "de":
-            t_rel = json_to_dict(
-                Path("connectives_and_relations/de_relations.json"))
-        elif args.target_lex and args.target_lex.endswith("xml"):
-            t_rel = assign_relations(args.target_lex)
-        else:
-            t_rel = dict()
-
-        source_alignment = add_discourse_relation(
-            align.source_conn_alignments, source_mapping=s_rel,
-            target_mapping=t_rel)
-        target_alignment = add_discourse_relation(
-            align.target_conn_alignments, target_mapping=s_rel,
-            source_mapping=t_rel)
+                target_alignment = align.target_conn_alignments
+                source_alignment = align.source_conn_alignments
 
-    else:
-        target_alignment = align.target_conn_alignments
-        source_alignment = align.source_conn_alignments
-
-    if target_alignment:
-        save_alignments(
-            f"{args.target_lang}_{args.source_lang}_connectives_alignment"
-            f".json",
-            target_alignment)
-        save_alignments(
-            f"{args.target_lang}_{args.source_lang}_connectives_alignment"
-            f"_count.json", align.target_count)
-    if source_alignment:
-        save_alignments(
-            f"{args.source_lang}_{args.target_lang}_connectives_alignment"
-            f".json",
-            source_alignment)
-        save_alignments(
-            f"{args.source_lang}_{args.target_lang}_connectives_alignment"
-            f"_count.json", align.source_count)
+            if target_alignment:
+                save_alignments(
+                    f"{target_lang}_{args.source_lang}_connectives_alignment"
+                    f".json",
+                    target_alignment)
+                save_alignments(
+                    f"{target_lang}_{args.source_lang}_connectives_alignment"
+                    f"_count.json", align.target_count)
+            if source_alignment:
+                save_alignments(
+                    f"{args.source_lang}_{target_lang}_connectives_alignment"
+                    f".json",
+                    source_alignment)
+                save_alignments(
+                    f"{args.source_lang}_{target_lang}_connectives_alignment"
+                    f"_count.json", align.source_count)
+
+            if args.sample:
+                # Probabilities with confidence intervals instead of
+                # the state for '--update'
+                for lang1, lang2, lang in ((args.source_lang, target_lang,
+                                            "source"),
+                                           (target_lang, args.source_lang,
+                                            "target")):
+                    save_alignments(
+                        f"{lang1}_{lang2}_connectives_alignment_estimate"
+                        f".json", align.estimates(lang))
+                align.close()
+            elif not args.add_corpus:
+                # Needed to add new corpus lines with '--update'
+                save_alignments(
+                    f"{args.source_lang}_{target_lang}_connectives_alignment"
+                    f"_state.json", align.update_state())
+
+            if args.prune:
+                # The largest possible overestimation of the counts
+                for lang1, lang2, errors in ((args.source_lang, target_lang,
+                                              align.source_error),
+                                             (target_lang, args.source_lang,
+                                              align.target_error)):
+                    save_alignments(
+                        f"{lang1}_{lang2}_connectives_alignment_error.json",
+                        errors)
+
+            if args.association_measure:
+                # The association of the selected alignments
+                for lang1, lang2, scores in ((args.source_lang, target_lang,
+                                              align.source_scores),
+                                             (target_lang, args.source_lang,
+                                              align.target_scores)):
+                    save_alignments(
+                        f"{lang1}_{lang2}_connectives_alignment_association"
+                        f".json", scores)
+
+            if args.relation_partition:
+                partitions = align.partition_by_relation()
+                for rel_type, partition in partitions.items():
+                    for lang1, lang2, lang in ((args.source_lang, target_lang,
+                                                "source"),
+                                               (target_lang, args.source_lang,
+                                                "target")):
+                        if partition[f"{lang}_conn_alignments"]:
+                            save_alignments(
+                                f"{lang1}_{lang2}_connectives_alignment"
+                                f"_{rel_type}.json",
+                                partition[f"{lang}_conn_alignments"])
+                            save_alignments(
+                                f"{lang1}_{lang2}_connectives_alignment"
+                                f"_{rel_type}_count.json",
+                                partition[f"{lang}_count"])
+
+            if args.database:
+                # Both directions in one transaction
+                save_to_sqlite(args.database, args.source_lang, target_lang,
+                               align.source_conn_alignments,
+                               align.source_count, source_lex=align.source_lex,
+                               target_lex=align.target_lex,
+                               source_relations=s_rel, target_relations=t_rel,
+                               target_probabilities=align
+                               .target_conn_alignments,
+                               target_counts=align.target_count)
+
+    if args.profile:
+        profiler.save(args.profile)
+
+    # The run is complete, nothing to continue
+    if args.checkpoint:
+        Path(args.checkpoint).unlink(missing_ok=True)
@@ -7,14 +7,23 @@
 
 """Connectives Alignment"""
 
-from collections import defaultdict
+import json
+import os
+from collections import Counter, defaultdict
+from contextlib import nullcontext
 
+from association import DEFAULT_THRESHOLDS, association_filter
 from processing_filtering import (filter_most_common_conns,
-                                  alignment_probabilities,
                                   conn_count,
-                                  remove_low_counts,
-                                  remove_punct_values)
-from parse_alignments import parse_phrase_alignments, parse_discontinuous
+                                  count_probabilities,
+                                  json_to_dict,
+                                  merge_punctuation,
+                                  remove_low_counts)
+from parse_alignments import (parse_discontinuous, parse_encoded_phrases,
+                              parse_multi_target, parse_phrase_alignments)
+from lexicon import Lexicon
+from pruning import PrunedAlignments, SpaceSaving, pruning_capacity
+from vocabulary import EncodedCorpus
 
 
 class FindAlignments:
@@ -32,10 +41,48 @@ class FindAlignments:
         Path to the source corpus
     target_corpus : str
         Path to the target corpus
-    target_lex : list
+    target_lex : list or Lexicon
         Target connectives filtered for a discourse relation type
-    source_lex : list
+    source_lex : list or Lexicon
         Source connectives filtered for a discourse relation type
+    source_relation_types : dict, optional
+        Source connectives with a set of relation types as values, if
+        specified the alignments can be partitioned by relation type
+    target_relation_types : dict, optional
+        Target connectives with a set of relation types as values
+    profiler : StageProfiler, optional
+        If specified, the stages of every round are measured
+    checkpoint : str, optional
+        If specified, the state is saved in this file at the beginning
+        of every round and every checkpoint_every lines of a scan
+    checkpoint_every : int, optional
+        The number of corpus lines between two checkpoints of a scan
+    workers : int, optional
+        The number of processes for the scans of the corpus
+    encode : bool, optional
+        If True, the corpus is kept in memory as integer ids for the
+        scans of continuous phrases
+    previous : dict, optional
+        The result of an earlier run on the first lines of the corpus
+        with the keys "lines", "source_count", "target_count",
+        "source_scanned" and "target_scanned" (see update_state). Its
+        connectives are only searched in the following lines and the
+        counts are added
+    corpus_file : str, optional
+        A file in which the encoded corpus and its line index are kept
+        between runs, new lines of the corpus are added. Implies encode
+    prune_error : float, optional
+        If specified, only a fixed number of counters is kept for every
+        connective during the scans (see pruning.py), derived from the
+        thresholds and this largest error of a probability as a
+        fraction of the smaller threshold
+    association : str, optional
+        If specified, the alignments are selected by an association
+        measure ("llr", "dice" or "pmi", see association.py) instead of
+        the probability thresholds, the minimum counts still apply
+    association_threshold : float, optional
+        The minimum association of an alignment, the default of the
+        measure if not specified
 
     Attributes
     ----------
@@ -49,10 +96,12 @@ class FindAlignments:
         Path to the source corpus
     target_corpus : str
         Path to the target corpus
-    target_lex : list
-        Target connectives filtered for a discourse relation type
-    source_lex : list
-        Source connectives filtered for a discourse relation type
+    target_lex : Lexicon
+        Target connectives, extended by the connectives found in every
+        round
+    source_lex : Lexicon
+        Source connectives, extended by the connectives found in every
+        round
     counter : int
         counts the rounds to find new alignments
     source_conn_alignments: dict
@@ -63,22 +112,363 @@ class FindAlignments:
         Source alignments (unfiltered, as counts)
     target_count : dict
         Target alignments (unfiltered, as counts)
+    source_relation_types : dict or None
+        Source connectives with their relation types, aligned
+        connectives inherit the relation types
+    target_relation_types : dict or None
+        Target connectives with their relation types, aligned
+        connectives inherit the relation types
+    profiler : StageProfiler or None
+        Measures the stages of every round
+    checkpoint : str or None
+        The file for the checkpoints
+    checkpoint_every : int
+        The number of corpus lines between two checkpoints of a scan
+    workers : int
+        The number of processes for the scans of the corpus
+    encode : bool
+        If True, the corpus is kept in memory as integer ids
+    corpus_file : str or None
+        The file for the encoded corpus
+    corpus : EncodedCorpus or None
+        The corpus as integer ids, created in the first round
+    previous : dict or None
+        The result of an earlier run on the first lines of the corpus
+    lines : int
+        The number of lines of the corpus
+    source_scanned : set
+        The source connectives whose counts are complete
+    target_scanned : set
+        The target connectives whose counts are complete
+    prune_error : float or None
+        The largest error of a pruned probability as a fraction of the
+        smaller threshold, None without pruning
+    source_error : dict
+        The largest possible overestimation of the pruned source counts
+    target_error : dict
+        The largest possible overestimation of the pruned target counts
+    association : str or None
+        The association measure, None for the probability thresholds
+    association_threshold : float or None
+        The minimum association of an alignment
+    source_scores : dict
+        The association of the filtered source alignments
+    target_scores : dict
+        The association of the filtered target alignments
     """
 
     def __init__(self, source_alignment_file, target_alignment_file, alignment,
-                 source_corpus, target_corpus, source_lex, target_lex):
+                 source_corpus, target_corpus, source_lex, target_lex,
+                 source_relation_types=None, target_relation_types=None,
+                 profiler=None, checkpoint=None, checkpoint_every=1000000,
+                 workers=1, encode=False, previous=None, corpus_file=None,
+                 prune_error=None, association=None,
+                 association_threshold=None):
         self.source_target = source_alignment_file
         self.target_source = target_alignment_file
         self.alignment = alignment
         self.source_corpus = source_corpus
         self.target_corpus = target_corpus
-        self.target_lex = target_lex
-        self.source_lex = source_lex
+        self.target_lex = target_lex if isinstance(target_lex, Lexicon)\
+            else Lexicon(target_lex)
+        self.source_lex = source_lex if isinstance(source_lex, Lexicon)\
+            else Lexicon(source_lex)
         self.counter = 0
         self.source_conn_alignments = dict()
         self.target_conn_alignments = dict()
         self.source_count = dict()
         self.target_count = dict()
+        self.profiler = profiler
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.workers = workers
+        self.encode = encode or bool(corpus_file)
+        self.corpus_file = corpus_file
+        self.corpus = None
+        self.previous = previous
+        self.lines = 0
+        self.source_scanned = set()
+        self.target_scanned = set()
+        self.prune_error = prune_error
+        self.source_error = dict()
+        self.target_error = dict()
+        # The number of counters of the pruned scans of a round
+        self._capacity = None
+        self.association = association
+        if association is not None and association_threshold is None:
+            association_threshold = DEFAULT_THRESHOLDS[association]
+        self.association_threshold = association_threshold
+        self.source_scores = dict()
+        self.target_scores = dict()
+        # The occurrences of the aligned words and the size of the word
+        # alignments for the association measures
+        self._marginals = dict()
+        # The current round and the saved round to continue
+        self._round = None
+        self._resume = None
+        self.source_relation_types = None
+        self.target_relation_types = None
+        if source_relation_types is not None\
+                or target_relation_types is not None:
+            self.source_relation_types = defaultdict(set)
+            self.target_relation_types = defaultdict(set)
+            for conn, types in (source_relation_types or dict()).items():
+                self.source_relation_types[conn].update(types)
+            for conn, types in (target_relation_types or dict()).items():
+                self.target_relation_types[conn].update(types)
+
+    def _stage(self, name, lang):
+        """Measures a stage of the current round if a profiler is used"""
+
+        if self.profiler is None:
+            return nullcontext(Counter())
+        return self.profiler.stage(name, round=self.counter, lang=lang)
+
+    def save_checkpoint(self, stage="start", offset=0, phrases=None,
+                        partial=None):
+        """Saves the state of the search in the checkpoint file
+
+        Parameters
+        ----------
+        stage : str
+            "start", "phrases" or "discontinuous", the stage of the
+            current round
+        offset : int
+            The number of corpus lines already scanned in the stage
+        phrases : dict, optional
+            The phrase alignments of the round if the stage is
+            "discontinuous"
+        partial : dict, optional
+            The alignments of the scanned lines of the stage
+
+        Returns
+        -------
+        None
+        """
+
+        def as_counts(alignments):
+            if alignments is None:
+                return None
+            return {conn: Counter(words) for conn, words in alignments.items()}
+
+        def as_lists(types):
+            if types is None:
+                return None
+            return {conn: sorted(rel_types)
+                    for conn, rel_types in types.items()}
+
+        state = {"counter": self.counter,
+                 "source_lex": self.source_lex.origin,
+                 "target_lex": self.target_lex.origin,
+                 "source_count": self.source_count,
+                 "target_count": self.target_count,
+                 "source_conn_alignments": self.source_conn_alignments,
+                 "target_conn_alignments": self.target_conn_alignments,
+                 "lines": self.lines,
+                 "source_scanned": sorted(self.source_scanned),
+                 "target_scanned": sorted(self.target_scanned),
+                 "source_scores": self.source_scores,
+                 "target_scores": self.target_scores,
+                 "source_relation_types": as_lists(
+                     self.source_relation_types),
+                 "target_relation_types": as_lists(
+                     self.target_relation_types),
+                 "round": {**self._round, "stage": stage, "offset": offset,
+                           "phrases": as_counts(phrases),
+                           "partial": as_counts(partial)}}
+
+        # A checkpoint is never left half-written
+        with open(f"{self.checkpoint}.tmp", "w", encoding="utf-8") as file:
+            json.dump(state, file, ensure_ascii=False)
+        os.replace(f"{self.checkpoint}.tmp", self.checkpoint)
+
+    def load_checkpoint(self, file=None):
+        """Restores the state saved with save_checkpoint
+
+        Parameters
+        ----------
+        file : str, optional
+            The checkpoint file, by default the file of the attribute
+            checkpoint
+
+        Returns
+        -------
+        None
+        """
+
+        state = json_to_dict(file or self.checkpoint)
+        self.counter = state["counter"]
+        self.source_lex = Lexicon(state["source_lex"])
+        self.target_lex = Lexicon(state["target_lex"])
+        self.source_count = {conn: Counter(counts) for conn, counts
+                             in state["source_count"].items()}
+        self.target_count = {conn: Counter(counts) for conn, counts
+                             in state["target_count"].items()}
+        self.source_conn_alignments = state["source_conn_alignments"]
+        self.target_conn_alignments = state["target_conn_alignments"]
+        self.lines = state.get("lines", 0)
+        for lang in ("source", "target"):
+            types = state[f"{lang}_relation_types"]
+            if types is not None:
+                types = defaultdict(set, {conn: set(rel_types) for conn,
+                                          rel_types in types.items()})
+            setattr(self, f"{lang}_relation_types", types)
+            setattr(self, f"{lang}_scanned",
+                    set(state.get(f"{lang}_scanned", ())))
+            setattr(self, f"{lang}_scores",
+                    state.get(f"{lang}_scores", dict()))
+        self._resume = state["round"]
+
+    def resume(self):
+        """Continues the search at the round and corpus line of the
+        loaded checkpoint
+
+        Returns
+        -------
+        None
+        """
+
+        saved = self._resume
+        # find_conns counts the round again
+        self.counter -= 1
+        self.find_conns(saved["lex"], saved["lang"], **saved["params"])
+
+    def _scan(self, parse, stage, phrases, lang_pos, stats, resume,
+              finished=None):
+        """Scans the corpus for phrases, continues a saved scan
+
+        Parameters
+        ----------
+        parse : function
+            parse_phrase_alignments or parse_discontinuous
+        stage : str
+            "phrases" or "discontinuous"
+        phrases : list
+            The phrases to search
+        lang_pos : int
+            1 for the source language, 2 for the target language
+        stats : Counter
+            The counters of the stage
+        resume : dict or None
+            The saved round if the search was continued
+        finished : dict, optional
+            The phrase alignments of the round, saved with the
+            checkpoints of the discontinuous scan
+
+        Returns
+        -------
+        phrase_alignments : defaultdict
+            A dictionary with the alignments for the phrases
+        """
+
+        def as_lists(counts):
+            if counts is None:
+                return None
+            return defaultdict(list, {conn: list(Counter(words).elements())
+                                      for conn, words in counts.items()})
+
+        start = 0
+        partial = None
+        if resume:
+            if resume["stage"] == stage:
+                start = resume["offset"]
+                partial = as_lists(resume["partial"])
+            elif resume["stage"] == "discontinuous":
+                # The phrase scan was finished before
+                return as_lists(resume["phrases"])
+
+        def save(offset, alignments):
+            self.save_checkpoint(stage, offset, finished, alignments)
+
+        checkpoint = save if self.checkpoint else None
+        if self.previous is None:
+            return self._parse(parse, stage, phrases, lang_pos, stats,
+                               start, partial, checkpoint)
+
+        # Connectives of the earlier run only in the new lines
+        lang = "source" if lang_pos == 1 else "target"
+        scanned = self.previous[f"{lang}_scanned"]
+        known = [phrase for phrase in phrases if phrase in scanned]
+        unknown = [phrase for phrase in phrases if phrase not in scanned]
+        phrase_alignments = self._parse(parse, stage, known, lang_pos,
+                                        stats, self.previous["lines"])
+        if unknown and self.corpus is not None and stage == "phrases":
+            # Only the lines that contain all tokens of a phrase
+            lines = self.corpus.candidate_lines(unknown, lang_pos)
+            stats["indexed_lines"] += len(lines)
+            phrase_alignments.update(parse_encoded_phrases(
+                self.corpus.subset(lines), unknown, lang=lang_pos,
+                stats=stats, workers=self.workers))
+        elif unknown:
+            phrase_alignments.update(self._parse(parse, stage, unknown,
+                                                 lang_pos, stats))
+        return phrase_alignments
+
+    def _parse(self, parse, stage, phrases, lang_pos, stats, start=0,
+               partial=None, checkpoint=None):
+        """Scans the corpus from a line on and counts its lines"""
+
+        scanned = stats["sentences_scanned"]
+        if partial is None and self._capacity:
+            partial = PrunedAlignments(self._capacity)
+        if self.corpus is not None and stage == "phrases":
+            phrase_alignments = parse_encoded_phrases(
+                self.corpus, phrases, lang=lang_pos, stats=stats,
+                start=start, partial=partial, checkpoint=checkpoint,
+                checkpoint_every=self.checkpoint_every,
+                workers=self.workers)
+        else:
+            phrase_alignments = parse(
+                self.alignment, self.source_corpus, self.target_corpus,
+                phrases, lang=lang_pos, stats=stats, start=start,
+                partial=partial, checkpoint=checkpoint,
+                checkpoint_every=self.checkpoint_every,
+                workers=self.workers)
+        self.lines = start + stats["sentences_scanned"] - scanned
+        return phrase_alignments
+
+    def _encode_corpus(self, stats):
+        """Creates the encoded corpus or loads it and adds new lines"""
+
+        if self.corpus_file and os.path.exists(self.corpus_file):
+            self.corpus = EncodedCorpus.load(self.corpus_file)
+            added = self.corpus.extend_from_files(
+                self.alignment, self.source_corpus, self.target_corpus)
+        else:
+            self.corpus = EncodedCorpus.from_files(
+                self.alignment, self.source_corpus, self.target_corpus)
+            added = len(self.corpus)
+        if self.corpus_file and added:
+            # The line index is saved with the corpus
+            self.corpus.index_lines()
+            self.corpus.save(self.corpus_file)
+        stats["lines"] += len(self.corpus)
+        stats["added_lines"] += added
+        stats["tokens"] += len(self.corpus.source) + len(self.corpus.target)
+        stats["vocabulary"] += len(self.corpus.vocabulary)
+
+    def round_lexicon(self, lex, lang):
+        """Returns the connectives that a round searches
+
+        Parameters
+        ----------
+        lex : list or Lexicon
+            The connectives passed to find_conns, all connectives of
+            the language if empty
+        lang : str
+            The language is "source" or "target" language
+
+        Returns
+        -------
+        lex : Lexicon
+            The connectives of the round
+        """
+
+        if not lex:
+            lex = self.target_lex if lang == "target" else self.source_lex
+        if not isinstance(lex, Lexicon):
+            lex = Lexicon(lex)
+        return lex
 
     def find_conns(self, lex=[], lang="source", word_threshold=0.02,
                    phrase_threshold=0.02, word_min_count=20,
@@ -87,7 +477,7 @@ class FindAlignments:
 
         Parameters
         ----------
-        lex : list
+        lex : list or Lexicon
             The lexicon used to find new alignments (source or target)
         lang : str
             The language is "source" or "target" language
@@ -107,97 +497,499 @@ class FindAlignments:
         None
         """
 
+        while True:
+            lex, lang = self.find_round(lex, lang, word_threshold,
+                                        phrase_threshold, word_min_count,
+                                        phrase_min_count, limit)
+            if self.counter >= limit:
+                return
+
+    def find_round(self, lex, lang, word_threshold=0.02,
+                   phrase_threshold=0.02, word_min_count=20,
+                   phrase_min_count=10, limit=1, scanned=None):
+        """Finds new connective alignments in one round
+
+        Parameters
+        ----------
+        lex : list or Lexicon
+            The lexicon used to find new alignments (source or target)
+        lang : str
+            The language is "source" or "target" language
+        word_threshold : float
+            The minimum probability for an alignment for a single word
+        phrase_threshold : float
+            The minimum probability for an alignment for a phrase
+        word_min_count : int
+            The minimum number for an alignment for a single word
+        phrase_min_count : int
+            The minimum number for an alignment for a phrase
+        limit : int
+            The number of rounds, saved with the checkpoints
+        scanned : tuple, optional
+            The phrase and the discontinuous alignments of the round if
+            the corpus was already scanned, e.g. by MultiTargetAlignments
+
+        Returns
+        -------
+        lex : list or Lexicon
+            The connectives for the next round
+        lang : str
+            The language of the next round
+        """
+
         self.counter += 1
+        lex = self.round_lexicon(lex, lang)
 
         if lang == "target":
-            alignments = self.target_source
             count_dict = self.target_count
-            lang_pos = 2
-            if not lex:
-                lex = self.target_lex
-
             other_lex = self.source_lex
         elif lang == "source":
-            alignments = self.source_target
             count_dict = self.source_count
-            lang_pos = 1
-            if not lex:
-                lex = self.source_lex
             other_lex = self.target_lex
         else:
             pass
 
+        self._round = {"lex": list(lex), "lang": lang,
+                       "params": {"word_threshold": word_threshold,
+                                  "phrase_threshold": phrase_threshold,
+                                  "word_min_count": word_min_count,
+                                  "phrase_min_count": phrase_min_count,
+                                  "limit": limit}}
+        # Only the first round after load_checkpoint is continued
+        resume = self._resume
+        self._resume = None
+        if self.checkpoint and not resume:
+            self.save_checkpoint()
+        if self.prune_error:
+            self._capacity = pruning_capacity(word_threshold,
+                                              phrase_threshold,
+                                              self.prune_error)
+
         new_conns = []
-        new_alignments = defaultdict(list)
-        # Find all alignments for the current connective lexicon
-        single_words = [word for word in lex if len(word.split()) == 1]
-        phrases = [phrase for phrase in lex if len(phrase.split()) > 1
-                   and "..." not in phrase]
-        discontinuous = [phrase for phrase in lex if "..." in phrase]
-
-        for key in single_words:
-            try:
-                new_alignments[key] = alignments[key]
-            except KeyError:
-                pass
-
-        new_phrase_alignments = parse_phrase_alignments(
-            self.alignment, self.source_corpus, self.target_corpus,
-            phrases, lang=lang_pos)
-
-        new_discontinuous = parse_discontinuous(
-            self.alignment, self.source_corpus, self.target_corpus,
-            discontinuous, lang=lang_pos)
-
-        single_count = conn_count(new_alignments, lex)
-        phrase_count = conn_count(new_phrase_alignments, phrases)
-        discont_count = conn_count(new_discontinuous, discontinuous)
-        if lang == "target":
-            self.target_count.update(single_count)
-            self.target_count.update(phrase_count)
-            self.target_count.update(discont_count)
-        elif lang == "source":
-            self.source_count.update(single_count)
-            self.source_count.update(phrase_count)
-            self.source_count.update(discont_count)
-
-        # Combine the single word and phrase alignments
-        new_alignments = {**new_alignments, **new_phrase_alignments,
-                          **new_discontinuous}
-        new_alignments = remove_punct_values(new_alignments)
-        new_alignments = alignment_probabilities(new_alignments)
-        new_alignments = filter_most_common_conns(new_alignments,
-                                                  word_threshold,
-                                                  phrase_threshold)
-        new_alignments = remove_low_counts(new_alignments, count_dict,
-                                           word_min_count, phrase_min_count)
-
-        # Find new connectives
-        for conns in new_alignments.values():
-            for word, count in conns.items():
-                if word and word not in other_lex:
-                    new_conns.append(word)
-        new_conns = list(set(new_conns))
+        counts = self._count_round(lex, lang, resume, scanned)
+
+        with self._stage("filtering", lang) as stats:
+            count_dict.update(counts)
+            if lang == "target":
+                self.target_scanned.update(lex)
+            elif lang == "source":
+                self.source_scanned.update(lex)
+
+            # The thresholds are applied to the values of
+            # threshold_values, the probabilities are kept
+            probabilities = count_probabilities(counts)
+            selected, selected_counts = self.threshold_values(counts, lang)
+            if self.association is None:
+                selected = filter_most_common_conns(selected,
+                                                    word_threshold,
+                                                    phrase_threshold)
+            else:
+                selected, scores = association_filter(
+                    selected, selected_counts, self.association,
+                    self.association_threshold, *self.word_marginals(lang),
+                    phrase_threshold)
+                if lang == "target":
+                    self.target_scores.update(scores)
+                else:
+                    self.source_scores.update(scores)
+            selected = remove_low_counts(selected, selected_counts,
+                                         word_min_count, phrase_min_count)
+            new_alignments = {conn: {word: probability for word, probability
+                                     in probabilities[conn].items()
+                                     if word in selected[conn]}
+                              for conn in selected}
+
+            # Aligned words inherit the relation types of the connective
+            if self.source_relation_types is not None:
+                if lang == "target":
+                    types = self.target_relation_types
+                    other_types = self.source_relation_types
+                else:
+                    types = self.source_relation_types
+                    other_types = self.target_relation_types
+                for conn, conns in new_alignments.items():
+                    for word in conns:
+                        if word and conn in types:
+                            other_types[word].update(types[conn])
+
+            # Find new connectives
+            for conns in new_alignments.values():
+                for word, count in conns.items():
+                    if word and word not in other_lex:
+                        new_conns.append(word)
+            new_conns = list(set(new_conns))
+            stats["alignments"] += sum(len(conns)
+                                       for conns in new_alignments.values())
+            stats["new_connectives"] += len(new_conns)
 
         if lang == "target":
             self.target_conn_alignments.update(new_alignments)
-            self.source_lex += new_conns
+            self.source_lex.update(new_conns, self.counter)
             lex = self.source_lex
             lang = "source"
         else:
             self.source_conn_alignments.update(new_alignments)
-            self.target_lex += new_conns
+            self.target_lex.update(new_conns, self.counter)
             lex = self.target_lex
             lang = "target"
 
-        if self.counter == limit:
-            return
-
         if self.counter == 1:
             # Ensures that the first entries of the xml lexicon are
             # not ignored
-            self.find_conns(lex, lang, word_threshold, phrase_threshold,
-                            word_min_count, phrase_min_count, limit)
+            return lex, lang
+        return new_conns, lang
+
+    def threshold_values(self, counts, lang):
+        """Returns the probabilities and counts the thresholds are
+        applied to
+
+        These are the probabilities and counts of the round, subclasses
+        can use more cautious values, e.g. bounds of estimates. Pruned
+        counts can be overestimated, the thresholds are applied to the
+        counts minus their largest possible overestimation, divided by
+        the occurrences of the connective.
+
+        Parameters
+        ----------
+        counts : dict
+            The counted alignments of the round
+        lang : str
+            The language is "source" or "target" language
+
+        Returns
+        -------
+        probabilities : dict
+            The probabilities for the probability thresholds
+        counts : dict
+            The counts for the minimum counts
+        """
+
+        if not self._capacity:
+            return count_probabilities(counts), counts
+
+        errors = self.target_error if lang == "target" else self.source_error
+        lower_counts = {conn: Counter({word: count - errors.get(conn, {})
+                                       .get(word, 0)
+                                       for word, count in words.items()})
+                        for conn, words in counts.items()}
+        probabilities = dict()
+        for conn, words in lower_counts.items():
+            # The pruned counts still add up to the occurrences
+            total = sum(counts[conn].values())
+            if total:
+                probabilities[conn] = {word: count / total for word, count
+                                       in merge_punctuation(words).items()}
+        return probabilities, lower_counts
+
+    def word_marginals(self, lang):
+        """Returns the occurrences of the aligned words of a round
+
+        Parameters
+        ----------
+        lang : str
+            The language of the connectives of the round, the aligned
+            words are in the other language
+
+        Returns
+        -------
+        marginals : dict
+            The word alignment of the other language, the lengths of
+            the values are the occurrences of the words
+        total : int
+            The number of aligned units of the word alignment
+        """
+
+        if lang not in self._marginals:
+            marginals = self.source_target if lang == "target"\
+                else self.target_source
+            if marginals is None:
+                raise ValueError("The association measures need the word "
+                                 "alignments")
+            self._marginals[lang] = (marginals, sum(
+                len(words) for words in marginals.values()))
+        return self._marginals[lang]
+
+    def _count_round(self, lex, lang, resume=None, scanned=None):
+        """Counts the alignments of the connectives of a round
+
+        Parameters
+        ----------
+        lex : Lexicon
+            The connectives of the round
+        lang : str
+            The language is "source" or "target" language
+        resume : dict, optional
+            The saved round if the search was continued
+        scanned : tuple, optional
+            The phrase and the discontinuous alignments of the round if
+            the corpus was already scanned
+
+        Returns
+        -------
+        counts : dict
+            The counted alignments of every connective
+        """
+
+        if lang == "target":
+            alignments = self.target_source
+            lang_pos = 2
+        else:
+            alignments = self.source_target
+            lang_pos = 1
+
+        new_alignments = defaultdict(list)
+        # Find all alignments for the current connective lexicon
+        single_words = lex.singles
+        phrases = lex.phrases
+        discontinuous = lex.discontinuous
+
+        with self._stage("single_words", lang) as stats:
+            for key in single_words:
+                try:
+                    new_alignments[key] = alignments[key]
+                except KeyError:
+                    continue
+                if self._capacity:
+                    new_alignments[key] = SpaceSaving(self._capacity)
+                    new_alignments[key].extend(alignments[key])
+            stats["connectives"] += len(single_words)
+            stats["matches"] += len(new_alignments)
+
+        if scanned is not None:
+            new_phrase_alignments, new_discontinuous = scanned
         else:
-            self.find_conns(new_conns, lang, word_threshold, phrase_threshold,
-                            word_min_count, phrase_min_count, limit)
+            new_phrase_alignments, new_discontinuous = self._scan_round(
+                phrases, discontinuous, lang, lang_pos, resume)
+
+        with self._stage("counting", lang):
+            # Combine the single word and phrase alignments
+            counts = {**conn_count(new_alignments, lex),
+                      **conn_count(new_phrase_alignments, phrases),
+                      **conn_count(new_discontinuous, discontinuous)}
+            if self._capacity:
+                errors = self.target_error if lang == "target"\
+                    else self.source_error
+                for alignments in (new_alignments, new_phrase_alignments,
+                                   new_discontinuous):
+                    errors.update({conn: dict(words.errors) for conn, words
+                                   in alignments.items()
+                                   if getattr(words, "errors", None)})
+            if self.previous is not None:
+                # Adds the counts of the lines of the earlier run, the
+                # single words are taken from the updated word alignment
+                previous = self.previous[f"{lang}_count"]
+                scanned = self.previous[f"{lang}_scanned"]
+                for conn in phrases + discontinuous:
+                    if conn in scanned and conn in previous:
+                        counts[conn] = Counter(previous[conn])\
+                            + counts.get(conn, Counter())
+        return counts
+
+    def _scan_round(self, phrases, discontinuous, lang, lang_pos, resume):
+        """Scans the corpus for the phrases of a round
+
+        Returns
+        -------
+        new_phrase_alignments : defaultdict
+            The alignments for the continuous phrases
+        new_discontinuous : defaultdict
+            The alignments for the discontinuous phrases
+        """
+
+        if self.encode and self.corpus is None:
+            with self._stage("encode_corpus", lang) as stats:
+                self._encode_corpus(stats)
+
+        with self._stage("phrase_scan", lang) as stats:
+            new_phrase_alignments = self._scan(
+                parse_phrase_alignments, "phrases", phrases, lang_pos,
+                stats, resume)
+            stats["connectives"] += len(phrases)
+        if self.checkpoint and not (resume and resume["stage"]
+                                    == "discontinuous"):
+            self.save_checkpoint("discontinuous", 0, new_phrase_alignments)
+
+        with self._stage("discontinuous_scan", lang) as stats:
+            new_discontinuous = self._scan(
+                parse_discontinuous, "discontinuous", discontinuous,
+                lang_pos, stats, resume, new_phrase_alignments)
+            stats["connectives"] += len(discontinuous)
+        return new_phrase_alignments, new_discontinuous
+
+    def update_state(self):
+        """Returns what a later run needs to add new corpus lines
+
+        Returns
+        -------
+        state : dict
+            The number of corpus lines, the connectives of the lexicon
+            files and the connectives whose counts are complete for
+            both languages
+        """
+
+        return {"lines": self.lines,
+                "source_seed": self.source_lex.seed(),
+                "target_seed": self.target_lex.seed(),
+                "source_scanned": sorted(self.source_scanned),
+                "target_scanned": sorted(self.target_scanned)}
+
+    def partition_by_relation(self):
+        """Partitions the alignments and counts by relation type
+
+        A single run with the complete lexicons replaces one run per
+        relation type: every connective is attributed to all relation
+        types of its lexicon entry and of the connectives it was
+        aligned to.
+
+        Returns
+        -------
+        partitions : dict
+            Relation types as keys and dictionaries with the keys
+            "source_conn_alignments", "target_conn_alignments",
+            "source_count" and "target_count" as values
+        """
+
+        if self.source_relation_types is None:
+            raise ValueError("No relation types were specified")
+
+        partitions = defaultdict(lambda: {"source_conn_alignments": dict(),
+                                          "target_conn_alignments": dict(),
+                                          "source_count": dict(),
+                                          "target_count": dict()})
+        tables = (("source_conn_alignments", self.source_conn_alignments,
+                   self.source_relation_types),
+                  ("source_count", self.source_count,
+                   self.source_relation_types),
+                  ("target_conn_alignments", self.target_conn_alignments,
+                   self.target_relation_types),
+                  ("target_count", self.target_count,
+                   self.target_relation_types))
+        for name, table, types in tables:
+            for conn, value in table.items():
+                for rel_type in types.get(conn, ()):
+                    partitions[rel_type][name][conn] = value
+
+        return dict(partitions)
+
+
+class MultiTargetAlignments:
+    """Finds connective alignments of one source language with several
+    target languages
+
+    The rounds of all language pairs run side by side. In the rounds of
+    the source language the source corpus is scanned once for the
+    connectives of all pairs and the alignments are passed on to every
+    pair. The rounds of the target languages scan the corpus of their
+    pair.
+
+    Parameters
+    ----------
+    aligners : list
+        FindAlignments for every target language, all with the same
+        source corpus and source lexicon file
+    profiler : StageProfiler, optional
+        If specified, the shared scans are measured
+    workers : int, optional
+        The number of processes for the shared scans
+
+    Attributes
+    ----------
+    aligners : list
+        FindAlignments for every target language
+    profiler : StageProfiler or None
+        Measures the shared scans
+    workers : int
+        The number of processes for the shared scans
+    counter : int
+        counts the rounds to find new alignments
+    """
+
+    def __init__(self, aligners, profiler=None, workers=1):
+        source_corpora = {str(aligner.source_corpus) for aligner in aligners}
+        if len(source_corpora) > 1:
+            raise ValueError("All language pairs need the same source "
+                             "corpus")
+        for aligner in aligners:
+            if aligner.checkpoint or aligner.previous is not None\
+                    or aligner.encode:
+                raise ValueError("Checkpoints, updates and encoded corpora "
+                                 "are not supported with several target "
+                                 "languages")
+        self.aligners = aligners
+        self.profiler = profiler
+        self.workers = workers
+        self.counter = 0
+
+    def _stage(self, name, lang):
+        """Measures a stage of the current round if a profiler is used"""
+
+        if self.profiler is None:
+            return nullcontext(Counter())
+        return self.profiler.stage(name, round=self.counter, lang=lang,
+                                   targets=len(self.aligners))
+
+    def _scan_source(self, lexicons):
+        """Scans the source corpus once for the connectives of all pairs
+
+        Parameters
+        ----------
+        lexicons : list
+            The connectives of the round for every pair
+
+        Returns
+        -------
+        scanned : list
+            The phrase and the discontinuous alignments for every pair
+        """
+
+        with self._stage("multi_target_scan", "source") as stats:
+            scanned = parse_multi_target(
+                self.aligners[0].source_corpus,
+                [aligner.alignment for aligner in self.aligners],
+                [aligner.target_corpus for aligner in self.aligners],
+                [lex.phrases for lex in lexicons],
+                [lex.discontinuous for lex in lexicons],
+                stats=stats, workers=self.workers)
+            stats["connectives"] += len({conn for lex in lexicons
+                                         for conn in lex.phrases
+                                         + lex.discontinuous})
+        for aligner in self.aligners:
+            aligner.lines = stats["sentences_scanned"]
+        return scanned
+
+    def find_conns(self, word_threshold=0.02, phrase_threshold=0.02,
+                   word_min_count=20, phrase_min_count=10, limit=1):
+        """Finds new connective alignments for all pairs
+
+        Parameters
+        ----------
+        word_threshold : float
+            The minimum probability for an alignment for a single word
+        phrase_threshold : float
+            The minimum probability for an alignment for a phrase
+        word_min_count : int
+            The minimum number for an alignment for a single word
+        phrase_min_count : int
+            The minimum number for an alignment for a phrase
+        limit : int
+            The number of rounds
+
+        Returns
+        -------
+        None
+        """
+
+        lexes = [[] for _ in self.aligners]
+        lang = "source"
+        while self.counter < limit:
+            self.counter += 1
+            lexicons = [aligner.round_lexicon(lex, lang)
+                        for aligner, lex in zip(self.aligners, lexes)]
+            scanned = [None] * len(self.aligners)
+            if lang == "source":
+                scanned = self._scan_source(lexicons)
+            for pos, aligner in enumerate(self.aligners):
+                lexes[pos], next_lang = aligner.find_round(
+                    lexicons[pos], lang, word_threshold, phrase_threshold,
+                    word_min_count, phrase_min_count, limit, scanned[pos])
+            lang = next_lang
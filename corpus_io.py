@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Reading Compressed Corpora and Alignments"""
+
+import bz2
+import gzip
+import io
+import lzma
+import queue
+import threading
+from collections import deque
+from contextlib import ExitStack, closing
+from itertools import islice
+from pathlib import Path
+
+
+def _open_zstd(file):
+    """Opens a Zstandard file for binary reading"""
+
+    try:
+        # Part of the standard library since Python 3.14
+        from compression import zstd
+        return zstd.open(file, "rb")
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError(f"Reading {file} requires the package "
+                          "'zstandard'") from None
+    return zstandard.ZstdDecompressor().stream_reader(open(file, "rb"),
+                                                      closefd=True)
+
+
+OPENERS = {".gz": gzip.open,
+           ".bz2": bz2.open,
+           ".xz": lzma.open,
+           ".lzma": lzma.open,
+           ".zst": _open_zstd}
+
+
+class BackgroundReader(io.RawIOBase):
+    """Reads a binary stream in a separate thread
+
+    The decompression of the next chunks overlaps with the processing
+    of the current ones. At most queue_size chunks are read ahead.
+
+    Parameters
+    ----------
+    stream : file object
+        A binary stream, e.g. gzip.open(file)
+    chunk_size : int, optional
+        The number of bytes read at once
+    queue_size : int, optional
+        The maximum number of chunks read in advance
+    """
+
+    def __init__(self, stream, chunk_size=1 << 20, queue_size=8):
+        super().__init__()
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._queue = queue.Queue(queue_size)
+        self._stop = threading.Event()
+        self._chunk = memoryview(b"")
+        self._eof = False
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self):
+        try:
+            while not self._stop.is_set():
+                chunk = self._stream.read(self._chunk_size)
+                self._put(chunk)
+                if not chunk:
+                    break
+        except Exception as error:
+            self._put(error)
+
+    def _put(self, item):
+        # Gives up if the reader was closed before the end of the file
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._chunk:
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if isinstance(item, Exception):
+                raise item
+            if not item:
+                self._eof = True
+                return 0
+            self._chunk = memoryview(item)
+        size = min(len(buffer), len(self._chunk))
+        buffer[:size] = self._chunk[:size]
+        self._chunk = self._chunk[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._stream.close()
+        super().close()
+
+
+def open_text(file, threaded=True):
+    """Opens a UTF-8 text file for reading
+
+    Files ending with .gz, .bz2, .xz, .lzma or .zst are decompressed
+    while reading, .zst requires Python 3.14 or the package zstandard.
+
+    Parameters
+    ----------
+    file : str
+        Path to the text file
+    threaded : bool, optional
+        If True, compressed files are decompressed in a separate thread
+
+    Returns
+    -------
+    text : file object
+        The opened file, iterates over the lines
+    """
+
+    opener = OPENERS.get(Path(file).suffix.lower())
+    if opener is None:
+        return open(file, "r", encoding="utf-8")
+
+    stream = opener(file)
+    if threaded:
+        stream = io.BufferedReader(BackgroundReader(stream))
+    return io.TextIOWrapper(stream, encoding="utf-8")
+
+
+def read_batches(files, batch_size=10000, queue_size=4, start=0):
+    """Reads parallel text files in batches of lines
+
+    The lines are read in a separate thread. At most queue_size
+    batches are read ahead, the reading waits until the batches are
+    processed, so the memory stays flat for large corpora.
+
+    Parameters
+    ----------
+    files : tuple
+        Paths to text files with the same number of lines, e.g. the
+        eflomal alignment, the source and the target corpus
+    batch_size : int, optional
+        The number of lines per batch
+    queue_size : int, optional
+        The maximum number of batches read in advance
+    start : int, optional
+        The number of lines to skip
+
+    Yields
+    ------
+    first : int
+        The line number (starting at 0) of the first line in the batch
+    lines : list
+        A tuple with the lines of all files for every line number
+    """
+
+    batches = queue.Queue(queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        # Gives up if the batches are not needed anymore
+        while not stop.is_set():
+            try:
+                batches.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def read():
+        try:
+            with ExitStack() as stack:
+                texts = [stack.enter_context(open_text(file))
+                         for file in files]
+                lines = islice(zip(*texts), start, None)
+                first = start
+                while not stop.is_set():
+                    batch = list(islice(lines, batch_size))
+                    if not batch:
+                        break
+                    put((first, batch))
+                    first += len(batch)
+            put(None)
+        except Exception as error:
+            put(error)
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = batches.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def map_batches(worker, files, args=(), workers=1, batch_size=10000,
+                queue_size=4, start=0):
+    """Applies a function to batches of lines from parallel text files
+
+    The files are read by read_batches. With more than one worker the
+    batches are processed in separate processes, at most two batches
+    per worker are waiting, so a slow computation slows down the
+    reading instead of filling the memory.
+
+    Parameters
+    ----------
+    worker : function
+        Called as worker(first, lines, *args), must be defined at the
+        top level of a module if workers is larger than 1
+    files : tuple
+        Paths to text files with the same number of lines
+    args : tuple, optional
+        Further arguments for the worker
+    workers : int, optional
+        The number of processes
+    batch_size : int, optional
+        The number of lines per batch
+    queue_size : int, optional
+        The maximum number of batches read in advance
+    start : int, optional
+        The number of lines to skip
+
+    Yields
+    ------
+    first : int
+        The line number of the first line in the batch
+    size : int
+        The number of lines in the batch
+    result
+        The return value of the worker, in the order of the lines
+    """
+
+    with closing(read_batches(files, batch_size, queue_size,
+                              start)) as batches:
+        yield from map_ordered(worker, batches, args, workers)
+
+
+def map_ordered(worker, batches, args=(), workers=1):
+    """Applies a function to batches and yields the results in order
+
+    Parameters
+    ----------
+    worker : function
+        Called as worker(first, lines, *args), must be defined at the
+        top level of a module if workers is larger than 1
+    batches : iterable
+        Tuples with the number of the first line and the lines of a
+        batch, the lines must support len()
+    args : tuple, optional
+        Further arguments for the worker
+    workers : int, optional
+        The number of processes, at most two batches per process are
+        waiting
+
+    Yields
+    ------
+    first : int
+        The line number of the first line in the batch
+    size : int
+        The number of lines in the batch
+    result
+        The return value of the worker
+    """
+
+    if workers <= 1:
+        for first, lines in batches:
+            yield first, len(lines), worker(first, lines, *args)
+        return
+
+    # Only imported if processes are used, keeps the start fast
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for first, lines in batches:
+            if len(pending) >= 2 * workers:
+                first_, size, future = pending.popleft()
+                yield first_, size, future.result()
+            pending.append((first, len(lines),
+                            executor.submit(worker, first, lines, *args)))
+        while pending:
+            first_, size, future = pending.popleft()
+            yield first_, size, future.result()
@@ -8,9 +8,128 @@
 """Creating a subcorpus for connective pairs"""
 
 import os
-from linecache import getline
 from pathlib import Path
 
+from corpus_io import map_batches, open_text
+
+
+def conn_in_sentence(conn, tokens, sentence):
+    """Checks whether a connective occurs in a sentence
+
+    Parameters
+    ----------
+    conn : str
+        A connective, discontinuous parts are separated by ' ... '
+    tokens : list
+        The tokenized sentence
+    sentence : str
+        The sentence as string
+
+    Returns
+    -------
+    bool
+        True if the connective is part of the sentence
+    """
+
+    # Continuous phrases and single words
+    if "..." not in conn:
+        return all([word in tokens for word in conn.split()])\
+            and conn in sentence
+    # Discontinuous phrases
+    if conn.replace(" ... ", " ") in sentence:
+        return True
+    return all([word in tokens for word in conn.split(" ... ")])
+
+
+def example_batch(first, lines, source_conn, target_conn):
+    """Finds the lines of a batch that contain a source-target pair
+
+    Used by find_example_ids
+
+    Parameters
+    ----------
+    first : int
+        The line number of the first line in the batch
+    lines : list
+        Tuples with the source and the target sentence of every line
+    source_conn : str
+        Source connective for the source-target pair
+    target_conn : str
+        Target connective for the source-target pair
+
+    Returns
+    -------
+    ids : list
+        The line numbers (starting at 0) of the sentences
+    """
+
+    return [index for index, (s, t) in enumerate(lines, first)
+            if conn_in_sentence(source_conn, s.split(), s)
+            and conn_in_sentence(target_conn, t.split(), t)]
+
+
+def find_example_ids(source_corpus, target_corpus, source_conn,
+                     target_conn, limit=None, workers=1):
+    """Finds the sentences that contain a source-target pair
+
+    Parameters
+    ----------
+    source_corpus : str
+        The path to the text file with the source corpus
+    target_corpus : str
+        The path to the text file with the target corpus
+    source_conn : str
+        Source connective for the source-target pair
+    target_conn : str
+        Target connective for the source-target pair
+    limit : int, optional
+        The maximum number of sentences
+    workers : int, optional
+        The number of processes
+
+    Returns
+    -------
+    ids : list
+        The line numbers (starting at 0) of the sentences
+    """
+
+    ids = []
+    batches = map_batches(example_batch, (source_corpus, target_corpus),
+                          args=(source_conn, target_conn), workers=workers)
+    for first, size, batch_ids in batches:
+        ids += batch_ids
+        if limit and len(ids) >= limit:
+            batches.close()
+            return ids[:limit]
+
+    return ids
+
+
+def with_context(lines):
+    """Yields every line with the preceding and following line
+
+    Parameters
+    ----------
+    lines : iterable
+        The lines of a file
+
+    Yields
+    ------
+    context : tuple
+        The preceding line, the line and the following line, an empty
+        string at the beginning and end of the file
+    """
+
+    previous = ""
+    current = None
+    for line in lines:
+        if current is not None:
+            yield previous, current, line
+            previous = current
+        current = line
+    if current is not None:
+        yield previous, current, ""
+
 
 def create_comparison_files(source_corpus, target_corpus,
                             source_conn, target_conn):
@@ -37,9 +156,12 @@ def create_comparison_files(source_corpus, target_corpus,
 
     # Reads each sentence of the parallel corpus and searches for the
     # pair of connectives
-    with open(source_corpus, "r", encoding="utf-8") as source,\
-            open(target_corpus, "r", encoding="utf-8") as target:
-        for index, (s, t) in enumerate(zip(source, target)):
+    with open_text(source_corpus) as source,\
+            open_text(target_corpus) as target:
+        # The context is read with the sentence, so that compressed
+        # corpora do not need to be read again
+        for (s_p, s, s_n), (t_p, t, t_n) in zip(with_context(source),
+                                                with_context(target)):
             source = s.split()
             target = t.split()
             # Exclude phrases with more then 25 words
@@ -94,14 +216,10 @@ def create_comparison_files(source_corpus, target_corpus,
                 key = f"{source_}-{target_}"
 
                 # Save preceding and following sentence as context
-                s_p = getline(source_corpus, index).strip()
-                s_n = getline(source_corpus, index+2).strip()
-                t_p = getline(target_corpus, index).strip()
-                t_n = getline(target_corpus, index+2).strip()
-                s = s.strip()
-                t = t.strip()
-                with_context = f"{s_p} {s} {s_n} ||| {t_p} {t} {t_n}"
-                sentences.append(with_context)
+                s_p, s, s_n = s_p.strip(), s.strip(), s_n.strip()
+                t_p, t, t_n = t_p.strip(), t.strip(), t_n.strip()
+                context = f"{s_p} {s} {s_n} ||| {t_p} {t} {t_n}"
+                sentences.append(context)
 
     if sentences:
         # Create directory
@@ -7,12 +7,119 @@
 
 """Assigning Discourse Relations and Creating Visual Output"""
 
-import xml.etree.ElementTree as ET
+import re
 from collections import defaultdict
-from copy import deepcopy
 
-import pandas as pd
-from nltk.tokenize import RegexpTokenizer
+from lexicon import entry_connectives, iter_xml_entries
+
+
+RELATION_KEY = re.compile(r"^(.*) \(((?:[A-Z][^()]*)?)\)$")
+
+
+def relation_table(*mappings):
+    """Assigns ids to the discourse relations of the connectives
+
+    Parameters
+    ----------
+    *mappings : dict
+        Dictionaries with the connectives as keys and the relations in
+        a list as values
+
+    Returns
+    -------
+    relation_names : list
+        The relations, the position is the id
+    tables : list
+        For each mapping a dictionary with the connectives as keys and
+        a tuple with the relation ids as values
+    """
+
+    ids = dict()
+    tables = []
+    for mapping in mappings:
+        table = dict()
+        for conn, relations in mapping.items():
+            conn_ids = []
+            for relation in relations:
+                if relation not in ids:
+                    ids[relation] = len(ids)
+                conn_ids.append(ids[relation])
+            table[conn] = tuple(conn_ids)
+        tables.append(table)
+
+    return list(ids), tables
+
+
+def tag_relations(alignment, source_mapping=dict(), target_mapping=dict()):
+    """Adds the discourse relations to both source and target words as
+    separate fields
+
+    Parameters
+    ----------
+    alignment : dict
+        A dictionary with source keys and a dictionary as value
+        which contains the target words with their probabilities
+    source_mapping : dict, optional
+        A dictionary with the source words as keys and the relations
+        in a list as values
+    target_mapping : dict, optional
+        A dictionary with the target words as keys and the relations
+        in a list as values
+
+    Returns
+    -------
+    relation_names : list
+        The relations, the position is the id
+    tagged : dict
+        A dictionary with source keys and dictionaries of the form
+        {"relations": ids, "translations": {target: {"probability": p,
+        "relations": ids}}} as values, ids is None for words without
+        an entry in the mapping
+    """
+
+    relation_names, (source_table, target_table) = relation_table(
+        source_mapping, target_mapping)
+
+    tagged = dict()
+    for source, targets in alignment.items():
+        tagged[source] = {
+            "relations": source_table.get(source),
+            "translations": {target: {"probability": probability,
+                                      "relations": target_table.get(target)}
+                             for target, probability in targets.items()}}
+
+    return relation_names, tagged
+
+
+def legacy_relation_keys(relation_names, tagged):
+    """Creates keys of the form 'word (relation)' for the JSON output
+
+    Parameters
+    ----------
+    relation_names : list
+        The relations, the position is the id
+    tagged : dict
+        The alignment with relations created by tag_relations
+
+    Returns
+    -------
+    rel_alignment : dict
+        A dictionary with keys of the form 'word (relation)' for both
+        source and target words
+    """
+
+    def with_relation(word, ids):
+        if ids is None:
+            return word
+        return f"{word} ({', '.join(relation_names[i] for i in ids)})"
+
+    rel_alignment = dict()
+    for source, entry in tagged.items():
+        rel_alignment[with_relation(source, entry["relations"])] = {
+            with_relation(target, value["relations"]): value["probability"]
+            for target, value in entry["translations"].items()}
+
+    return rel_alignment
 
 
 def add_discourse_relation(alignment, source_mapping=dict(),
@@ -37,31 +144,86 @@ def add_discourse_relation(alignment, source_mapping=dict(),
         A dictionary with keys of the form 'word (relation)' for both
         source and target words
 
-    Note: only useful as a visual representation
+    Note: only useful as a visual representation, use tag_relations
+    to keep the relations as separate fields
     """
 
-    rel_alignment = deepcopy(alignment)
-    # Adds the relation to the target words
-    if target_mapping:
-        for source, targets in alignment.items():
-            for target in targets.keys():
-                if target in target_mapping:
-                    relation = f"({', '.join(target_mapping[target])})"
-                    with_rel = target + " " + relation
-                    probability = rel_alignment[source].pop(target)
-                    rel_alignment[source][with_rel] = probability
-
-    # Adds the relation to the source words
-    if source_mapping:
-        for source, relation in source_mapping.items():
-            try:
-                relation = f"({', '.join(relation)})"
-                rel_alignment[f"{source} {relation}"] = rel_alignment.pop(
-                    source)
-            except KeyError:
-                pass
+    return legacy_relation_keys(*tag_relations(alignment, source_mapping,
+                                               target_mapping))
 
-    return rel_alignment
+
+def assign_relation_types(mapping, relation_types):
+    """Assigns the relation types of relations.json to the connectives
+
+    Relations are compared case-insensitively. Relations that are not
+    listed are assigned by their first two levels, e.g.
+    "CONTINGENCY:Cause:result" -> "cause".
+
+    Parameters
+    ----------
+    mapping : dict
+        A dictionary with the connectives as keys and the relations
+        in a list as values
+    relation_types : dict
+        A dictionary with the relation types as keys and the
+        corresponding relations in a list as values
+
+    Returns
+    -------
+    conn_types : dict
+        A dictionary with the connectives as keys and a set with the
+        relation types as values
+    """
+
+    def normalise(relation):
+        return relation.strip().replace(" ", "").lower()
+
+    lookup = dict()
+    for rel_type, relations in relation_types.items():
+        lookup[normalise(rel_type)] = rel_type
+        for relation in relations:
+            lookup[normalise(relation)] = rel_type
+            lookup.setdefault(":".join(normalise(relation).split(":")[:2]),
+                              rel_type)
+
+    conn_types = dict()
+    for conn, relations in mapping.items():
+        types = set()
+        for relation in relations:
+            relation = normalise(relation)
+            if relation in lookup:
+                types.add(lookup[relation])
+            elif ":".join(relation.split(":")[:2]) in lookup:
+                types.add(lookup[":".join(relation.split(":")[:2])])
+        conn_types[conn] = types
+
+    return conn_types
+
+
+def split_relations(key):
+    """Separates a key of the form 'word (relation)' into the word and
+    the relations
+
+    Reverses add_discourse_relation for a single key
+
+    Parameters
+    ----------
+    key : str
+        A connective with or without relations: 'aber (REL1, REL2)'
+
+    Returns
+    -------
+    word : str
+        The connective without relations
+    relations : list
+        A list with the relations, empty if there are none
+    """
+
+    match = RELATION_KEY.match(key)
+    if not match:
+        return key, []
+    word, relations = match.groups()
+    return word, [rel for rel in relations.split(", ") if rel]
 
 
 def assign_relations(doc):
@@ -79,55 +241,19 @@ def assign_relations(doc):
         values
     """
 
-    regex = r"[\w\.]+|\b\w+'|\w+(?:['-]\w+)*|[^\w\s]"
-    tokenizer = RegexpTokenizer(regex)
-
     conn_relations = defaultdict(list)
-    root = ET.parse(doc).getroot()
-    for entry in root.findall("./entry"):
-        # Saves all variants of a connective
-        # Single words and phrases (continuous)
-        singles_phrases = [variant.text.lower() for variant
-                           in entry.findall("./orths/orth[@type='cont']/part")]
-
+    for entry in iter_xml_entries(doc):
+        relations = [sense for _, senses in entry["syn"]
+                     for sense in senses]
+        if not relations:
+            continue
         # Removes doubles (because everything is lower-case now)
-        singles_phrases = pd.unique(singles_phrases).tolist()
-        singles_phrases = [" ".join(tokenizer.tokenize(phrase))
-                           for phrase in singles_phrases]
-
-        # Adding connectives with relation to dictionary
-        relations = entry.findall("./syn/sem/pdtb3_relation")
-        for connective in singles_phrases:
-            for relation in relations:
-                rel = relation.attrib["sense"]
-                try:
-                    conn_relations[connective].append(rel)
-                except KeyError:
-                    pass
-
-        # Same procedure for discontinuous phrases
-        discontinuous_phrases = []
-        for discont in entry.findall("./orths/orth[@type='discont']"):
-            discontinuous = [part.text.lower() for part
-                             in discont.findall("./part")]
-            discontinuous = [" ".join(tokenizer.tokenize(phrase))
-                             for phrase in discontinuous]
-            discontinuous = " ... ".join(discontinuous)
-            relations = entry.findall("./syn/sem/pdtb3_relation")
-            discontinuous_phrases.append(discontinuous)
-
-        discontinuous_phrases = pd.unique(discontinuous_phrases).tolist()
-        for discontinuous in discontinuous_phrases:
-            for relation in relations:
-                rel = relation.attrib["sense"]
-                try:
-                    conn_relations[discontinuous].append(rel)
-                except KeyError:
-                    pass
+        for connective in dict.fromkeys(entry_connectives(entry)):
+            conn_relations[connective].extend(relations)
 
     # Removes relations that occur twice
     for connective, d_relations in conn_relations.items():
         if len(d_relations) > 1:
-            conn_relations[connective] = pd.unique(d_relations).tolist()
+            conn_relations[connective] = list(dict.fromkeys(d_relations))
 
     return conn_relations
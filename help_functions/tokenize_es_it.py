@@ -9,7 +9,7 @@
 
 import re
 
-from nltk import RegexpTokenizer
+from corpus_io import open_text
 
 
 ROM_NUM = (r"\bI{1,2}\.|\bI?V\.|\bVI{1,3}\.|\bI?X\.|\bXI{1,3}\.|\bXI?V\.|"
@@ -19,6 +19,8 @@ INITIALS = r"\b[A-Z]\.[A-Z]\.[A-Z]\.|\b[A-Z]\.[A-Z]\.|\b[A-Z]\."
 NUMS = r"\d{1,3}\.\d{3}\.\d{3}|\d{1,3}\.\d{3}"
 DATE = r"[0-9]{1,2}\.[0-9]{1,2}\.[0-9]{2,4}|[0-9]{1,2}\.[0-9]{1,2}"
 GENERAL = r"\w+(?:['-]\w+)*|[^\w\s]"
+# The flags of nltk's RegexpTokenizer
+FLAGS = re.UNICODE | re.MULTILINE | re.DOTALL
 
 
 def tokenize_italian(file, name):
@@ -41,15 +43,15 @@ def tokenize_italian(file, name):
                r"\b[Pp]rof\.|\b[Ss]ig\.|\b[Ss]ig\.ra|\b[dD]ott\.|\ba\.m\.|"
                r"\bn{1,2}\.|\b\w+'")
     regex = "|".join([ROM_NUM, INITIALS, NUMS, DATE, it_abbr, GENERAL])
-    tokenizer = RegexpTokenizer(regex)
+    tokenizer = re.compile(regex, FLAGS)
 
-    with open(file, "r", encoding="utf-8") as file,\
+    with open_text(file) as file,\
             open(name, "w", encoding="utf-8") as tokenized:
         for pos, line in enumerate(file):
             line = line.replace("’", "'")
             if "?" in line:
                 line = re.sub(r"(\w+)\?(\w+)", r"\1'\2", line)
-            tokenized.write(" ".join(tokenizer.tokenize(line)).strip() + "\n")
+            tokenized.write(" ".join(tokenizer.findall(line)).strip() + "\n")
 
 
 def tokenize_spanish(file, name):
@@ -71,11 +73,11 @@ def tokenize_spanish(file, name):
                r"\ba\.m\.|\bUE-EE\.UU\.|\bEE\.UU\.?|\bNN\.UU\.?|\bDr\.|"
                r"\bnúm\.|\bSt\.|\bpág\.|\b[Pp]rof\.")
     regex = "|".join([ROM_NUM, INITIALS, NUMS, DATE, es_abbr, GENERAL])
-    tokenizer = RegexpTokenizer(regex)
+    tokenizer = re.compile(regex, FLAGS)
 
-    with open(file, "r", encoding="utf-8") as file,\
+    with open_text(file) as file,\
             open(name, "w", encoding="utf-8") as tokenized:
         for pos, line in enumerate(file):
             line = line.replace("EE. UU", "EE.UU")
             line = line.replace("EE UU", "EEUU")
-            tokenized.write(" ".join(tokenizer.tokenize(line)).strip() + "\n")
+            tokenized.write(" ".join(tokenizer.findall(line)).strip() + "\n")
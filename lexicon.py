@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Connective Lexicon with Fast Lookups
+
+Keeps the order of the connectives like a list, but the membership
+test takes constant time and continuous phrases can be found in a
+sentence with a trie of their tokens. Lexicons in the DiMLex format
+are read entry by entry.
+"""
+
+import re
+import xml.etree.ElementTree as ET
+
+
+# Tokenization of the lexicon entries: "d'abord" -> "d' abord"
+# (the same tokens as nltk's RegexpTokenizer with this pattern)
+TOKEN_PATTERN = re.compile(r"[\w\.]+|\b\w+'|\w+(?:['-]\w+)*|[^\w\s]",
+                           re.UNICODE | re.MULTILINE | re.DOTALL)
+
+
+def tokenize(phrase):
+    """Returns a connective with spaces between its tokens"""
+
+    return " ".join(TOKEN_PATTERN.findall(phrase))
+
+
+def iter_xml_entries(doc):
+    """Reads the entries of a connective lexicon in the DiMLex format
+    one after another
+
+    Every entry is removed from the tree after it was read, so the
+    memory does not grow with the size of the lexicon.
+
+    Parameters
+    ----------
+    doc : str
+        Path to the XML file of a connective lexicon
+
+    Yields
+    ------
+    entry : dict
+        The attributes "id" and "word" of the entry, "orths" with the
+        type and the parts of every orthographic variant and "syn" with
+        the category and the PDTB-3 senses of every syntactic reading
+    """
+
+    root = None
+    for event, element in ET.iterparse(doc, events=("start", "end")):
+        if root is None:
+            root = element
+        if event != "end" or element.tag != "entry":
+            continue
+        yield {"id": element.get("id"),
+               "word": element.get("word"),
+               "orths": [(orth.get("type"),
+                          [part.text for part in orth.findall("./part")])
+                         for orth in element.findall("./orths/orth")],
+               "syn": [(syn.findtext("./cat"),
+                        [relation.get("sense") for relation
+                         in syn.findall("./sem/pdtb3_relation")
+                         if relation.get("sense") is not None])
+                       for syn in element.findall("./syn")]}
+        # The entries are children of the root
+        root.clear()
+
+
+def entry_connectives(entry):
+    """Returns the connectives of the orthographic variants of an entry
+
+    Parameters
+    ----------
+    entry : dict
+        An entry of iter_xml_entries
+
+    Returns
+    -------
+    conns : list
+        The lower-cased and tokenized variants, first the single words
+        and continuous phrases, then the discontinuous phrases with
+        parts separated by ' ... '
+    """
+
+    # Tokenization: "d'abord" -> "d' abord"
+    conns = [tokenize(part.lower()) for orth_type, parts in entry["orths"]
+             if orth_type == "cont" for part in parts]
+    conns += [" ... ".join(tokenize(part.lower()) for part in parts)
+              for orth_type, parts in entry["orths"]
+              if orth_type == "discont"]
+    return conns
+
+
+class Lexicon:
+    """A connective lexicon
+
+    Parameters
+    ----------
+    connectives : iterable or dict, optional
+        The connectives, with a dict (e.g. the attribute origin of
+        another lexicon) the values are used as origins
+    origin : int, optional
+        The round in which the connectives were found, 0 for the
+        connectives of the lexicon file
+
+    Attributes
+    ----------
+    origin : dict
+        The connectives as keys in the order in which they were added
+        and the round in which they were found as values
+    singles : list
+        The single words
+    phrases : list
+        The continuous phrases
+    discontinuous : list
+        The discontinuous phrases, the parts are separated by ' ... '
+    trie : dict
+        The tokens of the single words and continuous phrases as nested
+        dictionaries, the key None marks the end of a connective
+    """
+
+    def __init__(self, connectives=(), origin=0):
+        self.origin = dict()
+        self.singles = []
+        self.phrases = []
+        self.discontinuous = []
+        self.trie = dict()
+        if isinstance(connectives, dict):
+            for conn, conn_origin in connectives.items():
+                self.add(conn, conn_origin)
+        else:
+            self.update(connectives, origin)
+
+    def __contains__(self, conn):
+        return conn in self.origin
+
+    def __iter__(self):
+        return iter(self.origin)
+
+    def __len__(self):
+        return len(self.origin)
+
+    def __repr__(self):
+        return f"Lexicon({list(self.origin)!r})"
+
+    def add(self, conn, origin=0):
+        """Adds a connective if it is not part of the lexicon yet
+
+        Parameters
+        ----------
+        conn : str
+            The connective
+        origin : int, optional
+            The round in which the connective was found
+
+        Returns
+        -------
+        bool
+            True if the connective is new
+        """
+
+        if conn in self.origin:
+            return False
+        self.origin[conn] = origin
+        tokens = conn.split()
+        # The same groups as in FindAlignments.find_conns
+        if len(tokens) == 1:
+            self.singles.append(conn)
+        if "..." in conn:
+            self.discontinuous.append(conn)
+            return True
+        if len(tokens) > 1:
+            self.phrases.append(conn)
+        node = self.trie
+        for token in tokens:
+            node = node.setdefault(token, dict())
+        node[None] = conn
+        return True
+
+    def update(self, connectives, origin=0):
+        """Adds several connectives
+
+        Parameters
+        ----------
+        connectives : iterable
+            The connectives
+        origin : int, optional
+            The round in which the connectives were found
+
+        Returns
+        -------
+        new : list
+            The connectives that were not part of the lexicon
+        """
+
+        return [conn for conn in connectives if self.add(conn, origin)]
+
+    def seed(self):
+        """Returns the connectives of the lexicon file"""
+
+        return [conn for conn, origin in self.origin.items() if origin == 0]
+
+    def discovered(self, round=None):
+        """Returns the connectives found through the alignments
+
+        Parameters
+        ----------
+        round : int, optional
+            Only the connectives found in this round
+
+        Returns
+        -------
+        conns : list
+            The connectives in the order in which they were found
+        """
+
+        return [conn for conn, origin in self.origin.items()
+                if origin and (round is None or origin == round)]
+
+    def find(self, tokens):
+        """Finds the single words and continuous phrases in a sentence
+
+        Parameters
+        ----------
+        tokens : list
+            The tokenized sentence
+
+        Returns
+        -------
+        matches : list
+            Tuples with the position of the first token and the
+            connective, ordered by position
+        """
+
+        matches = []
+        for start in range(len(tokens)):
+            node = self.trie
+            for pos in range(start, len(tokens)):
+                node = node.get(tokens[pos])
+                if node is None:
+                    break
+                if None in node:
+                    matches.append((start, node[None]))
+        return matches
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Merging the Counts of Several Corpora
+
+The alignments are counted in every corpus separately and the count
+tables are added with a weight for every corpus before the thresholds
+are applied. The tables of every corpus are stored in the cache of the
+word alignments, so a connective is only searched in a corpus if it
+was never counted there: adding a corpus scans only the new corpus and
+changing the weights scans only the connectives that are found
+because of the new weights.
+"""
+
+from collections import Counter
+
+from alignment_cache import WordAlignmentCache
+from conn_search import FindAlignments
+from parse_alignments import parse_discontinuous, parse_phrase_alignments
+from processing_filtering import conn_count
+
+
+def scan_corpus(alignment, source_corpus, target_corpus, phrases,
+                discontinuous, lang=1, workers=1):
+    """Counts the alignments of phrases in one corpus
+
+    Defined at the top level, so the corpora can be scanned in
+    separate processes.
+
+    Parameters
+    ----------
+    alignment : str
+        Path to the alignment (format: 1-1 1-2 ...)
+    source_corpus : str
+        Path to the source corpus
+    target_corpus : str
+        Path to the target corpus
+    phrases : list
+        The continuous phrases
+    discontinuous : list
+        The discontinuous phrases
+    lang : int, optional
+        1 for the source language, 2 for the target language
+    workers : int, optional
+        The number of processes for the scans
+
+    Returns
+    -------
+    counts : dict
+        The counted alignments of every phrase
+    lines : int
+        The number of lines of the corpus, 0 if it was not scanned
+    stats : Counter
+        The counters of the scans
+    """
+
+    stats = Counter()
+    counts = dict()
+    lines = 0
+    for parse, conns in ((parse_phrase_alignments, phrases),
+                         (parse_discontinuous, discontinuous)):
+        if not conns:
+            continue
+        scanned = stats["sentences_scanned"]
+        counts.update(conn_count(parse(alignment, source_corpus,
+                                       target_corpus, conns, lang=lang,
+                                       stats=stats, workers=workers),
+                                 conns))
+        lines = stats["sentences_scanned"] - scanned
+    return counts, lines, stats
+
+
+class WeightedAlignments(FindAlignments):
+    """Finds connective alignments in several corpora of a language pair
+
+    The rounds are the same as in FindAlignments, but the counts of a
+    round are the weighted sums of the counts of all corpora. Every
+    corpus keeps its own count tables in the cache.
+
+    Parameters
+    ----------
+    corpora : list
+        Tuples with the paths to the alignment, the source corpus and
+        the target corpus of every corpus
+    source_lex : list or Lexicon
+        Source connectives
+    target_lex : list or Lexicon
+        Target connectives
+    weights : list, optional
+        The weight of every corpus, 1 for all corpora if not specified
+    cache : WordAlignmentCache, optional
+        The cache of the word alignments and the count tables, the
+        default directory is used if not specified
+    **kwargs
+        Further arguments of FindAlignments, e.g. the relation types,
+        the profiler or the number of workers
+
+    Attributes
+    ----------
+    corpora : list
+        The paths of every corpus
+    weights : list
+        The weight of every corpus
+    cache : WordAlignmentCache
+        The cache of the word alignments and the count tables
+    tables : list
+        The count tables of every corpus with the keys "lines",
+        "source", "target", "source_scanned" and "target_scanned"
+    """
+
+    def __init__(self, corpora, source_lex, target_lex, weights=None,
+                 cache=None, **kwargs):
+        super().__init__(None, None, *corpora[0], source_lex, target_lex,
+                         **kwargs)
+        if self.checkpoint or self.previous is not None or self.encode:
+            raise ValueError("Checkpoints, updates and encoded corpora are "
+                             "not supported for several corpora")
+        if weights is None:
+            weights = [1] * len(corpora)
+        if len(weights) != len(corpora):
+            raise ValueError("Every corpus needs a weight")
+        if any(weight < 0 for weight in weights):
+            raise ValueError("The weights cannot be negative")
+        self.corpora = [tuple(corpus) for corpus in corpora]
+        # Integer weights keep integer counts
+        self.weights = [int(weight) if float(weight).is_integer()
+                        else float(weight) for weight in weights]
+        self.cache = cache if cache is not None else WordAlignmentCache()
+        self._keys = [self.cache.key(*corpus) for corpus in self.corpora]
+        self.tables = []
+        for key in self._keys:
+            table = self.cache.load_counts(key)
+            if table is None:
+                table = {"lines": 0, "source": dict(), "target": dict(),
+                         "source_scanned": set(), "target_scanned": set()}
+            self.tables.append(table)
+        self.lines = sum(table["lines"] for table in self.tables)
+        # The word alignments are only parsed or loaded when needed
+        self._word_alignments = [None] * len(self.corpora)
+
+    def _corpus_word_alignments(self, pos, stats):
+        """Returns the word alignments of a corpus from the cache"""
+
+        if self._word_alignments[pos] is None:
+            self._word_alignments[pos] = self.cache.word_alignments(
+                *self.corpora[pos], self.workers, stats)
+        return self._word_alignments[pos]
+
+    def _scan_corpora(self, tasks, lang_pos, stats):
+        """Scans the corpora for their missing phrases
+
+        With more than one worker the corpora are scanned at the same
+        time in separate processes, which share the workers.
+
+        Parameters
+        ----------
+        tasks : list
+            Tuples with the position of a corpus, its missing phrases
+            and its missing discontinuous phrases
+        lang_pos : int
+            1 for the source language, 2 for the target language
+        stats : Counter
+            The counters of the stage
+
+        Returns
+        -------
+        results : list
+            The counts and the number of lines of every task
+        """
+
+        if self.workers <= 1 or len(tasks) <= 1:
+            results = [scan_corpus(*self.corpora[pos], phrases,
+                                   discontinuous, lang_pos, self.workers)
+                       for pos, phrases, discontinuous in tasks]
+        else:
+            # Only imported if processes are used, keeps the start fast
+            from concurrent.futures import ProcessPoolExecutor
+
+            corpus_workers = max(1, self.workers // len(tasks))
+            with ProcessPoolExecutor(min(self.workers,
+                                         len(tasks))) as executor:
+                futures = [executor.submit(scan_corpus, *self.corpora[pos],
+                                           phrases, discontinuous, lang_pos,
+                                           corpus_workers)
+                           for pos, phrases, discontinuous in tasks]
+                results = [future.result() for future in futures]
+
+        for _, _, scan_stats in results:
+            stats.update(scan_stats)
+        return [(counts, lines) for counts, lines, _ in results]
+
+    def _count_round(self, lex, lang, resume=None, scanned=None):
+        """Counts the alignments of a round in all corpora and merges
+        the counts with the weights
+
+        Parameters
+        ----------
+        lex : Lexicon
+            The connectives of the round
+        lang : str
+            The language is "source" or "target" language
+        resume : dict, optional
+            Not used, checkpoints are not supported
+        scanned : tuple, optional
+            Not used, every corpus is scanned by itself
+
+        Returns
+        -------
+        counts : dict
+            The weighted sums of the counted alignments of every
+            connective
+        """
+
+        lang_pos = 1 if lang == "source" else 2
+        # Only the connectives that were never counted in a corpus
+        missing = [[conn for conn in lex
+                    if conn not in table[f"{lang}_scanned"]]
+                   for table in self.tables]
+
+        with self._stage("single_words", lang) as stats:
+            for pos, conns in enumerate(missing):
+                singles = [conn for conn in lex.singles if conn in conns]
+                if not singles:
+                    continue
+                word_alignments = self._corpus_word_alignments(
+                    pos, stats)[lang_pos - 1]
+                self.tables[pos][lang].update(conn_count(word_alignments,
+                                                         singles))
+                stats["connectives"] += len(singles)
+
+        with self._stage("corpus_scan", lang) as stats:
+            tasks = []
+            for pos, conns in enumerate(missing):
+                conns = set(conns)
+                phrases = [conn for conn in lex.phrases if conn in conns]
+                discontinuous = [conn for conn in lex.discontinuous
+                                 if conn in conns]
+                if phrases or discontinuous:
+                    tasks.append((pos, phrases, discontinuous))
+            for (pos, _, _), (counts, lines) in zip(
+                    tasks, self._scan_corpora(tasks, lang_pos, stats)):
+                self.tables[pos][lang].update(counts)
+                if lines:
+                    self.tables[pos]["lines"] = lines
+            stats["corpora_scanned"] += len(tasks)
+            counted = sum(len(conns) for conns in missing)
+            stats["counted_connectives"] += counted
+            stats["reused_connectives"] += len(lex) * len(self.tables)\
+                - counted
+
+            for pos, conns in enumerate(missing):
+                if conns:
+                    self.tables[pos][f"{lang}_scanned"].update(conns)
+                    self.cache.save_counts(self._keys[pos], self.tables[pos])
+            self.lines = sum(table["lines"] for table in self.tables)
+
+        with self._stage("counting", lang):
+            counts = dict()
+            for conn in lex:
+                merged = Counter()
+                for table, weight in zip(self.tables, self.weights):
+                    if not weight:
+                        continue
+                    for word, count in table[lang].get(conn, dict()).items():
+                        merged[word] += weight * count
+                counts[conn] = merged
+        return counts
@@ -8,14 +8,630 @@
 """Parse eflomal alignments"""
 
 import argparse
-import pandas as pd
-from collections import defaultdict
+from collections import Counter, defaultdict
 from copy import deepcopy
 
-from processing_filtering import remove_punct_phrases, save_alignments
+from corpus_io import map_batches, map_ordered
+from lexicon import Lexicon
+from processing_filtering import (json_to_dict, remove_punct_phrases,
+                                  save_alignments)
 
 
-def parse_word_alignments(result, source_sentences, target_sentences):
+# Has to be increased if the word alignments change, the cached parses
+# of alignment_cache.py are not used anymore
+PARSER_VERSION = 1
+
+
+def word_alignment_batch(first, lines):
+    """Creates word alignments for a batch of lines
+
+    Used by parse_word_alignments
+
+    Parameters
+    ----------
+    first : int
+        The line number (starting at 0) of the first line in the batch
+    lines : list
+        Tuples with the eflomal alignment, the source and the target
+        sentence of every line
+
+    Returns
+    -------
+    lang1_lang2_alignments: defaultdict
+        A dictionary with source keys and the target alignments as
+        values
+    lang2_lang1_alignments: defaultdict
+        A dictionary with target keys and the source alignments as
+        values
+    """
+
+    lang1_lang2_alignments = defaultdict(list)
+    lang2_lang1_alignments = defaultdict(list)
+    for index, lang1, lang2 in lines:
+        source = lang1.split()
+        target = lang2.split()
+        alignment = index.split()
+        pair = [a.split("-") for a in alignment]
+
+        # Adds an empty string as alignment if there is no
+        # alignment for a word
+        lang1_missing = list(range(0, len(source)))
+        lang2_missing = list(range(0, len(target)))
+        for word1, word2 in pair:
+            try:
+                lang1_missing.remove(int(word1))
+            except ValueError:
+                pass
+            try:
+                lang2_missing.remove(int(word2))
+            except ValueError:
+                pass
+
+        if lang1_missing:
+            for missing in lang1_missing:
+                lang1_lang2_alignments[source[missing]].append("")
+        if lang2_missing:
+            for missing in lang2_missing:
+                lang2_lang1_alignments[target[missing]].append("")
+
+        # Adds the alignments to dictionaries so that phrases
+        # are allowed as well
+        phrase_align_lang1_r = defaultdict(list)
+        phrase_align_lang2_r = defaultdict(list)
+        for p in pair:
+            phrase_align_lang1_r[p[0]].append(p[1])
+            phrase_align_lang2_r[p[1]].append(p[0])
+
+        # Reverses the pair, so that phrases are allowed as keys
+        phrase_align_lang1 = defaultdict(list)
+        phrase_align_lang2 = defaultdict(list)
+        for k, v in phrase_align_lang2_r.items():
+            phrase_align_lang1[tuple(v)].append(k)
+        for k, v in phrase_align_lang1_r.items():
+            phrase_align_lang2[tuple(v)].append(k)
+
+        # Eliminate unsymmetrical alignments
+        source_target = set([(key, tuple(value)) for key, value
+                             in phrase_align_lang1.items()])
+        target_source_r = set([(tuple(value), key) for key, value
+                               in phrase_align_lang2.items()])
+
+        source_error = list(source_target - target_source_r)
+        target_error = list(target_source_r - source_target)
+
+        if source_error and target_error:
+            for key, value in source_error:
+                del phrase_align_lang1[key]
+            for value, key in target_error:
+                del phrase_align_lang2[key]
+
+        # Identifies discontinous phrases
+        # For source - target
+        for lang1, lang2 in phrase_align_lang1.items():
+            if len(lang2) > 1:
+                lang2_original = deepcopy(lang2)
+                for pos in range(len(lang2)-1):
+                    if lang2[pos].isnumeric() and lang2[pos+1].isnumeric():
+                        if abs(int(lang2[pos]) - int(lang2[pos+1])) == 2:
+                            if target[int(lang2[pos])+1] == ",":
+                                phrase_align_lang1[lang1].insert(
+                                    pos+1, ",")
+                            else:
+                                phrase_align_lang1[lang1].insert(
+                                    pos+1, "...")
+                        elif abs(int(lang2[pos]) - int(lang2[pos+1])) > 2:
+                            phrase_align_lang1[lang1].insert(pos+1, "...")
+                # Change in the other lexicon as well if
+                # something was changed
+                if len(lang2) != len(lang2_original):
+                    phrase_align_lang2[tuple(lang2)] = \
+                        phrase_align_lang2[tuple(lang2_original)]
+                    del phrase_align_lang2[tuple(lang2_original)]
+
+        # For  target - source
+        for lang2, lang1 in phrase_align_lang2.items():
+            if len(lang1) > 1:
+                lang1_original = deepcopy(lang1)
+                for pos in range(len(lang1)-1):
+                    if lang1[pos].isnumeric() and lang1[pos+1].isnumeric():
+                        if abs(int(lang1[pos]) - int(lang1[pos+1])) == 2:
+                            if source[int(lang1[pos])+1] == ",":
+                                phrase_align_lang2[lang2].insert(
+                                    pos+1, ",")
+                            else:
+                                phrase_align_lang2[lang2].insert(
+                                    pos+1, "...")
+                        elif abs(int(lang1[pos]) - int(lang1[pos+1])) > 2:
+                            phrase_align_lang2[lang2].insert(pos+1, "...")
+                if len(lang1) != len(lang1_original):
+                    phrase_align_lang1[tuple(lang1)] = \
+                        phrase_align_lang1[tuple(lang1_original)]
+                    del phrase_align_lang1[tuple(lang1_original)]
+
+        # Index is replaced by the corresponding word
+        for lang1, lang2 in phrase_align_lang1.items():
+            k = ([source[int(i)] if i.isnumeric() else i for i in lang1])
+            v = ([target[int(i)] if i.isnumeric() else i for i in lang2])
+            k = remove_punct_phrases(k)
+            v = remove_punct_phrases(v)
+            lang1_lang2_alignments[" ".join(k)].append(" ".join(v))
+
+        # Index is replaced by the corresponding word
+        for lang2, lang1 in phrase_align_lang2.items():
+            k = ([target[int(i)] if i.isnumeric() else i for i in lang2])
+            v = ([source[int(i)] if i.isnumeric() else i for i in lang1])
+            k = remove_punct_phrases(k)
+            v = remove_punct_phrases(v)
+            lang2_lang1_alignments[" ".join(k)].append(" ".join(v))
+
+    return lang1_lang2_alignments, lang2_lang1_alignments
+
+
+def aligned_phrase(phrase_index, pair, target_tok, lang=1):
+    """Creates the alignment of a phrase from the aligned words
+
+    Parameters
+    ----------
+    phrase_index : list
+        Lists with the positions of the phrase words in the source
+        sentence, one list for every continuous part
+    pair : list
+        The aligned positions of the sentence
+    target_tok : list
+        The tokenized target sentence
+    lang : int
+        An integer that indicates whether the phrase corresponds to
+        language 1 or 2
+
+    Returns
+    -------
+    new_phrase : str
+        The aligned target words, '...' marks gaps
+    """
+
+    new_phrase = []
+    for pos_range in phrase_index:
+        # Indexes of the target words
+        for word_pos in pos_range:
+            # Saves all target indexes in a list
+            if lang == 1:
+                alignment_index = [i2 for i1, i2 in pair if i1 == word_pos]
+            elif lang == 2:
+                alignment_index = [i1 for i1, i2 in pair if i2 == word_pos]
+            new_phrase += alignment_index
+
+    # Removes doubles, keeps the order
+    new_phrase = list(dict.fromkeys(new_phrase))
+    if len(new_phrase) > 1:
+        new_phrase.sort()
+        # Inserts "..." for discontinuous phrases
+        pos = 0
+        while pos < len(new_phrase) - 1:
+            if isinstance(new_phrase[pos], int)\
+                    and isinstance(new_phrase[pos+1], int):
+                if abs(new_phrase[pos] - new_phrase[pos+1]) == 2:
+                    if target_tok[new_phrase[pos]+1] == ",":
+                        new_phrase.insert(pos+1, ",")
+                    else:
+                        new_phrase.insert(pos+1, "...")
+                elif abs(new_phrase[pos] - new_phrase[pos+1]) > 2:
+                    new_phrase.insert(pos+1, "...")
+            pos += 1
+    # Index is replaced by the corresponding word
+    new_phrase = [target_tok[pos] if isinstance(pos, int) else pos
+                  for pos in new_phrase]
+    new_phrase = remove_punct_phrases(new_phrase)
+    new_phrase = " ".join(new_phrase)
+    if ", ..." in new_phrase:
+        new_phrase = new_phrase.replace(", ...", "...")
+    return new_phrase
+
+
+def phrase_positions(lexicon, order, sentence, source_tok, stats):
+    """Finds the continuous phrases of a sentence
+
+    Parameters
+    ----------
+    lexicon : Lexicon
+        The phrases
+    order : dict
+        The phrases with their position in the list of phrases
+    sentence : str
+        The source sentence
+    source_tok : list
+        The tokenized source sentence
+    stats : Counter
+        Counts the tested phrase candidates and the matches
+
+    Returns
+    -------
+    positions : list
+        Tuples with a phrase and the positions of its words, for every
+        occurrence in the order of the list of phrases
+    """
+
+    # Positions of the phrases in the sentence
+    # Might occur more than once, although unlikely
+    found = defaultdict(list)
+    for pos, phrase_ in lexicon.find(source_tok):
+        found[phrase_].append(pos)
+
+    positions = []
+    # Same order as the list of phrases
+    for phrase_ in sorted(found, key=order.get):
+        if phrase_ in sentence:
+            stats["phrase_candidates"] += 1
+            length = len(phrase_.split())
+            stats["matches"] += len(found[phrase_])
+            # Index of the phrase words in the source language
+            for pos in found[phrase_]:
+                positions.append((phrase_, [list(range(pos, pos + length))]))
+    return positions
+
+
+def discontinuous_positions(phrases, sentence, source_tok, stats):
+    """Finds the discontinuous phrases of a sentence
+
+    Parameters
+    ----------
+    phrases : list
+        The discontinuous phrases
+    sentence : str
+        The source sentence
+    source_tok : list
+        The tokenized source sentence
+    stats : Counter
+        Counts the tested phrase candidates and the matches
+
+    Returns
+    -------
+    positions : list
+        Tuples with a phrase and the positions of the words of its
+        parts, in the order of the list of phrases
+    """
+
+    positions = []
+    for phrase_ in phrases:
+        phrase = phrase_.split(" ... ")
+        if phrase[0] in sentence\
+                and phrase[1] in sentence\
+                and sentence.index(phrase[0])\
+                < sentence.index(phrase[1]):
+            stats["phrase_candidates"] += 1
+            stats["matches"] += 1
+            # Index of the phrase words in the source language
+            phrase_index = []
+            # Searches the exact position of the phrase in the
+            # string
+            # Might occur more than once, although unlikely
+            for part in phrase:
+                part = part.split()
+                for pos in range(0, len(source_tok) - len(part) + 1):
+                    if source_tok[pos:pos+len(part)] == part:
+                        source_pos = list(range(pos, pos + len(part)))
+                        if source_pos not in phrase_index:
+                            phrase_index.append(source_pos)
+                            break
+            positions.append((phrase_, phrase_index))
+    return positions
+
+
+def sentence_pair(index, l1, l2, lang=1):
+    """Splits a line of the eflomal alignment and the corpora
+
+    Returns the source sentence, the tokens of the source and the
+    target sentence and the aligned positions.
+    """
+
+    pair = [[int(a.split("-")[0]), int(a.split("-")[1])]
+            for a in index.split()]
+    if lang == 1:
+        return l1, l1.split(), l2.split(), pair
+    return l2, l2.split(), l1.split(), pair
+
+
+def phrase_alignment_batch(first, lines, phrases, lang=1):
+    """Creates alignments for phrases for a batch of lines
+
+    Used by parse_phrase_alignments
+
+    Parameters
+    ----------
+    first : int
+        The line number (starting at 0) of the first line in the batch
+    lines : list
+        Tuples with the eflomal alignment, the source and the target
+        sentence of every line
+    phrases : list
+        A list with all phrases of language 1 or 2
+    lang : int
+        An integer that indicates whether the phrases correspond to
+        language 1 or 2
+
+    Returns
+    -------
+    phrase_alignments : defaultdict
+        A dictionary with the alignments for phrases
+    stats : Counter
+        The number of scanned sentences, tested phrase candidates and
+        matches
+    """
+
+    phrase_alignments = defaultdict(list)
+    stats = Counter()
+    # The trie finds the phrases of a sentence in one pass
+    lexicon = Lexicon(phrases)
+    order = {phrase: pos for pos, phrase in enumerate(lexicon)}
+    for index, l1, l2 in lines:
+        stats["sentences_scanned"] += 1
+        sentence, source_tok, target_tok, pair = sentence_pair(index, l1,
+                                                               l2, lang)
+        for phrase_, phrase_index in phrase_positions(lexicon, order,
+                                                      sentence, source_tok,
+                                                      stats):
+            phrase_alignments[phrase_].append(
+                aligned_phrase(phrase_index, pair, target_tok, lang))
+
+    return phrase_alignments, stats
+
+
+def discontinuous_batch(first, lines, phrases, lang=1):
+    """Creates alignments for discontinuous phrases for a batch of lines
+
+    Used by parse_discontinuous
+
+    Parameters
+    ----------
+    first : int
+        The line number (starting at 0) of the first line in the batch
+    lines : list
+        Tuples with the eflomal alignment, the source and the target
+        sentence of every line
+    phrases : list
+        A list with all phrases of language 1 or 2
+    lang : int
+        An integer that indicates whether the phrases correspond to
+        language 1 or 2
+
+    Returns
+    -------
+    phrase_alignments : defaultdict
+        A dictionary with the alignments for phrases
+    stats : Counter
+        The number of scanned sentences, tested phrase candidates and
+        matches
+    """
+
+    phrase_alignments = defaultdict(list)
+    stats = Counter()
+    for index, l1, l2 in lines:
+        stats["sentences_scanned"] += 1
+        sentence, source_tok, target_tok, pair = sentence_pair(index, l1,
+                                                               l2, lang)
+        for phrase_, phrase_index in discontinuous_positions(
+                phrases, sentence, source_tok, stats):
+            phrase_alignments[phrase_].append(
+                aligned_phrase(phrase_index, pair, target_tok, lang))
+
+    return phrase_alignments, stats
+
+
+def multi_target_batch(first, lines, phrases, discontinuous):
+    """Creates alignments for phrases of one source language with
+    several target languages for a batch of lines
+
+    The phrases are searched once in every source sentence, the
+    alignments are created for every target language that searches
+    the phrase. Used by parse_multi_target
+
+    Parameters
+    ----------
+    first : int
+        The line number (starting at 0) of the first line in the batch
+    lines : list
+        Tuples with the source sentence followed by the eflomal
+        alignment and the sentence of every target language
+    phrases : list
+        A list with the continuous phrases for every target language
+    discontinuous : list
+        A list with the discontinuous phrases for every target language
+
+    Returns
+    -------
+    alignments : list
+        The phrase and the discontinuous alignments (defaultdicts) for
+        every target language
+    stats : Counter
+        The number of scanned sentences, tested phrase candidates and
+        matches
+    """
+
+    alignments = [(defaultdict(list), defaultdict(list)) for _ in phrases]
+    wanted = [(set(conns), set(discont)) for conns, discont
+              in zip(phrases, discontinuous)]
+    stats = Counter()
+    # The union of the phrases of all target languages
+    lexicon = Lexicon(conn for conns in phrases for conn in conns)
+    order = {phrase: pos for pos, phrase in enumerate(lexicon)}
+    all_discontinuous = list(dict.fromkeys(
+        conn for conns in discontinuous for conn in conns))
+    for source, *targets in lines:
+        stats["sentences_scanned"] += 1
+        source_tok = source.split()
+        found = (phrase_positions(lexicon, order, source, source_tok, stats),
+                 discontinuous_positions(all_discontinuous, source,
+                                         source_tok, stats))
+        if not found[0] and not found[1]:
+            continue
+        for i, (index, target_sentence) in enumerate(zip(targets[0::2],
+                                                         targets[1::2])):
+            pair = None
+            for kind, positions in enumerate(found):
+                for phrase_, phrase_index in positions:
+                    if phrase_ not in wanted[i][kind]:
+                        continue
+                    # Only split if the target language needs it
+                    if pair is None:
+                        _, _, target_tok, pair = sentence_pair(
+                            index, source, target_sentence)
+                    alignments[i][kind][phrase_].append(
+                        aligned_phrase(phrase_index, pair, target_tok))
+
+    return alignments, stats
+
+
+def merge_alignments(alignments, new_alignments):
+    """Appends the alignments of a batch to the alignments so far
+
+    Parameters
+    ----------
+    alignments : dict
+        The alignments of the previous lines, extended in place
+    new_alignments : defaultdict
+        The alignments of the following lines
+
+    Returns
+    -------
+    None
+    """
+
+    for key, values in new_alignments.items():
+        alignments.setdefault(key, []).extend(values)
+
+
+def encoded_phrase_batch(first, corpus, phrases, lang=1, gap=0, comma=1):
+    """Creates alignments for phrases for a batch of an encoded corpus
+
+    Finds the same phrases as phrase_alignment_batch, but compares the
+    ids of the tokens. Only phrases whose first id occurs in the
+    sentence are compared.
+
+    Parameters
+    ----------
+    first : int
+        The line number (starting at 0) of the first line in the batch
+    corpus : EncodedCorpus
+        The lines of the batch
+    phrases : list
+        Tuples with a phrase of language 1 or 2 and its ids
+    lang : int
+        An integer that indicates whether the phrases correspond to
+        language 1 or 2
+    gap : int
+        The id of '...'
+    comma : int
+        The id of ','
+
+    Returns
+    -------
+    phrase_alignments : defaultdict
+        A dictionary with tuples of the ids of the aligned words for
+        phrases
+    stats : Counter
+        The number of scanned sentences, tested phrase candidates and
+        matches
+    """
+
+    # Phrases by their first id, the order of the lexicon is kept
+    starts = defaultdict(list)
+    for order, (phrase, ids) in enumerate(phrases):
+        if ids:
+            starts[ids[0]].append((order, phrase, tuple(ids)))
+
+    phrase_alignments = defaultdict(list)
+    stats = Counter()
+    for line in range(len(corpus)):
+        stats["sentences_scanned"] += 1
+        source_ids, target_ids, links = corpus.sentence(line)
+        if lang == 2:
+            source_ids, target_ids = target_ids, source_ids
+        matches = []
+        for pos, token in enumerate(source_ids):
+            for order, phrase, ids in starts.get(token, ()):
+                stats["phrase_candidates"] += 1
+                if tuple(source_ids[pos:pos+len(ids)]) == ids:
+                    matches.append((order, pos, phrase, len(ids)))
+        if not matches:
+            continue
+        stats["matches"] += len(matches)
+
+        # Target positions for every source position
+        aligned = defaultdict(list)
+        for i1, i2 in zip(links[0::2], links[1::2]):
+            if lang == 1:
+                aligned[i1].append(i2)
+            elif lang == 2:
+                aligned[i2].append(i1)
+
+        # Same order as in phrase_alignment_batch
+        for order, start, phrase, length in sorted(matches):
+            new_phrase = []
+            for word_pos in range(start, start + length):
+                new_phrase += aligned[word_pos]
+            new_phrase = sorted(set(new_phrase))
+            if len(new_phrase) > 1:
+                # Inserts gaps (-1) and commas (-2) for discontinuous
+                # phrases
+                pos = 0
+                while pos < len(new_phrase) - 1:
+                    if new_phrase[pos] >= 0 and new_phrase[pos+1] >= 0:
+                        if abs(new_phrase[pos] - new_phrase[pos+1]) == 2:
+                            if target_ids[new_phrase[pos]+1] == comma:
+                                new_phrase.insert(pos+1, -2)
+                            else:
+                                new_phrase.insert(pos+1, -1)
+                        elif abs(new_phrase[pos] - new_phrase[pos+1]) > 2:
+                            new_phrase.insert(pos+1, -1)
+                    pos += 1
+            # Position is replaced by the id of the word
+            phrase_alignments[phrase].append(tuple(
+                target_ids[pos] if pos >= 0 else gap if pos == -1
+                else comma for pos in new_phrase))
+
+    return phrase_alignments, stats
+
+
+def collect_batches(results, phrase_alignments, stats, start=0,
+                    checkpoint=None, checkpoint_every=1000000):
+    """Merges the alignments of batches in the order of the lines
+
+    Parameters
+    ----------
+    results : iterable
+        The number of the first line, the number of lines and the
+        alignments and counters of every batch
+    phrase_alignments : defaultdict
+        The alignments so far, extended in place
+    stats : Counter
+        The counters so far, increased in place
+    start : int, optional
+        The number of lines before the first batch
+    checkpoint : function, optional
+        Called with the number of finished lines and the alignments so
+        far at the end of a batch after every checkpoint_every lines
+    checkpoint_every : int, optional
+        The number of lines between two calls of checkpoint
+
+    Returns
+    -------
+    phrase_alignments : defaultdict
+        A dictionary with the alignments for phrases
+    """
+
+    done = start
+    for first, size, (alignments, batch_stats) in results:
+        merge_alignments(phrase_alignments, alignments)
+        stats.update(batch_stats)
+        if checkpoint is not None and (first + size) // checkpoint_every\
+                > done // checkpoint_every:
+            checkpoint(first + size, phrase_alignments)
+        done = first + size
+
+    return phrase_alignments
+
+
+def parse_word_alignments(result, source_sentences, target_sentences,
+                          workers=1, batch_size=10000, start=0):
     """Creates word alignments based on the eflomal alignment
 
     Parameters
@@ -26,6 +642,12 @@ def parse_word_alignments(result, source_sentences, target_sentences):
         The file name for the source corpus
     target_sentences : str
         The file name for the target corpus
+    workers : int, optional
+        The number of processes
+    batch_size : int, optional
+        The number of lines read and processed at once
+    start : int, optional
+        The number of lines to skip, e.g. the lines of an earlier run
 
     Returns
     -------
@@ -39,131 +661,20 @@ def parse_word_alignments(result, source_sentences, target_sentences):
 
     lang1_lang2_alignments = defaultdict(list)
     lang2_lang1_alignments = defaultdict(list)
-
-    with open(result, "r", encoding="utf-8") as result,\
-            open(source_sentences, "r", encoding="utf-8") as source,\
-            open(target_sentences, "r", encoding="utf-8") as target:
-        for index, lang1, lang2 in zip(result, source, target):
-            source = lang1.split()
-            target = lang2.split()
-            alignment = index.split()
-            pair = [a.split("-") for a in alignment]
-
-            # Adds an empty string as alignment if there is no
-            # alignment for a word
-            lang1_missing = list(range(0, len(source)))
-            lang2_missing = list(range(0, len(target)))
-            for word1, word2 in pair:
-                try:
-                    lang1_missing.remove(int(word1))
-                except ValueError:
-                    pass
-                try:
-                    lang2_missing.remove(int(word2))
-                except ValueError:
-                    pass
-
-            if lang1_missing:
-                for missing in lang1_missing:
-                    lang1_lang2_alignments[source[missing]].append("")
-            if lang2_missing:
-                for missing in lang2_missing:
-                    lang2_lang1_alignments[target[missing]].append("")
-
-            # Adds the alignments to dictionaries so that phrases
-            # are allowed as well
-            phrase_align_lang1_r = defaultdict(list)
-            phrase_align_lang2_r = defaultdict(list)
-            for p in pair:
-                phrase_align_lang1_r[p[0]].append(p[1])
-                phrase_align_lang2_r[p[1]].append(p[0])
-
-            # Reverses the pair, so that phrases are allowed as keys
-            phrase_align_lang1 = defaultdict(list)
-            phrase_align_lang2 = defaultdict(list)
-            for k, v in phrase_align_lang2_r.items():
-                phrase_align_lang1[tuple(v)].append(k)
-            for k, v in phrase_align_lang1_r.items():
-                phrase_align_lang2[tuple(v)].append(k)
-
-            # Eliminate unsymmetrical alignments
-            source_target = set([(key, tuple(value)) for key, value
-                                 in phrase_align_lang1.items()])
-            target_source_r = set([(tuple(value), key) for key, value
-                                   in phrase_align_lang2.items()])
-
-            source_error = list(source_target - target_source_r)
-            target_error = list(target_source_r - source_target)
-
-            if source_error and target_error:
-                for key, value in source_error:
-                    del phrase_align_lang1[key]
-                for value, key in target_error:
-                    del phrase_align_lang2[key]
-
-            # Identifies discontinous phrases
-            # For source - target
-            for lang1, lang2 in phrase_align_lang1.items():
-                if len(lang2) > 1:
-                    lang2_original = deepcopy(lang2)
-                    for pos in range(len(lang2)-1):
-                        if lang2[pos].isnumeric() and lang2[pos+1].isnumeric():
-                            if abs(int(lang2[pos]) - int(lang2[pos+1])) == 2:
-                                if target[int(lang2[pos])+1] == ",":
-                                    phrase_align_lang1[lang1].insert(
-                                        pos+1, ",")
-                                else:
-                                    phrase_align_lang1[lang1].insert(
-                                        pos+1, "...")
-                            elif abs(int(lang2[pos]) - int(lang2[pos+1])) > 2:
-                                phrase_align_lang1[lang1].insert(pos+1, "...")
-                    # Change in the other lexicon as well if
-                    # something was changed
-                    if len(lang2) != len(lang2_original):
-                        phrase_align_lang2[tuple(lang2)] = \
-                            phrase_align_lang2[tuple(lang2_original)]
-                        del phrase_align_lang2[tuple(lang2_original)]
-
-            # For  target - source
-            for lang2, lang1 in phrase_align_lang2.items():
-                if len(lang1) > 1:
-                    lang1_original = deepcopy(lang1)
-                    for pos in range(len(lang1)-1):
-                        if lang1[pos].isnumeric() and lang1[pos+1].isnumeric():
-                            if abs(int(lang1[pos]) - int(lang1[pos+1])) == 2:
-                                if source[int(lang1[pos])+1] == ",":
-                                    phrase_align_lang2[lang2].insert(
-                                        pos+1, ",")
-                                else:
-                                    phrase_align_lang2[lang2].insert(
-                                        pos+1, "...")
-                            elif abs(int(lang1[pos]) - int(lang1[pos+1])) > 2:
-                                phrase_align_lang2[lang2].insert(pos+1, "...")
-                    if len(lang1) != len(lang1_original):
-                        phrase_align_lang1[tuple(lang1)] = \
-                            phrase_align_lang1[tuple(lang1_original)]
-                        del phrase_align_lang1[tuple(lang1_original)]
-
-            # Index is replaced by the corresponding word
-            for lang1, lang2 in phrase_align_lang1.items():
-                k = ([source[int(i)] if i.isnumeric() else i for i in lang1])
-                v = ([target[int(i)] if i.isnumeric() else i for i in lang2])
-                k = remove_punct_phrases(k)
-                v = remove_punct_phrases(v)
-                lang1_lang2_alignments[" ".join(k)].append(" ".join(v))
-
-            # Index is replaced by the corresponding word
-            for lang2, lang1 in phrase_align_lang2.items():
-                k = ([target[int(i)] if i.isnumeric() else i for i in lang2])
-                v = ([source[int(i)] if i.isnumeric() else i for i in lang1])
-                k = remove_punct_phrases(k)
-                v = remove_punct_phrases(v)
-                lang2_lang1_alignments[" ".join(k)].append(" ".join(v))
+    for first, size, (lang1_lang2, lang2_lang1) in map_batches(
+            word_alignment_batch,
+            (result, source_sentences, target_sentences),
+            workers=workers, batch_size=batch_size, start=start):
+        merge_alignments(lang1_lang2_alignments, lang1_lang2)
+        merge_alignments(lang2_lang1_alignments, lang2_lang1)
 
     return lang1_lang2_alignments, lang2_lang1_alignments
 
 
-def parse_phrase_alignments(result, language1, language2, phrases, lang=1):
+def parse_phrase_alignments(result, language1, language2, phrases, lang=1,
+                            stats=None, start=0, partial=None, checkpoint=None,
+                            checkpoint_every=1000000, workers=1,
+                            batch_size=10000):
     """Creates alignments for phrases through combining of eflomal
     alignments
 
@@ -186,6 +697,22 @@ def parse_phrase_alignments(result, language1, language2, phrases, lang=1):
     lang : int
         An integer that indicates whether the phrases correspond to
         language 1 or 2
+    stats : Counter, optional
+        Counts the scanned sentences, the tested phrase candidates and
+        the matches
+    start : int, optional
+        The number of lines to skip, used to continue a scan
+    partial : defaultdict, optional
+        The alignments of the skipped lines, extended by the scan
+    checkpoint : function, optional
+        Called with the number of finished lines and the alignments so
+        far at the end of a batch after every checkpoint_every lines
+    checkpoint_every : int, optional
+        The number of lines between two calls of checkpoint
+    workers : int, optional
+        The number of processes
+    batch_size : int, optional
+        The number of lines read and processed at once
 
     Returns
     -------
@@ -193,84 +720,23 @@ def parse_phrase_alignments(result, language1, language2, phrases, lang=1):
         A dictionary with the alignments for phrases
     """
 
-    phrase_alignments = defaultdict(list)
-    with open(result, "r", encoding="utf-8") as result,\
-            open(language1, "r", encoding="utf-8") as lang1,\
-            open(language2, "r", encoding="utf-8") as lang2:
-        for index, l1, l2 in zip(result, lang1, lang2):
-            lang_1 = l1.split()
-            lang_2 = l2.split()
-            alignment = index.split()
-            pair = [[int(a.split("-")[0]), int(a.split("-")[1])]
-                    for a in alignment]
-            if lang == 1:
-                sentence = l1
-                source_tok = lang_1
-                target_tok = lang_2
-            elif lang == 2:
-                sentence = l2
-                source_tok = lang_2
-                target_tok = lang_1
-
-            for phrase_ in phrases:
-                if phrase_ in sentence:
-                    phrase = phrase_.split()
-                    # Index of the phrase words in the source language
-                    phrase_index = []
-                    # Searches the exact position of the phrase in the
-                    # string
-                    # Might occur more than once, although unlikely
-                    for pos in range(0, len(source_tok) - len(phrase) + 1):
-                        if source_tok[pos:pos+len(phrase)] == phrase:
-                            phrase_index.append(list(range(pos,
-                                                           pos + len(phrase))))
-
-                    for pos_range in phrase_index:
-                        # Indexes of the target words
-                        new_phrase = []
-                        for word_pos in pos_range:
-                            # Saves all target indexes in a list
-                            if lang == 1:
-                                alignment_index = [i2 for i1, i2 in pair
-                                                   if i1 == word_pos]
-                            elif lang == 2:
-                                alignment_index = [i1 for i1, i2 in pair
-                                                   if i2 == word_pos]
-                            new_phrase += alignment_index
-                        new_phrase = pd.unique(new_phrase).tolist()
-                        if len(new_phrase) > 1:
-                            new_phrase.sort()
-                            # Inserts "..." for discontinuous
-                            # phrases
-                            pos = 0
-                            while pos < len(new_phrase) - 1:
-                                if isinstance(new_phrase[pos], int)\
-                                        and isinstance(new_phrase[pos+1], int):
-                                    if abs(new_phrase[pos]
-                                           - new_phrase[pos+1]) == 2:
-                                        if target_tok[new_phrase[pos]+1]\
-                                                == ",":
-                                            new_phrase.insert(pos+1, ",")
-                                        else:
-                                            new_phrase.insert(pos+1, "...")
-                                    elif abs(new_phrase[pos]
-                                             - new_phrase[pos+1]) > 2:
-                                        new_phrase.insert(pos+1, "...")
-                                pos += 1
-                        # Index is replaced by the corresponding word
-                        new_phrase = [target_tok[pos] if isinstance(pos, int)
-                                      else pos
-                                      for pos in new_phrase]
-                        new_phrase = remove_punct_phrases(new_phrase)
-                        new_phrase = " ".join(new_phrase)
-                        if ", ..." in new_phrase:
-                            new_phrase = new_phrase.replace(", ...", "...")
-                        phrase_alignments[phrase_].append(new_phrase)
-
-    return phrase_alignments
-
-
-def parse_discontinuous(result, language1, language2, phrases, lang=1):
+    if stats is None:
+        stats = Counter()
+    phrase_alignments = defaultdict(list) if partial is None else partial
+    if checkpoint is not None:
+        batch_size = min(batch_size, checkpoint_every)
+    results = map_batches(phrase_alignment_batch,
+                          (result, language1, language2),
+                          args=(phrases, lang), workers=workers,
+                          batch_size=batch_size, start=start)
+    return collect_batches(results, phrase_alignments, stats, start,
+                           checkpoint, checkpoint_every)
+
+
+def parse_discontinuous(result, language1, language2, phrases, lang=1,
+                        stats=None, start=0, partial=None, checkpoint=None,
+                        checkpoint_every=1000000, workers=1,
+                        batch_size=10000):
     """Creates alignments for discontinuous phrases independently from
     the eflomal alignments
 
@@ -293,6 +759,22 @@ def parse_discontinuous(result, language1, language2, phrases, lang=1):
     lang : int
         An integer that indicates whether the phrases correspond to
         language 1 or 2
+    stats : Counter, optional
+        Counts the scanned sentences, the tested phrase candidates and
+        the matches
+    start : int, optional
+        The number of lines to skip, used to continue a scan
+    partial : defaultdict, optional
+        The alignments of the skipped lines, extended by the scan
+    checkpoint : function, optional
+        Called with the number of finished lines and the alignments so
+        far at the end of a batch after every checkpoint_every lines
+    checkpoint_every : int, optional
+        The number of lines between two calls of checkpoint
+    workers : int, optional
+        The number of processes
+    batch_size : int, optional
+        The number of lines read and processed at once
 
     Returns
     -------
@@ -300,89 +782,144 @@ def parse_discontinuous(result, language1, language2, phrases, lang=1):
         A dictionary with the alignments for phrases
     """
 
-    phrase_alignments = defaultdict(list)
-    with open(result, "r", encoding="utf-8") as result,\
-            open(language1, "r", encoding="utf-8") as lang1,\
-            open(language2, "r", encoding="utf-8") as lang2:
-        for index, l1, l2 in zip(result, lang1, lang2):
-            lang_1 = l1.split()
-            lang_2 = l2.split()
-            alignment = index.split()
-            pair = [[int(a.split("-")[0]), int(a.split("-")[1])]
-                    for a in alignment]
-            if lang == 1:
-                sentence = l1
-                source_tok = lang_1
-                target_tok = lang_2
-            elif lang == 2:
-                sentence = l2
-                source_tok = lang_2
-                target_tok = lang_1
-
-            for phrase_ in phrases:
-                phrase = phrase_.split(" ... ")
-                if phrase[0] in sentence\
-                        and phrase[1] in sentence\
-                        and sentence.index(phrase[0])\
-                        < sentence.index(phrase[1]):
-                    # Index of the phrase words in the source language
-                    phrase_index = []
-                    # Searches the exact position of the phrase in the
-                    # string
-                    # Might occur more than once, although unlikely
-                    for part in phrase:
-                        part = part.split()
-                        for pos in range(0, len(source_tok) - len(part) + 1):
-                            if source_tok[pos:pos+len(part)] == part:
-                                source_pos = list(range(pos, pos
-                                                        + len(part)))
-                                if source_pos not in phrase_index:
-                                    phrase_index.append(source_pos)
-                                    break
-
-                    new_phrase = []
-                    for pos_range in phrase_index:
-                        # Indexes of the target words
-                        for word_pos in pos_range:
-                            # Saves all target indexes in a list
-                            if lang == 1:
-                                alignment_index = [i2 for i1, i2 in pair
-                                                   if i1 == word_pos]
-                            elif lang == 2:
-                                alignment_index = [i1 for i1, i2 in pair
-                                                   if i2 == word_pos]
-                            new_phrase += alignment_index
-
-                    new_phrase = pd.unique(new_phrase).tolist()
-                    if len(new_phrase) > 1:
-                        new_phrase.sort()
-                        # Inserts "..." for discontinuous phrases
-                        pos = 0
-                        while pos < len(new_phrase) - 1:
-                            if isinstance(new_phrase[pos], int)\
-                                    and isinstance(new_phrase[pos+1], int):
-                                if abs(new_phrase[pos]
-                                       - new_phrase[pos+1]) == 2:
-                                    if target_tok[new_phrase[pos]+1]\
-                                            == ",":
-                                        new_phrase.insert(pos+1, ",")
-                                    else:
-                                        new_phrase.insert(pos+1, "...")
-                                elif abs(new_phrase[pos]
-                                         - new_phrase[pos+1]) > 1:
-                                    new_phrase.insert(pos+1, "...")
-                            pos += 1
-                    # Index is replaced by the corresponding word
-                    new_phrase = [target_tok[pos] if isinstance(pos, int)
-                                  else pos
-                                  for pos in new_phrase]
-                    new_phrase = remove_punct_phrases(new_phrase)
-                    new_phrase = " ".join(new_phrase)
-                    if ", ..." in new_phrase:
-                        new_phrase = new_phrase.replace(", ...", "...")
-                    phrase_alignments[phrase_].append(new_phrase)
+    if stats is None:
+        stats = Counter()
+    phrase_alignments = defaultdict(list) if partial is None else partial
+    if checkpoint is not None:
+        batch_size = min(batch_size, checkpoint_every)
+    results = map_batches(discontinuous_batch, (result, language1, language2),
+                          args=(phrases, lang), workers=workers,
+                          batch_size=batch_size, start=start)
+    return collect_batches(results, phrase_alignments, stats, start,
+                           checkpoint, checkpoint_every)
 
-    return phrase_alignments
+
+def parse_multi_target(source_corpus, alignments, target_corpora, phrases,
+                       discontinuous, stats=None, workers=1,
+                       batch_size=10000):
+    """Creates alignments for the phrases of one source language with
+    several target languages in a single scan
+
+    Gives the same alignments as parse_phrase_alignments and
+    parse_discontinuous for every target language, but every source
+    sentence is read and searched only once.
+
+    Parameters
+    ----------
+    source_corpus : str
+        The file name for the source corpus
+    alignments : list
+        The file names for the eflomal alignments with every target
+        language
+    target_corpora : list
+        The file names for the target corpora, in the same order
+    phrases : list
+        A list with the continuous source phrases for every target
+        language
+    discontinuous : list
+        A list with the discontinuous source phrases for every target
+        language
+    stats : Counter, optional
+        Counts the scanned sentences, the tested phrase candidates and
+        the matches
+    workers : int, optional
+        The number of processes
+    batch_size : int, optional
+        The number of lines read and processed at once
+
+    Returns
+    -------
+    target_alignments : list
+        The phrase and the discontinuous alignments (defaultdicts) for
+        every target language
+    """
+
+    if stats is None:
+        stats = Counter()
+    target_alignments = [(defaultdict(list), defaultdict(list))
+                         for _ in target_corpora]
+    files = (source_corpus, *(file for pair in zip(alignments,
+                                                   target_corpora)
+                              for file in pair))
+    for first, size, (batch_alignments, batch_stats) in map_batches(
+            multi_target_batch, files, args=(phrases, discontinuous),
+            workers=workers, batch_size=batch_size):
+        for target, batch_target in zip(target_alignments, batch_alignments):
+            merge_alignments(target[0], batch_target[0])
+            merge_alignments(target[1], batch_target[1])
+        stats.update(batch_stats)
+
+    return target_alignments
+
+
+def parse_encoded_phrases(corpus, phrases, lang=1, stats=None, start=0,
+                          partial=None, checkpoint=None,
+                          checkpoint_every=1000000, workers=1,
+                          batch_size=10000):
+    """Creates alignments for phrases in a corpus of integer ids
+
+    Gives the same alignments as parse_phrase_alignments for corpora
+    whose tokens are separated by single spaces. The words of the
+    alignments are only restored from the ids once for every different
+    alignment.
+
+    Parameters
+    ----------
+    corpus : EncodedCorpus
+        The corpus and the eflomal alignment as ids
+    phrases : list
+        A list with all phrases of language 1 or 2
+    lang : int
+        An integer that indicates whether the phrases correspond to
+        language 1 or 2
+    stats : Counter, optional
+        Counts the scanned sentences, the tested phrase candidates and
+        the matches
+    start : int, optional
+        The number of lines to skip, used to continue a scan
+    partial : defaultdict, optional
+        The alignments of the skipped lines, extended by the scan
+    checkpoint : function, optional
+        Called with the number of finished lines and the alignments so
+        far at the end of a batch after every checkpoint_every lines
+    checkpoint_every : int, optional
+        The number of lines between two calls of checkpoint
+    workers : int, optional
+        The number of processes
+    batch_size : int, optional
+        The number of lines processed at once
+
+    Returns
+    -------
+    phrase_alignments : defaultdict
+        A dictionary with the alignments for phrases
+    """
+
+    if stats is None:
+        stats = Counter()
+    phrase_alignments = defaultdict(list) if partial is None else partial
+    if checkpoint is not None:
+        batch_size = min(batch_size, checkpoint_every)
+    vocabulary = corpus.vocabulary
+    compiled = [(phrase, vocabulary.encode(phrase.split()))
+                for phrase in phrases]
+    words = dict()
+
+    def restore(results):
+        for first, size, (alignments, batch_stats) in results:
+            for phrase, targets in alignments.items():
+                for ids in targets:
+                    if ids not in words:
+                        words[ids] = vocabulary.phrase(ids)
+                alignments[phrase] = [words[ids] for ids in targets]
+            yield first, size, (alignments, batch_stats)
+
+    results = map_ordered(encoded_phrase_batch,
+                          corpus.batches(batch_size, start),
+                          args=(compiled, lang, vocabulary.gap,
+                                vocabulary.comma), workers=workers)
+    return collect_batches(restore(results), phrase_alignments, stats, start,
+                           checkpoint, checkpoint_every)
 
 
 if __name__ == "__main__":
@@ -397,11 +934,27 @@ if __name__ == "__main__":
                         help="Alignment text file in Pharaoh format")
     parser.add_argument("source_corpus", help="Corpus with source sentences")
     parser.add_argument("target_corpus", help="Corpus with target sentences")
+    parser.add_argument("-w", "--workers", action="store", default=1,
+                        type=int,
+                        help="Number of processes for the alignments")
+    parser.add_argument("-u", "--update", action="store", default=0,
+                        type=int,
+                        help="Number of lines already in the word alignment"
+                        " files, only the following lines are added")
     args = parser.parse_args()
     source, target = parse_word_alignments(args.word_alignment,
                                            args.source_corpus,
-                                           args.target_corpus)
-    save_alignments(
-        f"{args.source_lang}_{args.target_lang}_word_alignment.json", source)
-    save_alignments(
-        f"{args.target_lang}_{args.source_lang}_word_alignment.json", target)
+                                           args.target_corpus,
+                                           workers=args.workers,
+                                           start=args.update)
+    for lang1, lang2, alignments in ((args.source_lang, args.target_lang,
+                                      source),
+                                     (args.target_lang, args.source_lang,
+                                      target)):
+        file_name = f"{lang1}_{lang2}_word_alignment.json"
+        if args.update:
+            # The alignments of the new lines are appended
+            previous = json_to_dict(file_name)
+            merge_alignments(previous, alignments)
+            alignments = previous
+        save_alignments(file_name, alignments)
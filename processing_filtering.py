@@ -8,13 +8,22 @@
 """Preprocessing of the data"""
 
 import json
-import pandas as pd
 import string
-import xml.etree.ElementTree as ET
 from collections import Counter, defaultdict
 from copy import deepcopy
+from pathlib import Path
 
-from nltk.tokenize import RegexpTokenizer
+from corpus_io import open_text
+from help_functions.discourse_relations import assign_relations
+from lexicon import Lexicon, entry_connectives, iter_xml_entries
+
+
+LEXICONS = {"it": Path("connectives_and_relations/lico_d.xml"),
+            "es": Path("connectives_and_relations/spanish_conns.txt"),
+            "de": Path("connectives_and_relations/dimlex.xml")}
+
+RELATIONS = {"it": Path("connectives_and_relations/it_relations.json"),
+             "de": Path("connectives_and_relations/de_relations.json")}
 
 
 def filter_most_common_conns(dictionary, word_threshold, phrase_threshold):
@@ -182,6 +191,59 @@ def remove_punct_values(dictionary):
     return no_punct
 
 
+def merge_punctuation(words):
+    """Counts alignments to a punctuation as alignments to an empty
+    string, like remove_punct_values
+
+    Parameters
+    ----------
+    words : dict
+        The counted alignments of a connective
+
+    Returns
+    -------
+    no_punct : Counter
+        The counted alignments without punctuation
+    """
+
+    no_punct = Counter()
+    for word, count in words.items():
+        if word and word in string.punctuation:
+            no_punct[""] += count
+        else:
+            no_punct[word] += count
+    return no_punct
+
+
+def count_probabilities(counts):
+    """Calculates the probabilities of counted alignments
+
+    Gives the same result as remove_punct_values and
+    alignment_probabilities for the uncounted alignments, so the
+    probabilities can be derived from stored or merged counts.
+
+    Parameters
+    ----------
+    counts : dict
+        A dictionary with the counted alignments of every connective
+
+    Returns
+    -------
+    conn_alignments : dict
+        A dictionary with the probability of each alignment
+    """
+
+    conn_alignments = dict()
+    for conn, words in counts.items():
+        no_punct = merge_punctuation(words)
+        total = sum(no_punct.values())
+        if total:
+            conn_alignments[conn] = {word: count / total
+                                     for word, count in no_punct.items()}
+
+    return conn_alignments
+
+
 def alignment_probabilities(alignments):
     """Calculates the probalities of the alignments
 
@@ -222,39 +284,17 @@ def read_xml_lex(doc):
 
     Returns
     -------
-    conn : list
-        A list with the connectives
+    conn : Lexicon
+        The connectives of the lexicon
     """
 
-    regex = r"[\w\.]+|\b\w+'|\w+(?:['-]\w+)*|[^\w\s]"
-    tokenizer = RegexpTokenizer(regex)
-
-    root = ET.parse(doc).getroot()
     conn = []
-    for entry in root.findall("./entry"):
+    for entry in iter_xml_entries(doc):
         # Saves all variants of a connective
-        # Single words and phrases (continuous)
-        singles_phrases = [variant.text.lower() for variant
-                           in entry.findall("./orths/orth[@type='cont']/part")]
-
-        # Tokenization: "d'abord" -> "d' abord"
-        singles_phrases = [" ".join(tokenizer.tokenize(phrase))
-                           for phrase in singles_phrases]
-        conn += singles_phrases
-
-        # Same procedure for discontinuous phrases
-        for discont in entry.findall("./orths/orth[@type='discont']"):
-            discontinuous = [part.text.lower() for part
-                             in discont.findall("./part")]
-            discontinuous = [" ".join(tokenizer.tokenize(phrase))
-                             for phrase in discontinuous]
-            discontinuous = " ... ".join(discontinuous)
-            conn.append(discontinuous)
+        conn += entry_connectives(entry)
 
     # Removes doubles which exist because everything is lower-case now
-    conn = pd.unique(conn).tolist()
-
-    return conn
+    return Lexicon(conn)
 
 
 def read_es_conns(conn_file):
@@ -267,25 +307,84 @@ def read_es_conns(conn_file):
 
     Returns
     -------
-    conns : list
-        A list with the connectives
+    conns : Lexicon
+        The connectives of the file
 
     Note: Can be used for other languages as well
     """
 
     conns = []
-    with open(conn_file, "r", encoding="utf-8") as file:
+    with open_text(conn_file) as file:
         for line in file:
             conns.append(line.strip())
-    conns = pd.unique(conns).tolist()
-
-    return conns
+    return Lexicon(conns)
 
 
 def json_to_dict(file):
     """Saves the alignment of the JSON file as a dictionary"""
 
-    with open(file, "r", encoding="utf-8") as f:
+    with open_text(file) as f:
         data = json.load(f)
 
     return data
+
+
+def read_lexicon(lang, lex_file=""):
+    """Reads the connective lexicon of a language
+
+    Parameters
+    ----------
+    lang : str
+        The language code, the lexicons for Italian, Spanish and German
+        are part of the project
+    lex_file : str, optional
+        Path to a connective lexicon as XML or TXT file, only used for
+        other languages
+
+    Returns
+    -------
+    conn : Lexicon or None
+        The connectives, None if there is no lexicon
+
+    Raises
+    ------
+    ValueError
+        If the lexicon is neither a XML nor a TXT file
+    """
+
+    if lang in LEXICONS:
+        lex_file = LEXICONS[lang]
+    elif not lex_file:
+        return None
+
+    if str(lex_file).endswith("xml"):
+        return read_xml_lex(Path(lex_file))
+    if str(lex_file).endswith("txt"):
+        return read_es_conns(Path(lex_file))
+    raise ValueError("The connective lexicon has to be a XML or TXT file")
+
+
+def read_relations(lang, lex_file=""):
+    """Reads the discourse relations of the connectives of a language
+
+    Parameters
+    ----------
+    lang : str
+        The language code, the relations for Italian and German are
+        part of the project
+    lex_file : str, optional
+        Path to a connective lexicon, the relations are taken from it
+        if it is a XML file
+
+    Returns
+    -------
+    relations : dict
+        A dictionary with the connectives as keys and the relations in
+        a list as values, empty if there are no relations
+    """
+
+    if lang in RELATIONS:
+        return json_to_dict(RELATIONS[lang])
+    if lex_file and str(lex_file).endswith("xml"):
+        return assign_relations(lex_file)
+    return dict()
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Measuring the Stages of the Connectives Alignment"""
+
+import cProfile
+import json
+import sys
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak memory is not reported
+    resource = None
+
+
+HOT_STAGES = ("phrase_scan", "discontinuous_scan", "multi_target_scan",
+              "corpus_scan")
+
+
+def peak_rss():
+    """Returns the peak memory of the process in MB"""
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    if sys.platform == "darwin":
+        return peak / 1024 ** 2
+    return peak / 1024
+
+
+class StageProfiler:
+    """Records wall time, CPU time, peak memory and counters per stage
+
+    Parameters
+    ----------
+    trace_memory : bool, optional
+        If True, the peak of the Python memory of each stage is traced
+        with tracemalloc (slower)
+    dump_dir : str, optional
+        If specified, cProfile statistics (and tracemalloc snapshots if
+        trace_memory is True) of the hot stages are saved there
+    dump_stages : tuple, optional
+        The stages for the dumps
+
+    Attributes
+    ----------
+    stages : list
+        A dictionary with the measurements for every finished stage
+    """
+
+    def __init__(self, trace_memory=False, dump_dir=None,
+                 dump_stages=HOT_STAGES):
+        self.trace_memory = trace_memory
+        self.dump_dir = Path(dump_dir) if dump_dir else None
+        self.dump_stages = dump_stages
+        self.stages = []
+        self._start = time.perf_counter()
+        if self.dump_dir:
+            self.dump_dir.mkdir(parents=True, exist_ok=True)
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name, **info):
+        """Measures the code in the with block
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage
+        **info
+            Further information for the report, e.g. the round
+
+        Yields
+        ------
+        counters : Counter
+            Counters that can be increased inside the stage
+        """
+
+        record = {"stage": name, **info}
+        counters = Counter()
+        dump = self.dump_dir and name in self.dump_stages
+        prefix = f"{len(self.stages):03d}_{name}"
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        if dump:
+            profile = cProfile.Profile()
+            profile.enable()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield counters
+        finally:
+            record["wall_seconds"] = time.perf_counter() - wall
+            record["cpu_seconds"] = time.process_time() - cpu
+            if dump:
+                profile.disable()
+                profile.dump_stats(self.dump_dir / f"{prefix}.prof")
+            record["peak_rss_mb"] = peak_rss()
+            if self.trace_memory:
+                record["python_peak_mb"] = \
+                    tracemalloc.get_traced_memory()[1] / 1024 ** 2
+                if dump:
+                    tracemalloc.take_snapshot().dump(
+                        str(self.dump_dir / f"{prefix}.tracemalloc"))
+            record["counters"] = dict(counters)
+            self.stages.append(record)
+
+    def report(self):
+        """Returns all measurements and the totals per stage"""
+
+        totals = defaultdict(lambda: {"wall_seconds": 0.0,
+                                      "cpu_seconds": 0.0,
+                                      "calls": 0,
+                                      "counters": Counter()})
+        for record in self.stages:
+            total = totals[record["stage"]]
+            total["wall_seconds"] += record["wall_seconds"]
+            total["cpu_seconds"] += record["cpu_seconds"]
+            total["calls"] += 1
+            total["counters"].update(record["counters"])
+
+        return {"total_wall_seconds": time.perf_counter() - self._start,
+                "peak_rss_mb": peak_rss(),
+                "totals": {name: {**total, "counters": dict(total["counters"])}
+                           for name, total in totals.items()},
+                "stages": self.stages}
+
+    def save(self, file_name):
+        """Saves the report as a JSON file"""
+
+        with open(file_name, "w", encoding="utf-8") as file:
+            json.dump(self.report(), file, indent=4, ensure_ascii=False)
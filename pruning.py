@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Pruning the Alignments of a Connective during the Scans
+
+Instead of all aligned words, only a fixed number of counters is kept
+for every connective (Space-Saving, Metwally et al. 2005). A word that
+is not counted yet replaces the word with the smallest count and
+inherits its count as error. The counters always add up to the number
+of occurrences of the connective, so the probabilities keep their
+denominator, and the count of a word is overestimated by at most the
+number of occurrences divided by the number of counters. The number
+of counters is derived from the thresholds, so every alignment whose
+probability reaches a threshold is kept.
+"""
+
+import heapq
+import math
+from collections import Counter
+
+
+def pruning_capacity(word_threshold, phrase_threshold, error=0.5):
+    """Returns the number of counters for every connective
+
+    Parameters
+    ----------
+    word_threshold : float
+        The minimum probability for an alignment for a single word
+    phrase_threshold : float
+        The minimum probability for an alignment for a phrase
+    error : float, optional
+        The largest error of a probability as a fraction of the
+        smaller threshold, at most 1
+
+    Returns
+    -------
+    capacity : int
+        The number of counters
+    """
+
+    if not 0 < error <= 1:
+        raise ValueError("The error has to be larger than 0 and at most 1")
+    threshold = min(word_threshold, phrase_threshold)
+    if threshold <= 0:
+        raise ValueError("Pruning needs thresholds larger than 0")
+    return math.ceil(1 / (error * threshold))
+
+
+class SpaceSaving(Counter):
+    """The most frequent alignments of a connective with a fixed number
+    of counters
+
+    Parameters
+    ----------
+    capacity : int
+        The number of counters
+
+    Attributes
+    ----------
+    capacity : int
+        The number of counters
+    errors : dict
+        The words with the largest possible overestimation of their
+        count, only for words that replaced another word
+    """
+
+    def __init__(self, capacity):
+        super().__init__()
+        self.capacity = capacity
+        self.errors = dict()
+        # Counts of the words when they were added, a count can be
+        # larger now (see _pop_min)
+        self._heap = []
+
+    def __reduce__(self):
+        # Copies and pickles are plain Counters
+        return Counter, (dict(self),)
+
+    def _pop_min(self):
+        """Removes the word with the smallest count and returns it"""
+
+        while True:
+            count, word = heapq.heappop(self._heap)
+            if self[word] == count:
+                return word, count
+            # The count has increased since it was added
+            heapq.heappush(self._heap, (self[word], word))
+
+    def add(self, word, count=1):
+        """Counts a word
+
+        Parameters
+        ----------
+        word : str
+            The aligned word
+        count : int, optional
+            The number of occurrences
+
+        Returns
+        -------
+        None
+        """
+
+        if word in self:
+            self[word] += count
+            return
+        error = 0
+        if len(self) >= self.capacity:
+            removed, error = self._pop_min()
+            del self[removed]
+            self.errors.pop(removed, None)
+        self[word] = error + count
+        if error:
+            self.errors[word] = error
+        heapq.heappush(self._heap, (self[word], word))
+
+    def extend(self, words):
+        """Counts the words of a list, like list.extend
+
+        Returns
+        -------
+        None
+        """
+
+        for word, count in Counter(words).items():
+            self.add(word, count)
+
+
+class PrunedAlignments(dict):
+    """Alignments of connectives as SpaceSaving counters
+
+    Can be passed as partial alignments to the scans of
+    parse_alignments.py: every connective gets its own counters.
+
+    Parameters
+    ----------
+    capacity : int
+        The number of counters for every connective
+
+    Attributes
+    ----------
+    capacity : int
+        The number of counters for every connective
+    """
+
+    def __init__(self, capacity):
+        super().__init__()
+        self.capacity = capacity
+
+    def __missing__(self, conn):
+        counters = self[conn] = SpaceSaving(self.capacity)
+        return counters
+
+    def setdefault(self, conn, default=None):
+        """Returns the counters of a connective, new counters instead
+        of the default (see merge_alignments)"""
+
+        return self[conn]
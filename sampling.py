@@ -0,0 +1,427 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Estimating Connective Alignments from a Sample of the Corpus
+
+For a first look at a new language pair, a random sample of the
+sentence pairs is scanned instead of the whole corpus. The sample is
+stratified by the length of the source sentences and split into
+chunks that are stratified as well. The counts are scaled to the size
+of the corpus. A connective is not searched in the following chunks
+once the ranking of its alignments has not changed for some chunks.
+
+An alignment is only selected if the lower bound of the Wilson interval
+of its probability reaches the threshold and it occurred often enough
+in the sample, so a few sampled occurrences of a rare pair are not
+enough.
+"""
+
+import math
+import random
+import tempfile
+from array import array
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+
+from conn_search import FindAlignments
+from corpus_io import open_text, read_batches
+from lexicon import Lexicon
+from parse_alignments import (parse_discontinuous, parse_phrase_alignments,
+                              parse_word_alignments)
+from processing_filtering import (conn_count, count_probabilities,
+                                  merge_punctuation)
+
+
+def length_stratum(length):
+    """Returns the stratum of a sentence length
+
+    The strata double in size: 0, 1, 2-3, 4-7, 8-15, ... tokens
+    """
+
+    return length.bit_length()
+
+
+def stratified_sample(lengths, fraction, seed=0, chunks=1):
+    """Draws a random sample of lines stratified by sentence length
+
+    Every stratum contributes the same fraction of its lines. The
+    sampled lines of every stratum are distributed over the chunks in
+    turn, so every chunk is a stratified sample as well.
+
+    Parameters
+    ----------
+    lengths : sequence
+        The number of tokens of every source sentence
+    fraction : float
+        The fraction of the lines in the sample
+    seed : int, optional
+        The seed of the random numbers, the same seed gives the same
+        sample
+    chunks : int, optional
+        The number of chunks
+
+    Returns
+    -------
+    sample : list
+        The sorted line numbers of every chunk
+    """
+
+    strata = defaultdict(lambda: array("I"))
+    for line, length in enumerate(lengths):
+        strata[length_stratum(length)].append(line)
+
+    rng = random.Random(seed)
+    sample = [[] for _ in range(chunks)]
+    turn = 0
+    for stratum in sorted(strata):
+        lines = strata[stratum]
+        # In random order
+        for line in rng.sample(lines, round(fraction * len(lines))):
+            sample[turn % chunks].append(line)
+            turn += 1
+    return [sorted(lines) for lines in sample]
+
+
+def wilson_interval(count, total, z=1.96):
+    """Returns the Wilson score interval of a probability
+
+    Parameters
+    ----------
+    count : float
+        The number of occurrences of an alignment in the sample
+    total : float
+        The number of occurrences of the connective in the sample
+    z : float, optional
+        The quantile of the normal distribution, 1.96 for 95%
+
+    Returns
+    -------
+    low : float
+        The lower bound
+    high : float
+        The upper bound
+    """
+
+    if not total:
+        return 0.0, 1.0
+    p = count / total
+    denominator = 1 + z * z / total
+    centre = (p + z * z / (2 * total)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / total
+                           + z * z / (4 * total * total)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+
+class SampledAlignments(FindAlignments):
+    """Finds connective alignments in a sample of the corpus
+
+    The rounds are the same as in FindAlignments, but the alignments
+    are counted in the chunks of a stratified sample and scaled to the
+    number of lines of the corpus. The single words are taken from the
+    word alignments of the sample, so no word alignment files are
+    needed.
+
+    Parameters
+    ----------
+    alignment : str
+        Path to the alignment (format: 1-1 1-2 ...)
+    source_corpus : str
+        Path to the source corpus
+    target_corpus : str
+        Path to the target corpus
+    source_lex : list or Lexicon
+        Source connectives
+    target_lex : list or Lexicon
+        Target connectives
+    fraction : float, optional
+        The fraction of the lines in the sample
+    seed : int, optional
+        The seed of the random sample
+    chunks : int, optional
+        The number of chunks of the sample
+    patience : int, optional
+        A connective is not searched anymore if the ranking of its
+        alignments is the same after this number of further chunks
+    top : int, optional
+        The number of alignments in the ranking
+    min_support : int, optional
+        The minimum number of occurrences of an alignment in the sample
+    min_occurrences : int, optional
+        The minimum number of occurrences of a connective in the sample
+        before its ranking can be stable
+    **kwargs
+        Further arguments of FindAlignments, e.g. the relation types,
+        the profiler or the number of workers
+
+    Attributes
+    ----------
+    fraction : float
+        The fraction of the lines in the sample
+    seed : int
+        The seed of the random sample
+    chunks : int
+        The number of chunks of the sample
+    patience : int
+        The number of chunks with the same ranking before a connective
+        is not searched anymore
+    top : int
+        The number of alignments in the ranking
+    min_support : int
+        The minimum number of occurrences of an alignment in the sample
+    min_occurrences : int
+        The minimum number of occurrences of a connective in the sample
+        before its ranking can be stable
+    sample_counts : dict
+        "source" and "target" as keys, the values are the counts of
+        the alignments in the sample (not scaled)
+    sampled_lines : dict
+        "source" and "target" as keys, the values are the number of
+        sample lines in which every connective was searched
+    """
+
+    def __init__(self, alignment, source_corpus, target_corpus, source_lex,
+                 target_lex, fraction=0.1, seed=0, chunks=10, patience=2,
+                 top=5, min_support=3, min_occurrences=20, **kwargs):
+        super().__init__(None, None, alignment, source_corpus,
+                         target_corpus, source_lex, target_lex, **kwargs)
+        if self.checkpoint or self.previous is not None or self.encode:
+            raise ValueError("Checkpoints, updates and encoded corpora are "
+                             "not supported for samples")
+        if not 0 < fraction <= 1:
+            raise ValueError("The fraction of the sample has to be larger "
+                             "than 0 and at most 1")
+        self.fraction = fraction
+        self.seed = seed
+        self.chunks = chunks
+        self.patience = patience
+        self.top = top
+        self.min_support = min_support
+        self.min_occurrences = min_occurrences
+        self.sample_counts = {"source": dict(), "target": dict()}
+        self.sampled_lines = {"source": Counter(), "target": Counter()}
+        # The files and word alignments of the chunks
+        self._directory = None
+        self._chunk_files = None
+        self._chunk_sizes = None
+        self._word_alignments = dict()
+
+    def close(self):
+        """Deletes the files of the sample"""
+
+        if self._directory is not None:
+            self._directory.cleanup()
+            self._directory = None
+            self._chunk_files = None
+
+    def _draw_sample(self, stats):
+        """Draws the sample and writes every chunk into its own files"""
+
+        lengths = array("I")
+        with open_text(self.source_corpus) as corpus:
+            for line in corpus:
+                lengths.append(len(line.split()))
+        self.lines = len(lengths)
+        sample = stratified_sample(lengths, self.fraction, self.seed,
+                                   self.chunks)
+        chunk_of = {line: chunk for chunk, lines in enumerate(sample)
+                    for line in lines}
+
+        self._directory = tempfile.TemporaryDirectory(prefix="conn_sample_")
+        directory = Path(self._directory.name)
+        self._chunk_files = [tuple(directory / f"{chunk}_{name}.txt"
+                                   for name in ("alignment", "source",
+                                                "target"))
+                             for chunk in range(self.chunks)]
+        self._chunk_sizes = [len(lines) for lines in sample]
+        with ExitStack() as stack:
+            files = [[stack.enter_context(open(file, "w", encoding="utf-8"))
+                      for file in chunk] for chunk in self._chunk_files]
+            for first, lines in read_batches((self.alignment,
+                                              self.source_corpus,
+                                              self.target_corpus)):
+                for line, texts in enumerate(lines, first):
+                    chunk = chunk_of.get(line)
+                    if chunk is None:
+                        continue
+                    for file, text in zip(files[chunk], texts):
+                        file.write(text if text.endswith("\n")
+                                   else text + "\n")
+        stats["lines"] += self.lines
+        stats["sampled_lines"] += len(chunk_of)
+
+    def _chunk_word_alignments(self, chunk):
+        """Returns the word alignments of a chunk, parsed once"""
+
+        if chunk not in self._word_alignments:
+            source_target, target_source = parse_word_alignments(
+                *self._chunk_files[chunk])
+            self._word_alignments[chunk] = (dict(source_target),
+                                            dict(target_source))
+        return self._word_alignments[chunk]
+
+    def _count_round(self, lex, lang, resume=None, scanned=None):
+        """Counts the alignments of a round in the chunks of the sample
+
+        The counts are scaled to the number of lines of the corpus.
+
+        Parameters
+        ----------
+        lex : Lexicon
+            The connectives of the round
+        lang : str
+            The language is "source" or "target" language
+        resume : dict, optional
+            Not used, samples are not continued
+        scanned : tuple, optional
+            Not used, the sample is always scanned
+
+        Returns
+        -------
+        counts : dict
+            The estimated counts of the alignments of every connective
+        """
+
+        if self._chunk_files is None:
+            with self._stage("sampling", lang) as stats:
+                self._draw_sample(stats)
+        lang_pos = 1 if lang == "source" else 2
+
+        counts = dict()
+        seen = Counter()
+        rankings = dict()
+        stable = Counter()
+        active = list(lex)
+        with self._stage("sample_scan", lang) as stats:
+            for chunk, files in enumerate(self._chunk_files):
+                if not active:
+                    break
+                chunk_lex = Lexicon(active)
+                word_alignments = self._chunk_word_alignments(chunk)[
+                    lang_pos - 1]
+                chunk_counts = {
+                    **conn_count(word_alignments, chunk_lex.singles),
+                    **conn_count(parse_phrase_alignments(
+                        *files, chunk_lex.phrases, lang=lang_pos,
+                        stats=stats, workers=self.workers),
+                        chunk_lex.phrases),
+                    **conn_count(parse_discontinuous(
+                        *files, chunk_lex.discontinuous, lang=lang_pos,
+                        stats=stats, workers=self.workers),
+                        chunk_lex.discontinuous)}
+
+                # Connectives whose ranking has not changed for some
+                # chunks are not searched anymore
+                still_active = []
+                for conn in active:
+                    seen[conn] += self._chunk_sizes[chunk]
+                    if conn in chunk_counts:
+                        counts.setdefault(conn, Counter()).update(
+                            chunk_counts[conn])
+                    if conn not in counts:
+                        still_active.append(conn)
+                        continue
+                    ranking = tuple(word for word, count
+                                    in counts[conn].most_common(self.top))
+                    if ranking != rankings.get(conn):
+                        stable[conn] = 0
+                    elif conn in chunk_counts and sum(counts[conn].values())\
+                            >= self.min_occurrences:
+                        # Only new occurrences confirm the ranking, a
+                        # ranking of a few occurrences is not stable
+                        stable[conn] += 1
+                    rankings[conn] = ranking
+                    if stable[conn] < self.patience:
+                        still_active.append(conn)
+                stats["stopped_connectives"] += len(active)\
+                    - len(still_active)
+                stats["chunks"] += 1
+                active = still_active
+            stats["connectives"] += len(lex)
+
+        self.sample_counts[lang].update(counts)
+        self.sampled_lines[lang].update(seen)
+        return {conn: Counter({word: count * self.lines / seen[conn]
+                               for word, count in words.items()})
+                for conn, words in counts.items()}
+
+    def threshold_values(self, counts, lang):
+        """Returns the bounds the thresholds are applied to
+
+        The probability thresholds are applied to the lower bounds of
+        the Wilson intervals of the sample. The minimum counts are
+        applied to the lower bounds of the counts, from the Wilson
+        interval of the occurrences per sampled line, and only if the
+        alignment occurred at least min_support times in the sample,
+        otherwise the count is 0.
+
+        Parameters
+        ----------
+        counts : dict
+            The estimated counts of the round
+        lang : str
+            The language is "source" or "target" language
+
+        Returns
+        -------
+        probabilities : dict
+            The lower bounds of the probabilities
+        counts : dict
+            The lower bounds of the counts in the corpus
+        """
+
+        sample_counts = self.sample_counts[lang]
+        bounds = dict()
+        supported = dict()
+        for conn, words in counts.items():
+            sample = merge_punctuation(sample_counts[conn])
+            total = sum(sample.values())
+            if total:
+                bounds[conn] = {word: wilson_interval(count, total)[0]
+                                for word, count in sample.items()}
+            lines = self.sampled_lines[lang][conn]
+            supported[conn] = Counter({
+                word: wilson_interval(sample_counts[conn][word], lines)[0]
+                * self.lines
+                if sample_counts[conn][word] >= self.min_support else 0
+                for word in words})
+        return bounds, supported
+
+    def estimates(self, lang="source", z=1.96):
+        """Returns the estimated probabilities with confidence intervals
+
+        Parameters
+        ----------
+        lang : str, optional
+            The language is "source" or "target" language
+        z : float, optional
+            The quantile of the normal distribution, 1.96 for 95%
+
+        Returns
+        -------
+        estimates : dict
+            Connectives as keys, the values are dictionaries with the
+            aligned words as keys and the probability, the bounds of
+            its Wilson interval, the estimated count in the corpus and
+            the number of searched sample lines as values
+        """
+
+        sample_counts = self.sample_counts[lang]
+        estimates = dict()
+        for conn, words in count_probabilities(sample_counts).items():
+            total = sum(sample_counts[conn].values())
+            lines = self.sampled_lines[lang][conn]
+            estimates[conn] = dict()
+            for word, probability in words.items():
+                low, high = wilson_interval(probability * total, total, z)
+                estimates[conn][word] = {
+                    "probability": probability,
+                    "low": low,
+                    "high": high,
+                    "count": probability * total * self.lines / lines,
+                    "sampled_lines": lines}
+        return estimates
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Triangulation of Connective Alignments through a Pivot Language
+
+Estimates the alignments of two languages without a parallel corpus
+from the count tables of both languages with a third language, e.g.
+es-it from es-de and de-it:
+
+    P(it | es) = sum over de of P(de | es) * P(it | de)
+
+The tables are sparse, so the product of the probability matrices is
+computed on dictionaries.
+"""
+
+import argparse
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from processing_filtering import (count_probabilities,
+                                  filter_most_common_conns, json_to_dict,
+                                  remove_low_counts, save_alignments)
+
+
+def pivot_probabilities(source_pivot, pivot_target):
+    """Multiplies two sparse probability matrices
+
+    Alignments to an empty string (no alignment) stay empty strings.
+    Pivot words without a row in pivot_target are left out and the
+    probabilities are normalized over the remaining pivot words.
+
+    Parameters
+    ----------
+    source_pivot : dict
+        The probabilities of the pivot words for every source
+        connective
+    pivot_target : dict
+        The probabilities of the target words for every pivot
+        connective
+
+    Returns
+    -------
+    source_target : dict
+        The probabilities of the target words for every source
+        connective
+    """
+
+    source_target = dict()
+    for source, pivots in source_pivot.items():
+        targets = defaultdict(float)
+        covered = 0.0
+        for pivot, probability in pivots.items():
+            if not pivot:
+                targets[""] += probability
+            elif pivot in pivot_target:
+                for target, pivot_probability in pivot_target[pivot].items():
+                    targets[target] += probability * pivot_probability
+            else:
+                continue
+            covered += probability
+        if covered:
+            source_target[source] = {target: probability / covered
+                                     for target, probability
+                                     in targets.items()}
+
+    return source_target
+
+
+def expected_counts(source_counts, probabilities):
+    """Estimates the counts of triangulated alignments
+
+    Every source connective keeps its number of occurrences, which is
+    distributed according to the triangulated probabilities.
+
+    Parameters
+    ----------
+    source_counts : dict
+        The counted alignments of the source connectives with the
+        pivot language
+    probabilities : dict
+        The triangulated probabilities
+
+    Returns
+    -------
+    counts : dict
+        The estimated counts of the alignments
+    """
+
+    counts = dict()
+    for source, targets in probabilities.items():
+        total = sum(source_counts[source].values())
+        counts[source] = Counter({target: total * probability
+                                  for target, probability
+                                  in targets.items()})
+
+    return counts
+
+
+def triangulate(source_pivot_counts, pivot_target_counts,
+                word_threshold=0.021, phrase_threshold=0.014,
+                word_min_count=20, phrase_min_count=10):
+    """Triangulates and filters connective alignments
+
+    Parameters
+    ----------
+    source_pivot_counts : dict
+        The content of a {source}_{pivot}_connectives_alignment_count
+        file
+    pivot_target_counts : dict
+        The content of a {pivot}_{target}_connectives_alignment_count
+        file
+    word_threshold : float
+        The minimum probability for an alignment for a single word
+    phrase_threshold : float
+        The minimum probability for an alignment for a phrase
+    word_min_count : int
+        The minimum (estimated) number for an alignment for a single
+        word
+    phrase_min_count : int
+        The minimum (estimated) number for an alignment for a phrase
+
+    Returns
+    -------
+    alignments : dict
+        The filtered probabilities of the source-target alignments
+    counts : dict
+        The estimated counts of all source-target alignments
+    """
+
+    probabilities = pivot_probabilities(
+        count_probabilities(source_pivot_counts),
+        count_probabilities(pivot_target_counts))
+    counts = expected_counts(source_pivot_counts, probabilities)
+    alignments = filter_most_common_conns(probabilities, word_threshold,
+                                          phrase_threshold)
+    alignments = remove_low_counts(alignments, counts, word_min_count,
+                                   phrase_min_count)
+
+    return alignments, counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--source_lang", action="store",
+                        type=str, required=True,
+                        help="Source language code")
+    parser.add_argument("-p", "--pivot_lang", action="store",
+                        type=str, required=True,
+                        help="Pivot language code")
+    parser.add_argument("-t", "--target_lang", action="store",
+                        type=str, required=True,
+                        help="Target language code")
+    parser.add_argument("-wt", "--word_threshold", action="store",
+                        default=0.021, type=float,
+                        help="Relative word threshold in percent")
+    parser.add_argument("-pt", "--phrase_threshold", action="store",
+                        default=0.014, type=float,
+                        help="Relative phrase threshold in percent")
+    parser.add_argument("-wc", "--word_count", action="store",
+                        default=20, type=int,
+                        help="Absolute word threshold as estimated count")
+    parser.add_argument("-pc", "--phrase_count", action="store",
+                        default=10, type=int,
+                        help="Absolute phrase threshold as estimated count")
+    parser.add_argument("-d", "--directory", action="store", default=".",
+                        type=str,
+                        help="Directory with the count files of conn_align.py")
+    args = parser.parse_args()
+
+    directory = Path(args.directory)
+    tables = []
+    for lang1, lang2 in ((args.source_lang, args.pivot_lang),
+                         (args.pivot_lang, args.target_lang)):
+        count_file = directory / f"{lang1}_{lang2}_connectives_alignment" \
+                                 f"_count.json"
+        if not count_file.exists():
+            sys.exit(f"{count_file} is missing, it is created by "
+                     f"conn_align.py with -s {lang1} -t {lang2}")
+        tables.append(json_to_dict(count_file))
+
+    alignments, counts = triangulate(*tables, args.word_threshold,
+                                     args.phrase_threshold, args.word_count,
+                                     args.phrase_count)
+    # Not the names of conn_align.py, a direct alignment is kept
+    pair = f"{args.source_lang}_{args.target_lang}"
+    save_alignments(
+        f"{pair}_connectives_alignment_triangulated.json",
+        alignments)
+    save_alignments(
+        f"{pair}_connectives_alignment_triangulated_count.json",
+        {source: {target: round(count, 2) for target, count in targets.items()}
+         for source, targets in counts.items()})
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Integer Ids for Tokens and Corpora as Integer Arrays
+
+The phrase scans compare integers instead of strings. The tokens are
+only restored for the alignments that are found.
+"""
+
+import pickle
+import string
+from array import array
+
+from corpus_io import read_batches
+
+
+# The same characters as in remove_punct_phrases
+PUNCTUATION = string.punctuation + "¿"
+
+CORPUS_VERSION = 1
+
+
+class Vocabulary:
+    """Assigns an integer id to every token
+
+    Parameters
+    ----------
+    tokens : iterable, optional
+        Tokens that are added in this order
+
+    Attributes
+    ----------
+    ids : dict
+        The tokens as keys and their ids as values
+    tokens : list
+        The tokens in the order of their ids
+    punctuation : bytearray
+        1 at the ids of punctuation, 0 otherwise
+    gap : int
+        The id of '...', which marks gaps in discontinuous phrases
+    comma : int
+        The id of ','
+    """
+
+    def __init__(self, tokens=()):
+        self.ids = dict()
+        self.tokens = []
+        self.punctuation = bytearray()
+        self.gap = self.add("...")
+        self.comma = self.add(",")
+        for token in tokens:
+            self.add(token)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __contains__(self, token):
+        return token in self.ids
+
+    def add(self, token):
+        """Returns the id of a token, new tokens get the next id"""
+
+        try:
+            return self.ids[token]
+        except KeyError:
+            pass
+        self.ids[token] = len(self.tokens)
+        self.tokens.append(token)
+        # Substrings count as punctuation, as in remove_punct_phrases
+        self.punctuation.append(token in PUNCTUATION)
+        return self.ids[token]
+
+    def encode(self, tokens):
+        """Returns the ids of a list of tokens as array"""
+
+        return array("I", [self.add(token) for token in tokens])
+
+    def decode(self, ids):
+        """Returns the tokens of a sequence of ids"""
+
+        return [self.tokens[i] for i in ids]
+
+    def remove_punct(self, ids):
+        """Removes punctuation at the edges of a phrase
+
+        Works like remove_punct_phrases on ids: a single id is not
+        changed, otherwise punctuation and gaps at the beginning and
+        end are removed.
+
+        Parameters
+        ----------
+        ids : sequence
+            The ids of a phrase
+
+        Returns
+        -------
+        ids : sequence
+            The ids without the punctuation, empty if nothing remains
+        """
+
+        if len(ids) <= 1:
+            return ids
+        no_punct = ids
+        if self.punctuation[ids[0]]:
+            no_punct = ids[1:]
+        if self.punctuation[ids[-1]]:
+            no_punct = no_punct[:-1]
+        if no_punct and no_punct[0] == self.gap:
+            no_punct = no_punct[1:]
+        if no_punct and no_punct[-1] == self.gap:
+            no_punct = no_punct[:-1]
+        return no_punct
+
+    def phrase(self, ids):
+        """Returns the alignment string for the ids of aligned words
+
+        Parameters
+        ----------
+        ids : sequence
+            The ids of the aligned words, with gaps and commas between
+            discontinuous parts
+
+        Returns
+        -------
+        phrase : str
+            The words without punctuation at the edges, joined by
+            spaces
+        """
+
+        phrase = " ".join(self.decode(self.remove_punct(ids)))
+        if ", ..." in phrase:
+            phrase = phrase.replace(", ...", "...")
+        return phrase
+
+
+class EncodedCorpus:
+    """A parallel corpus and its alignment as integer arrays
+
+    The tokens of all sentences of a language are stored in one array,
+    the offsets array contains the start of every sentence. The
+    alignment is stored as pairs of word positions in the same way.
+
+    Parameters
+    ----------
+    vocabulary : Vocabulary, optional
+        The vocabulary for the ids, shared by both languages
+
+    Attributes
+    ----------
+    vocabulary : Vocabulary or None
+        The vocabulary for the ids, None for batches of a corpus
+    source : array
+        The ids of all source tokens
+    source_offsets : array
+        The start of every source sentence and the end of the last one
+    target : array
+        The ids of all target tokens
+    target_offsets : array
+        The start of every target sentence and the end of the last one
+    links : array
+        The aligned positions of all sentences, source and target
+        position alternate
+    link_offsets : array
+        The start of the links of every sentence and the end of the
+        last one
+    line_indexes : dict
+        1 (source) and 2 (target) as keys, the values are dictionaries
+        with the lines (array) of every token id, see index_lines
+    """
+
+    def __init__(self, vocabulary=None):
+        self.vocabulary = vocabulary
+        self.source = array("I")
+        self.source_offsets = array("Q", [0])
+        self.target = array("I")
+        self.target_offsets = array("Q", [0])
+        self.links = array("I")
+        self.link_offsets = array("Q", [0])
+        self.line_indexes = {1: dict(), 2: dict()}
+        # The number of lines in the line indexes
+        self._indexed = 0
+
+    @classmethod
+    def from_files(cls, alignment, source_corpus, target_corpus,
+                   vocabulary=None, batch_size=10000):
+        """Reads a parallel corpus and its eflomal alignment
+
+        Parameters
+        ----------
+        alignment : str
+            The file name for the eflomal alignment
+        source_corpus : str
+            The file name for the source corpus
+        target_corpus : str
+            The file name for the target corpus
+        vocabulary : Vocabulary, optional
+            An existing vocabulary that is extended
+        batch_size : int, optional
+            The number of lines read at once
+
+        Returns
+        -------
+        corpus : EncodedCorpus
+            The corpus with the ids of the tokens
+        """
+
+        corpus = cls(vocabulary or Vocabulary())
+        corpus.extend_from_files(alignment, source_corpus, target_corpus,
+                                 batch_size)
+        return corpus
+
+    def extend_from_files(self, alignment, source_corpus, target_corpus,
+                          batch_size=10000):
+        """Adds the lines of the files that are not encoded yet
+
+        Used when new lines were appended to the corpus and the
+        alignment.
+
+        Parameters
+        ----------
+        alignment : str
+            The file name for the eflomal alignment
+        source_corpus : str
+            The file name for the source corpus
+        target_corpus : str
+            The file name for the target corpus
+        batch_size : int, optional
+            The number of lines read at once
+
+        Returns
+        -------
+        int
+            The number of added lines
+        """
+
+        before = len(self)
+        for first, lines in read_batches((alignment, source_corpus,
+                                          target_corpus), batch_size,
+                                         start=before):
+            for index, source, target in lines:
+                self.append(index, source, target)
+        return len(self) - before
+
+    def save(self, file):
+        """Saves the corpus so that it can be loaded with load"""
+
+        with open(file, "wb") as f:
+            pickle.dump((CORPUS_VERSION, self.vocabulary.tokens, self.source,
+                         self.source_offsets, self.target,
+                         self.target_offsets, self.links, self.link_offsets,
+                         self.line_indexes, self._indexed),
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, file):
+        """Loads a corpus saved with save"""
+
+        with open(file, "rb") as f:
+            version, tokens, *content = pickle.load(f)
+        if version != CORPUS_VERSION:
+            raise ValueError(f"{file} was saved with corpus version {version}"
+                             f", expected {CORPUS_VERSION}")
+        corpus = cls(Vocabulary(tokens))
+        (corpus.source, corpus.source_offsets, corpus.target,
+         corpus.target_offsets, corpus.links, corpus.link_offsets,
+         corpus.line_indexes, corpus._indexed) = content
+        return corpus
+
+    def __len__(self):
+        return len(self.source_offsets) - 1
+
+    def append(self, alignment, source, target):
+        """Adds a line of the eflomal alignment and the corpora"""
+
+        self.source.extend(self.vocabulary.encode(source.split()))
+        self.source_offsets.append(len(self.source))
+        self.target.extend(self.vocabulary.encode(target.split()))
+        self.target_offsets.append(len(self.target))
+        for pair in alignment.split():
+            word1, word2 = pair.split("-")
+            self.links.append(int(word1))
+            self.links.append(int(word2))
+        self.link_offsets.append(len(self.links))
+
+    def sentence(self, line):
+        """Returns the source ids, target ids and links of a line"""
+
+        return (self.source[self.source_offsets[line]:
+                            self.source_offsets[line + 1]],
+                self.target[self.target_offsets[line]:
+                            self.target_offsets[line + 1]],
+                self.links[self.link_offsets[line]:
+                           self.link_offsets[line + 1]])
+
+    def index_lines(self):
+        """Adds the lines that are not indexed yet to the line indexes
+
+        Returns
+        -------
+        None
+        """
+
+        for lang, (data, offsets) in ((1, (self.source,
+                                           self.source_offsets)),
+                                      (2, (self.target,
+                                           self.target_offsets))):
+            index = self.line_indexes[lang]
+            for line in range(self._indexed, len(self)):
+                for token in set(data[offsets[line]:offsets[line + 1]]):
+                    try:
+                        index[token].append(line)
+                    except KeyError:
+                        index[token] = array("I", [line])
+        self._indexed = len(self)
+
+    def candidate_lines(self, phrases, lang=1):
+        """Finds the lines that contain all tokens of a phrase
+
+        Parameters
+        ----------
+        phrases : list
+            Continuous phrases of language 1 or 2
+        lang : int
+            An integer that indicates whether the phrases correspond to
+            language 1 or 2
+
+        Returns
+        -------
+        lines : list
+            The sorted line numbers
+        """
+
+        self.index_lines()
+        index = self.line_indexes[lang]
+        lines = set()
+        for phrase in phrases:
+            ids = [self.vocabulary.ids.get(token) for token in phrase.split()]
+            try:
+                # Starts with the rarest token
+                tokens = sorted((index[i] for i in ids), key=len)
+            except KeyError:
+                # A token does not occur in the corpus
+                continue
+            if not tokens:
+                continue
+            found = set(tokens[0])
+            for token_lines in tokens[1:]:
+                found.intersection_update(token_lines)
+            lines.update(found)
+        return sorted(lines)
+
+    def subset(self, lines):
+        """Returns the given lines as a new corpus with the same
+        vocabulary
+
+        Parameters
+        ----------
+        lines : iterable
+            The sorted line numbers
+
+        Returns
+        -------
+        corpus : EncodedCorpus
+            The lines in the same order
+        """
+
+        corpus = EncodedCorpus(self.vocabulary)
+        for line in lines:
+            source, target, links = self.sentence(line)
+            corpus.source.extend(source)
+            corpus.source_offsets.append(len(corpus.source))
+            corpus.target.extend(target)
+            corpus.target_offsets.append(len(corpus.target))
+            corpus.links.extend(links)
+            corpus.link_offsets.append(len(corpus.links))
+        return corpus
+
+    def batches(self, batch_size=10000, start=0):
+        """Splits the corpus into batches without the vocabulary
+
+        The batches are small enough to be sent to other processes.
+
+        Parameters
+        ----------
+        batch_size : int, optional
+            The number of lines per batch
+        start : int, optional
+            The number of lines to skip
+
+        Yields
+        ------
+        first : int
+            The line number of the first line in the batch
+        batch : EncodedCorpus
+            The lines of the batch
+        """
+
+        for first in range(start, len(self), batch_size):
+            end = min(first + batch_size, len(self))
+            batch = EncodedCorpus()
+            for data, offsets in (("source", "source_offsets"),
+                                  ("target", "target_offsets"),
+                                  ("links", "link_offsets")):
+                begin = getattr(self, offsets)[first]
+                stop = getattr(self, offsets)[end]
+                setattr(batch, data, getattr(self, data)[begin:stop])
+                setattr(batch, offsets, array(
+                    "Q", [offset - begin for offset
+                          in getattr(self, offsets)[first:end + 1]]))
+            yield first, batch
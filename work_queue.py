@@ -0,0 +1,608 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""A Work Queue in a Shared Directory
+
+A large corpus can be processed by several machines that only share a
+file system. The coordinator splits the alignment and the corpora into
+shards of lines and writes the job to a directory. Every worker claims
+the next open shard with a lock file, processes it and writes its
+partial result. The reduce step merges the partial results in the
+order of the shards, so the output is the same as the output of a
+single run:
+
+    words   the word alignments of parse_alignments.py
+    counts  the counted alignments of the connectives of the lexicons
+            (like the count files of conn_align.py without the search
+            for new connectives)
+
+A worker touches its lock file while it works. A lock file that has not
+been touched for a while belongs to a worker that has stopped, so the
+shard is claimed again.
+"""
+
+import argparse
+import io
+import json
+import os
+import pickle
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, closing, contextmanager
+from itertools import islice
+from pathlib import Path
+
+from alignment_cache import WordAlignmentCache
+from bootstrap import shard_count_batch
+from corpus_io import OPENERS, map_ordered, open_text, read_batches
+from parse_alignments import merge_alignments, word_alignment_batch
+from processing_filtering import read_lexicon, save_alignments
+
+
+QUEUE_VERSION = 1
+
+KINDS = ("words", "counts")
+
+
+def shard_offsets(files, shard_size):
+    """Splits parallel text files into shards of lines
+
+    Parameters
+    ----------
+    files : tuple
+        Paths to text files, e.g. the eflomal alignment, the source and
+        the target corpus
+    shard_size : int
+        The number of lines per shard
+
+    Returns
+    -------
+    lines : int
+        The number of lines, of the shortest file like read_batches
+    offsets : list
+        The byte position of the beginning of every shard and of the
+        end of the file for every file, None for compressed files
+    """
+
+    counts = []
+    offsets = []
+    for file in files:
+        if Path(file).suffix.lower() in OPENERS:
+            # Compressed files are read from the beginning
+            with open_text(file) as f:
+                counts.append(sum(1 for _ in f))
+            offsets.append(None)
+            continue
+        positions = [0]
+        position = 0
+        number = 0
+        with open(file, "rb") as f:
+            for number, line in enumerate(f, 1):
+                position += len(line)
+                if number % shard_size == 0:
+                    positions.append(position)
+        if number % shard_size:
+            positions.append(position)
+        counts.append(number)
+        offsets.append(positions)
+    return min(counts), offsets
+
+
+def create_queue(directory, kind, files, shard_size=100000,
+                 source_lang="", target_lang="", source_conns=(),
+                 target_conns=()):
+    """Writes a job with its shards to the queue directory
+
+    Parameters
+    ----------
+    directory : str
+        The queue directory, shared by all workers
+    kind : str
+        "words" or "counts"
+    files : tuple
+        Paths to the eflomal alignment, the source and the target
+        corpus, the same paths have to be valid for all workers
+    shard_size : int, optional
+        The number of lines per shard
+    source_lang : str, optional
+        The source language code, used for the names of the output
+    target_lang : str, optional
+        The target language code
+    source_conns : list, optional
+        The source connectives, only for "counts"
+    target_conns : list, optional
+        The target connectives, only for "counts"
+
+    Returns
+    -------
+    shards : int
+        The number of shards
+
+    Raises
+    ------
+    ValueError
+        If the queue directory already has a job
+    """
+
+    directory = Path(directory)
+    if (directory / "job.json").exists():
+        raise ValueError(f"{directory} already has a job")
+    files = [str(Path(file).resolve()) for file in files]
+    lines, offsets = shard_offsets(files, shard_size)
+    shards = []
+    for number, first in enumerate(range(0, lines, shard_size)):
+        shards.append({
+            "first": first, "size": min(shard_size, lines - first),
+            "offsets": [None if positions is None
+                        else positions[number:number + 2]
+                        for positions in offsets]})
+
+    for name in ("locks", "results"):
+        (directory / name).mkdir(parents=True, exist_ok=True)
+    job = {"version": QUEUE_VERSION, "kind": kind, "files": files,
+           "source_lang": source_lang, "target_lang": target_lang,
+           "source_conns": list(source_conns),
+           "target_conns": list(target_conns), "shards": shards}
+    # Workers only start when the job is complete
+    with open(directory / "job.json.tmp", "w", encoding="utf-8") as file:
+        json.dump(job, file, ensure_ascii=False)
+    os.replace(directory / "job.json.tmp", directory / "job.json")
+    return len(shards)
+
+
+def load_job(directory):
+    """Loads the job written with create_queue"""
+
+    with open(Path(directory) / "job.json", encoding="utf-8") as file:
+        job = json.load(file)
+    if job["version"] != QUEUE_VERSION:
+        raise ValueError(f"The job in {directory} was written with queue "
+                         f"version {job['version']}, expected "
+                         f"{QUEUE_VERSION}")
+    return job
+
+
+def _shard_file(directory, folder, number, suffix):
+    return Path(directory) / folder / f"{number:06d}{suffix}"
+
+
+def merge_partial(kind, merged, partial):
+    """Adds the partial result of a shard or a batch to the results of
+    the previous lines
+
+    Parameters
+    ----------
+    kind : str
+        "words" or "counts"
+    merged : tuple
+        The source and the target tables so far, extended in place
+    partial : tuple
+        The source and the target tables of the following lines
+
+    Returns
+    -------
+    None
+    """
+
+    for tables, new in zip(merged, partial):
+        if kind == "words":
+            merge_alignments(tables, new)
+        else:
+            for conn, counts in new.items():
+                tables.setdefault(conn, Counter()).update(counts)
+
+
+def claim_shard(directory, number, timeout=600):
+    """Claims a shard with a lock file
+
+    Creating the lock file fails if it exists, so only one worker gets
+    the shard. A lock file that has not been touched for timeout
+    seconds is removed and the shard is claimed again.
+
+    Parameters
+    ----------
+    directory : str
+        The queue directory
+    number : int
+        The number of the shard
+    timeout : float, optional
+        The number of seconds after which a lock file is stale
+
+    Returns
+    -------
+    lock : Path or None
+        The lock file, None if the shard is claimed by another worker
+    """
+
+    lock = _shard_file(directory, "locks", number, ".lock")
+    owner = f"{socket.gethostname()} {os.getpid()} {time.time()}\n"
+    for _ in range(2):
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                stale = time.time() - lock.stat().st_mtime > timeout
+            except FileNotFoundError:
+                # Released in the meantime
+                continue
+            if not stale:
+                return None
+            # Only one worker can rename the stale lock file. If two
+            # workers still get the shard, both write the same result
+            removed = lock.with_name(f"{lock.name}.{socket.gethostname()}"
+                                     f".{os.getpid()}")
+            try:
+                os.rename(lock, removed)
+            except FileNotFoundError:
+                return None
+            os.remove(removed)
+            continue
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(owner)
+        return lock
+    return None
+
+
+@contextmanager
+def heartbeat(lock, interval):
+    """Touches a lock file every interval seconds in a separate thread
+    until the block is left"""
+
+    stop = threading.Event()
+
+    def touch():
+        while not stop.wait(interval):
+            try:
+                os.utime(lock)
+            except FileNotFoundError:
+                return
+
+    thread = threading.Thread(target=touch, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def shard_batches(files, shard, batch_size=10000):
+    """Reads the lines of a shard in batches
+
+    Parameters
+    ----------
+    files : list
+        Paths to the parallel text files
+    shard : dict
+        The first line, the number of lines and the byte positions of
+        the shard in every file
+    batch_size : int, optional
+        The number of lines per batch
+
+    Yields
+    ------
+    first : int
+        The line number (starting at 0) of the first line in the batch
+    lines : list
+        A tuple with the lines of all files for every line number
+    """
+
+    first = shard["first"]
+    if any(positions is None for positions in shard["offsets"]):
+        # Compressed files cannot jump to the shard
+        remaining = shard["size"]
+        with closing(read_batches(files, batch_size, start=first)) as batches:
+            for first, lines in batches:
+                yield first, lines[:remaining]
+                remaining -= len(lines)
+                if remaining <= 0:
+                    return
+        return
+
+    with ExitStack() as stack:
+        texts = []
+        for file, (start, end) in zip(files, shard["offsets"]):
+            f = stack.enter_context(open(file, "rb"))
+            f.seek(start)
+            # Read like open_text, with universal newlines
+            texts.append(io.TextIOWrapper(io.BytesIO(f.read(end - start)),
+                                          encoding="utf-8"))
+        lines = islice(zip(*texts), shard["size"])
+        while True:
+            batch = list(islice(lines, batch_size))
+            if not batch:
+                return
+            yield first, batch
+            first += len(batch)
+
+
+def process_shard(job, shard, workers=1, batch_size=10000):
+    """Computes the partial result of a shard
+
+    Parameters
+    ----------
+    job : dict
+        The job of the queue (see load_job)
+    shard : dict
+        The shard of the job
+    workers : int, optional
+        The number of processes for the batches of the shard
+    batch_size : int, optional
+        The number of lines per batch
+
+    Returns
+    -------
+    result : tuple
+        The source - target and target - source word alignments for
+        "words", the counted alignments of the source and the target
+        connectives for "counts"
+    """
+
+    if job["kind"] == "words":
+        worker, args = word_alignment_batch, ()
+    else:
+        worker = shard_count_batch
+        args = (job["source_conns"], job["target_conns"])
+    result = (dict(), dict())
+    with closing(shard_batches(job["files"], shard, batch_size)) as batches:
+        for _, _, batch in map_ordered(worker, batches, args, workers):
+            merge_partial(job["kind"], result, batch)
+    return result
+
+
+def run_worker(directory, workers=1, timeout=600, poll=1.0):
+    """Processes open shards until every shard has a result
+
+    Parameters
+    ----------
+    directory : str
+        The queue directory
+    workers : int, optional
+        The number of processes for every shard
+    timeout : float, optional
+        The number of seconds after which a lock file is stale, the
+        lock file of a shard is touched four times as often
+    poll : float, optional
+        The number of seconds between two looks at the shards that are
+        claimed by other workers
+
+    Returns
+    -------
+    processed : int
+        The number of shards processed by this worker
+    """
+
+    job = load_job(directory)
+    processed = 0
+    while True:
+        waiting = False
+        for number, shard in enumerate(job["shards"]):
+            result = _shard_file(directory, "results", number, ".pickle")
+            if result.exists():
+                continue
+            lock = claim_shard(directory, number, timeout)
+            if lock is None:
+                waiting = True
+                continue
+            if result.exists():
+                # Finished before the lock was created
+                os.remove(lock)
+                continue
+            with heartbeat(lock, timeout / 4):
+                partial = process_shard(job, shard, workers)
+            temporary = result.with_name(f"{result.name}."
+                                         f"{socket.gethostname()}."
+                                         f"{os.getpid()}.tmp")
+            with open(temporary, "wb") as file:
+                pickle.dump((QUEUE_VERSION, number, partial), file,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, result)
+            try:
+                os.remove(lock)
+            except FileNotFoundError:
+                pass
+            processed += 1
+        if not waiting:
+            return processed
+        # Shards of other workers are claimed again if they stop
+        time.sleep(poll)
+
+
+def queue_status(directory):
+    """Returns the number of finished, claimed and open shards"""
+
+    job = load_job(directory)
+    status = Counter()
+    for number in range(len(job["shards"])):
+        if _shard_file(directory, "results", number, ".pickle").exists():
+            status["finished"] += 1
+        elif _shard_file(directory, "locks", number, ".lock").exists():
+            status["claimed"] += 1
+        else:
+            status["open"] += 1
+    return status
+
+
+def reduce_queue(directory):
+    """Merges the partial results of all shards in their order
+
+    Parameters
+    ----------
+    directory : str
+        The queue directory
+
+    Returns
+    -------
+    source : dict
+        The source - target word alignment or the counted alignments of
+        the source connectives
+    target : dict
+        The target - source word alignment or the counted alignments of
+        the target connectives
+
+    Raises
+    ------
+    ValueError
+        If a shard has no result yet
+    """
+
+    job = load_job(directory)
+    missing = [number for number in range(len(job["shards"]))
+               if not _shard_file(directory, "results", number,
+                                  ".pickle").exists()]
+    if missing:
+        raise ValueError(f"{len(missing)} of {len(job['shards'])} shards "
+                         f"have no result yet, e.g. shard {missing[0]}")
+
+    merged = (dict(), dict())
+    for number in range(len(job["shards"])):
+        with open(_shard_file(directory, "results", number, ".pickle"),
+                  "rb") as file:
+            version, _, partial = pickle.load(file)
+        if version != QUEUE_VERSION:
+            raise ValueError(f"Shard {number} was written with queue "
+                             f"version {version}, expected {QUEUE_VERSION}")
+        merge_partial(job["kind"], merged, partial)
+    return merged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command",
+                        choices=("submit", "work", "status", "reduce", "run"),
+                        help="'submit' writes the shards of a job to the"
+                        " queue directory, 'work' processes shards,"
+                        " 'status' shows the progress, 'reduce' merges the"
+                        " results and 'run' does all steps on this machine"
+                        " with '-n' worker processes")
+    parser.add_argument("queue", help="Queue directory, shared by all"
+                        " workers")
+    parser.add_argument("files", nargs="*",
+                        help="Alignment text file in Pharaoh format, corpus"
+                        " with source sentences and corpus with target"
+                        " sentences (only for 'submit' and 'run')")
+    parser.add_argument("-k", "--kind", action="store", default="words",
+                        type=str, choices=KINDS,
+                        help="'words' for the word alignments of"
+                        " parse_alignments.py, 'counts' for the counted"
+                        " alignments of the connectives of the lexicons")
+    parser.add_argument("-s", "--source_lang", action="store",
+                        type=str, default="",
+                        help="Source language code")
+    parser.add_argument("-t", "--target_lang", action="store",
+                        type=str, default="",
+                        help="Target language code")
+    parser.add_argument("-sl", "--source_lex", action="store",
+                        default="", type=str,
+                        help="Source connective lexicon as XML or TXT file,"
+                        " only needed if it is not Italian, Spanish or"
+                        " German")
+    parser.add_argument("-tl", "--target_lex", action="store",
+                        default="", type=str,
+                        help="Target connective lexicon as XML or TXT file")
+    parser.add_argument("-ss", "--shard_size", action="store",
+                        default=100000, type=int,
+                        help="Number of corpus lines per shard")
+    parser.add_argument("-w", "--workers", action="store", default=1,
+                        type=int,
+                        help="Number of processes of a worker for the"
+                        " batches of a shard")
+    parser.add_argument("-n", "--nodes", action="store", default=2,
+                        type=int,
+                        help="Number of worker processes that stand in for"
+                        " the machines with 'run'")
+    parser.add_argument("-to", "--timeout", action="store", default=600.0,
+                        type=float,
+                        help="Seconds after which the lock file of a worker"
+                        " that has stopped is removed")
+    parser.add_argument("-o", "--output", action="store", default=".",
+                        type=str,
+                        help="Directory for the merged files of 'reduce'")
+    parser.add_argument("-cd", "--cache_dir", action="store",
+                        default=".alignment_cache", type=str,
+                        help="Cache directory of conn_align.py, 'reduce'"
+                        " stores the merged word alignments there")
+    args = parser.parse_intermixed_args()
+
+    # 'run' continues the job of the queue directory if it has one
+    if args.command == "submit" or args.command == "run" and not (
+            Path(args.queue) / "job.json").exists():
+        if len(args.files) != 3:
+            parser.error(f"the command '{args.command}' requires the"
+                         f" alignment, the source and the target corpus")
+        if not args.source_lang or not args.target_lang:
+            parser.error(f"the command '{args.command}' requires '-s' and"
+                         f" '-t'")
+        source_conns = target_conns = []
+        if args.kind == "counts":
+            try:
+                source_conns = read_lexicon(args.source_lang,
+                                            args.source_lex)
+                target_conns = read_lexicon(args.target_lang,
+                                            args.target_lex)
+            except ValueError as error:
+                sys.exit(str(error))
+            if source_conns is None or target_conns is None:
+                sys.exit("If a language is not Italian, Spanish or German, "
+                         "you have to provide the Path to a connective "
+                         "lexicon with the argument '-sl' or '-tl'")
+        try:
+            shards = create_queue(args.queue, args.kind, args.files,
+                                  args.shard_size, args.source_lang,
+                                  args.target_lang, source_conns,
+                                  target_conns)
+        except ValueError as error:
+            sys.exit(str(error))
+        print(f"{shards} shards in {args.queue}", file=sys.stderr)
+    elif args.files:
+        parser.error(f"the command '{args.command}' takes no files, the"
+                     f" files of the job are used")
+
+    if args.command == "work":
+        run_worker(args.queue, args.workers, args.timeout)
+    elif args.command == "run":
+        # Separate processes, like workers on several machines
+        processes = [subprocess.Popen([sys.executable, __file__, "work",
+                                       args.queue, "-w", str(args.workers),
+                                       "-to", str(args.timeout)])
+                     for _ in range(args.nodes)]
+        # All workers are waited for, also if one has failed
+        codes = [process.wait() for process in processes]
+        if any(codes):
+            sys.exit("A worker has failed, start 'work' again to finish"
+                     " the shards")
+    elif args.command == "status":
+        status = queue_status(args.queue)
+        print(f"{status['finished']} finished, {status['claimed']} claimed,"
+              f" {status['open']} open")
+
+    if args.command in ("reduce", "run"):
+        job = load_job(args.queue)
+        try:
+            source, target = reduce_queue(args.queue)
+        except ValueError as error:
+            sys.exit(str(error))
+        if job["kind"] == "words":
+            # conn_align.py finds the word alignments in its cache
+            cache = WordAlignmentCache(args.cache_dir)
+            cache.save(cache.key(*job["files"]), source, target)
+            name = "word_alignment"
+        else:
+            # Only the connectives of the lexicons, a count file of
+            # conn_align.py is not replaced
+            name = "connectives_alignment_queue_count"
+        output = Path(args.output)
+        output.mkdir(parents=True, exist_ok=True)
+        for lang1, lang2, tables in ((job["source_lang"], job["target_lang"],
+                                      source),
+                                     (job["target_lang"], job["source_lang"],
+                                      target)):
+            save_alignments(output / f"{lang1}_{lang2}_{name}.json", tables)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+# Sophia Rauh
+# Matrikelnummer 790850
+# Python 3.9.13
+# Windows 10
+
+"""Writing a Connective Lexicon for a New Language
+
+The connectives of the target language that were aligned by
+conn_align.py are written as a lexicon in the DiMLex format (like
+results/Es-DiMLex.xml) and as a table (like results/connectives.csv).
+Every connective inherits the categories and the PDTB-3 senses of the
+source connectives it is aligned to, ordered by the sum of the
+alignment probabilities. The entries are written one after another.
+"""
+
+import argparse
+import csv
+import string
+import sys
+from collections import Counter, defaultdict
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr
+
+from help_functions.discourse_relations import split_relations
+from lexicon import entry_connectives, iter_xml_entries
+from processing_filtering import LEXICONS, json_to_dict, read_relations
+
+
+def source_readings(entries, relations=None):
+    """Collects the categories and senses of the source connectives
+
+    Parameters
+    ----------
+    entries : iterable
+        The entries of the source lexicon, e.g. of iter_xml_entries
+    relations : dict, optional
+        The relations of the connectives (see read_relations), the
+        senses of an entry are renamed to them if they have the same
+        number, e.g. "contrast" -> "COMPARISON:Contrast" for DiMLex
+
+    Returns
+    -------
+    readings : defaultdict
+        The connectives as keys and a list with the category and the
+        senses of every syntactic reading as values
+    """
+
+    readings = defaultdict(list)
+    for entry in entries:
+        senses = list(dict.fromkeys(sense for _, entry_senses in entry["syn"]
+                                    for sense in entry_senses))
+        for conn in dict.fromkeys(entry_connectives(entry)):
+            names = dict()
+            if relations and len(relations.get(conn, ())) == len(senses):
+                names = dict(zip(senses, relations[conn]))
+            readings[conn].extend(
+                (category, [names.get(sense, sense) for sense in syn_senses])
+                for category, syn_senses in entry["syn"])
+    return readings
+
+
+def aligned_entries(alignments, readings, start=1):
+    """Creates the lexicon entries of aligned connectives
+
+    Connectives that are only aligned to an empty string (no alignment)
+    or to punctuation get no entry, they have no source connective to
+    inherit categories and senses from.
+
+    Parameters
+    ----------
+    alignments : dict
+        The target connectives as keys and the aligned source words
+        with their probability as values, e.g. the attribute
+        target_conn_alignments of FindAlignments
+    readings : dict
+        The categories and senses of the source connectives (see
+        source_readings)
+    start : int, optional
+        The number of the first entry, the entries that are written are
+        numbered consecutively
+
+    Yields
+    ------
+    entry : dict
+        An entry like the entries of iter_xml_entries, the categories
+        and senses are ordered by the sum of the probabilities of the
+        source connectives that have them
+    """
+
+    number = start
+    for conn in sorted(alignments):
+        sources = {source: probability
+                   for source, probability in alignments[conn].items()
+                   if source and source not in string.punctuation}
+        if not sources:
+            continue
+        word, _ = split_relations(conn)
+        categories = Counter()
+        senses = defaultdict(Counter)
+        for source, probability in sources.items():
+            source, _ = split_relations(source)
+            for category, syn_senses in readings.get(source, ()):
+                categories[category] += probability
+                for sense in syn_senses:
+                    senses[category][sense] += probability
+
+        if " ... " in word:
+            orth = ("discont", word.split(" ... "))
+        else:
+            orth = ("cont", [word])
+        yield {"id": f"c{number}",
+               "word": word,
+               "orths": [orth],
+               "syn": [(category, [sense for sense, _
+                                   in senses[category].most_common()])
+                       for category, _ in categories.most_common()]}
+        number += 1
+
+
+def write_dimlex(file, entries):
+    """Writes entries as a lexicon in the DiMLex format
+
+    Parameters
+    ----------
+    file : str
+        Path to the XML file
+    entries : iterable
+        The entries, e.g. of aligned_entries or iter_xml_entries
+
+    Returns
+    -------
+    number : int
+        The number of written entries
+    """
+
+    number = 0
+    with open(file, "w", encoding="utf-8") as f:
+        f.write("<?xml version='1.0' encoding='UTF-8'?>\n<dimlex>\n")
+        for entry in entries:
+            entry_id = entry["id"]
+            lines = [f"  <entry id={quoteattr(entry_id)} "
+                     f"word={quoteattr(entry['word'])}>",
+                     "    <orths>"]
+            for orth_number, (orth_type, parts) in enumerate(entry["orths"],
+                                                             1):
+                lines.append(f"      <orth type={quoteattr(orth_type)} "
+                             f"canonical=\"{int(orth_number == 1)}\" "
+                             f"onr=\"{entry_id}o{orth_number}\">")
+                for part in parts:
+                    part_type = "single" if len(part.split()) == 1\
+                        else "phrasal"
+                    lines.append(f"        <part type=\"{part_type}\">"
+                                 f"{escape(part)}</part>")
+                lines.append("      </orth>")
+            lines.append("    </orths>")
+            for category, senses in entry["syn"]:
+                lines.append("    <syn>")
+                if category is not None:
+                    lines.append(f"      <cat>{escape(category)}</cat>")
+                for sense in senses:
+                    lines += ["      <sem>",
+                              f"        <pdtb3_relation "
+                              f"sense={quoteattr(sense)}/>",
+                              "      </sem>"]
+                lines.append("    </syn>")
+            lines.append("  </entry>")
+            f.write("\n".join(lines) + "\n")
+            number += 1
+        f.write("</dimlex>\n")
+    return number
+
+
+def write_connectives_csv(file, entries):
+    """Writes entries as a table with the variants of the connective,
+    its categories and its senses, separated by tabs
+
+    Parameters
+    ----------
+    file : str
+        Path to the CSV file
+    entries : iterable
+        The entries, e.g. of aligned_entries or iter_xml_entries
+
+    Returns
+    -------
+    number : int
+        The number of written entries
+    """
+
+    number = 0
+    with open(file, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f, delimiter="\t")
+        writer.writerow(["Connective Name", "Parts of Speech",
+                         "Sense (PDTB-3)"])
+        for entry in entries:
+            # All orthographic variants
+            names = dict.fromkeys(" ... ".join(parts)
+                                  for _, parts in entry["orths"])
+            categories = [category for category, _ in entry["syn"]
+                          if category is not None]
+            senses = dict.fromkeys(sense for _, syn_senses in entry["syn"]
+                                   for sense in syn_senses)
+            writer.writerow([";".join(names), ",".join(categories),
+                             ",".join(senses)])
+            number += 1
+    return number
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--source_lang", action="store",
+                        type=str, required=True,
+                        help="Language code of the lexicon with the"
+                        " categories and senses")
+    parser.add_argument("-t", "--target_lang", action="store",
+                        type=str, required=True,
+                        help="Language code of the new lexicon")
+    parser.add_argument("-sl", "--source_lex", action="store",
+                        default="", type=str,
+                        help="Source connective lexicon as XML file, only"
+                        " needed if it is not Italian or German")
+    parser.add_argument("-d", "--directory", action="store", default=".",
+                        type=str,
+                        help="Directory with the alignment files of"
+                        " conn_align.py")
+    parser.add_argument("-o", "--output", action="store", default="",
+                        type=str,
+                        help="XML file for the new lexicon (default:"
+                        " '{Target}-DiMLex.xml')")
+    parser.add_argument("-c", "--csv", action="store", default="",
+                        type=str,
+                        help="CSV file for the table of the new lexicon"
+                        " (default: '{target}_connectives.csv')")
+    args = parser.parse_args()
+
+    source_lex = LEXICONS.get(args.source_lang, args.source_lex)
+    if not str(source_lex).endswith("xml"):
+        sys.exit("The categories and senses are taken from a connective "
+                 "lexicon as XML file, specify it with '-sl'")
+    alignment_file = Path(args.directory) / f"{args.target_lang}_" \
+        f"{args.source_lang}_connectives_alignment.json"
+    if not alignment_file.exists():
+        sys.exit(f"{alignment_file} is missing, it is created by "
+                 f"conn_align.py with -s {args.source_lang} -t "
+                 f"{args.target_lang}")
+
+    alignments = json_to_dict(alignment_file)
+    readings = source_readings(iter_xml_entries(source_lex),
+                               read_relations(args.source_lang, source_lex))
+    write_dimlex(args.output
+                 or f"{args.target_lang.capitalize()}-DiMLex.xml",
+                 aligned_entries(alignments, readings))
+    write_connectives_csv(args.csv
+                          or f"{args.target_lang}_connectives.csv",
+                          aligned_entries(alignments, readings))